@@ -0,0 +1,309 @@
+"""
+Queue archives: every table exported as NDJSON, bulk-loaded into fresh databases
+"""
+import base64
+import gzip
+import io
+import json
+import os
+import sqlite3
+import sys
+from typing import Dict, List, Optional, TextIO
+from queuectl.db import CONFIG_DEFAULTS, get_read_db, init_db, use_db_path
+from queuectl.models import get_utc_now
+
+
+ARCHIVE_FORMAT = 'queuectl-archive'
+ARCHIVE_VERSION = 1
+
+# Rows per executemany() call while importing
+IMPORT_CHUNK_ROWS = 1000
+
+# Suffix of the file an import builds before it replaces the target database
+IMPORT_SUFFIX = ".import"
+
+# How long an import waits for exclusive access to a target before giving up
+IMPORT_LOCK_TIMEOUT = 1.0
+
+
+def open_archive(path: str, mode: str) -> TextIO:
+    """
+    Open an archive file as text
+
+    Args:
+        path: File path, or '-' for stdout/stdin
+        mode: 'w' writes gzip-compressed; 'r' reads gzip or plain NDJSON
+    """
+    if mode == 'w':
+        raw = sys.stdout.buffer if path == '-' else open(path, 'wb')
+        return io.TextIOWrapper(gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6), encoding='utf-8')
+
+    raw = sys.stdin.buffer if path == '-' else open(path, 'rb')
+    buffered = io.BufferedReader(raw) if not isinstance(raw, io.BufferedReader) else raw
+    if buffered.peek(2)[:2] == b'\x1f\x8b':
+        return io.TextIOWrapper(gzip.GzipFile(fileobj=buffered, mode='rb'), encoding='utf-8')
+    return io.TextIOWrapper(buffered, encoding='utf-8')
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _list_tables(cursor: sqlite3.Cursor) -> List[tuple]:
+    cursor.execute("""
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'table' AND name NOT LIKE 'sqlite_%'
+        ORDER BY name
+    """)
+    return cursor.fetchall()
+
+
+def export_archive(out: TextIO, paths: List[str]) -> Dict[str, int]:
+    """
+    Stream every table of the databases (one per shard) as NDJSON
+
+    The archive is a header line, then for each shard and table a line
+    with the table's schema and columns followed by one JSON array per
+    row, then a trailer with the total row count (so a truncated archive
+    is refused on import). BLOB columns are base64-encoded.
+
+    Each database is read from one read snapshot (see get_read_db), like
+    the replica backup: writers keep committing while the export runs,
+    and the archive holds the state as of its start. Rows are written as
+    they are fetched, so memory use does not grow with the queue.
+
+    Args:
+        out: Text stream to write to (the CLI wraps a gzip file)
+        paths: Database files, in shard order
+
+    Returns:
+        Rows exported per table
+    """
+    out.write(json.dumps({"format": ARCHIVE_FORMAT, "version": ARCHIVE_VERSION,
+                          "exported_at": get_utc_now(), "shards": len(paths)}) + "\n")
+    counts: Dict[str, int] = {}
+    for shard, path in enumerate(paths):
+        with use_db_path(path), get_read_db() as conn:
+            cursor = conn.cursor()
+            for table, sql in _list_tables(cursor):
+                cursor.execute(f"PRAGMA table_info({_quote(table)})")
+                info = cursor.fetchall()
+                columns = [column[1] for column in info]
+                blobs = [index for index, column in enumerate(info) if column[2].upper() == 'BLOB']
+                out.write(json.dumps({"shard": shard, "table": table, "sql": sql,
+                                      "columns": columns, "blobs": blobs}) + "\n")
+
+                cursor.execute(f"SELECT {', '.join(map(_quote, columns))} FROM {_quote(table)}")
+                count = 0
+                for row in cursor:
+                    if blobs:
+                        row = list(row)
+                        for index in blobs:
+                            if row[index] is not None:
+                                row[index] = base64.b64encode(row[index]).decode('ascii')
+                    out.write(json.dumps(row, separators=(',', ':')) + "\n")
+                    count += 1
+                counts[table] = counts.get(table, 0) + count
+    out.write(json.dumps({"end": True, "rows": sum(counts.values())}) + "\n")
+    return counts
+
+
+def _tables_with_rows(cursor: sqlite3.Cursor, tables: List[str]) -> List[str]:
+    """
+    The tables among tables holding rows a freshly initialized database lacks
+
+    init_db() (which every CLI command runs first) fills the config table
+    with its defaults; those do not count.
+    """
+    existing = {name for name, _ in _list_tables(cursor)}
+    found = []
+    for table in tables:
+        if table not in existing:
+            continue
+        if table == 'config':
+            cursor.execute("SELECT key, value FROM config")
+            if any(CONFIG_DEFAULTS.get(key) != value for key, value in cursor.fetchall()):
+                found.append(table)
+            continue
+        cursor.execute(f"SELECT 1 FROM {_quote(table)} LIMIT 1")
+        if cursor.fetchone() is not None:
+            found.append(table)
+    return found
+
+
+def _check_empty(path: str, table: str):
+    if not os.path.exists(path):
+        return
+    with use_db_path(path), get_read_db() as conn:
+        if _tables_with_rows(conn.cursor(), [table]):
+            raise ValueError(f"{path} already has rows in {table}; import into a fresh database")
+
+
+def _lock_target(path: str, tables: List[str]) -> Optional[sqlite3.Connection]:
+    """
+    Take exclusive access to a target database about to be replaced
+
+    Leaving WAL mode checkpoints the -wal file into the database and
+    removes it, and SQLite refuses it while any other connection has the
+    database open. The EXCLUSIVE transaction then keeps new connections
+    out until the replacement is in place. The tables are checked again
+    under the lock.
+
+    Returns:
+        The connection holding the lock (None if the target does not exist)
+    """
+    if not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(path, timeout=IMPORT_LOCK_TIMEOUT, isolation_level=None)
+    try:
+        try:
+            mode = conn.execute("PRAGMA journal_mode=DELETE").fetchone()[0]
+            if mode != 'delete':
+                raise sqlite3.OperationalError(f"journal mode is still {mode}")
+            conn.execute("BEGIN EXCLUSIVE")
+        except sqlite3.OperationalError:
+            raise ValueError(f"{path} is in use; stop every worker and command using it before importing")
+        found = _tables_with_rows(conn.cursor(), tables)
+        if found:
+            raise ValueError(f"{path} already has rows in {found[0]}; import into a fresh database")
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+def _parse_line(line: str, line_number: int):
+    try:
+        return json.loads(line)
+    except ValueError:
+        raise ValueError(f"Archive line {line_number} is not valid JSON")
+
+
+def import_archive(source: TextIO, paths: List[str]) -> Dict[str, int]:
+    """
+    Bulk-load an archive into fresh databases (one per shard)
+
+    Each database is built in a new file next to its target: tables are
+    created from the archive's schema with no indexes or triggers, rows
+    are inserted in chunks in a single transaction with journaling off,
+    and init_db() then builds every index and trigger once over the
+    loaded rows (and adds columns newer than the archive). Only when every
+    shard loaded does each new file replace its target.
+
+    No table of the archive may already have rows in a target (the
+    config defaults of a freshly initialized database aside), and no
+    other connection may have a target open: each one is taken out of
+    WAL mode and locked exclusively before it is replaced.
+
+    Args:
+        source: Text stream of the archive (the CLI unwraps gzip)
+        paths: Target database files, in shard order
+
+    Returns:
+        Rows imported per table
+
+    Raises:
+        ValueError: If the archive is invalid or truncated, was exported
+                    from a different number of shards, or a target has
+                    rows in one of its tables or is in use
+    """
+    header = _parse_line(source.readline(), 1)
+    if not isinstance(header, dict) or header.get('format') != ARCHIVE_FORMAT:
+        raise ValueError("Not a queuectl archive")
+    if header.get('version') != ARCHIVE_VERSION:
+        raise ValueError(f"Unsupported archive version {header.get('version')} (expected {ARCHIVE_VERSION})")
+    if header.get('shards') != len(paths):
+        raise ValueError(f"The archive has {header.get('shards')} shard(s) but {len(paths)} are configured "
+                         f"(set QUEUECTL_SHARDS={header.get('shards')})")
+
+    temp_paths = [path + IMPORT_SUFFIX for path in paths]
+    connections: Dict[int, sqlite3.Connection] = {}
+    tables: Dict[int, List[str]] = {shard: [] for shard in range(len(paths))}
+    locks: List[sqlite3.Connection] = []
+    counts: Dict[str, int] = {}
+    replaced = False
+    try:
+        for temp_path in temp_paths:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        table: Optional[dict] = None
+        insert, chunk = None, []
+        conn = None
+        trailer = None
+        for line_number, line in enumerate(source, start=2):
+            record = _parse_line(line, line_number)
+
+            if isinstance(record, list):
+                if table is None:
+                    raise ValueError(f"Archive line {line_number}: row before any table")
+                for index in table['blobs']:
+                    if record[index] is not None:
+                        record[index] = base64.b64decode(record[index])
+                chunk.append(record)
+                if len(chunk) >= IMPORT_CHUNK_ROWS:
+                    conn.executemany(insert, chunk)
+                    chunk = []
+                counts[table['table']] = counts.get(table['table'], 0) + 1
+                continue
+
+            if chunk:
+                conn.executemany(insert, chunk)
+                chunk = []
+            if not isinstance(record, dict):
+                raise ValueError(f"Archive line {line_number} is not a table, row or trailer")
+            if record.get('end'):
+                trailer = record
+                break
+
+            shard = record.get('shard')
+            if not isinstance(shard, int) or not 0 <= shard < len(paths):
+                raise ValueError(f"Archive line {line_number}: invalid shard {shard}")
+            _check_empty(paths[shard], record['table'])
+            tables[shard].append(record['table'])
+            conn = connections.get(shard)
+            if conn is None:
+                conn = sqlite3.connect(temp_paths[shard], isolation_level=None)
+                conn.execute("PRAGMA journal_mode=OFF")
+                conn.execute("PRAGMA synchronous=OFF")
+                conn.execute("BEGIN")
+                connections[shard] = conn
+            table = record
+            conn.execute(table['sql'])
+            insert = (f"INSERT INTO {_quote(table['table'])} ({', '.join(map(_quote, table['columns']))}) "
+                      f"VALUES ({', '.join('?' for _ in table['columns'])})")
+
+        if trailer is None or trailer.get('rows') != sum(counts.values()):
+            raise ValueError("The archive is truncated (trailer missing or row count mismatch)")
+
+        for conn in connections.values():
+            conn.execute("COMMIT")
+            conn.close()
+        connections.clear()
+
+        for temp_path in temp_paths:
+            with use_db_path(temp_path):
+                init_db()
+            # Leave a self-contained file to move into place (workers switch it back to WAL)
+            conn = sqlite3.connect(temp_path)
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.close()
+
+        for shard, path in enumerate(paths):
+            lock = _lock_target(path, tables[shard])
+            if lock is not None:
+                locks.append(lock)
+        for path, temp_path in zip(paths, temp_paths):
+            os.replace(temp_path, path)
+        replaced = True
+    except (sqlite3.Error, KeyError, IndexError, TypeError) as e:
+        raise ValueError(f"Could not load the archive: {e}")
+    finally:
+        for conn in list(connections.values()) + locks:
+            conn.close()
+        if not replaced:
+            for temp_path in temp_paths:
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(temp_path + suffix):
+                        os.remove(temp_path + suffix)
+    return counts
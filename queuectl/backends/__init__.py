@@ -0,0 +1,50 @@
+"""
+Storage backends: SQLite (default, optionally sharded), in-memory and
+append-only log engines
+"""
+from typing import Optional
+from queuectl.backends.base import Backend
+from queuectl.backends.sqlite import SQLiteBackend
+from queuectl.backends.sharded import ShardedBackend, get_shard_count, get_shard_paths
+from queuectl.backends.memory import MemoryBackend
+from queuectl.backends.log import LogBackend
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (SQLiteBackend, ShardedBackend, MemoryBackend, LogBackend)
+}
+
+
+def get_backend(name: str = 'sqlite', **kwargs) -> Backend:
+    """
+    Create a backend by name
+
+    Args:
+        name: One of BACKENDS ('sqlite', 'sharded', 'memory', 'log')
+        **kwargs: Engine options (e.g. path for sqlite, directory for log)
+
+    Raises:
+        ValueError: If the name is unknown
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}' (expected one of: {', '.join(BACKENDS)})")
+    return BACKENDS[name](**kwargs)
+
+
+def get_storage_backend(home: Optional[int] = None) -> Backend:
+    """
+    Open the configured SQLite storage: sharded when QUEUECTL_SHARDS > 1
+
+    Args:
+        home: Home shard of a worker (ignored without sharding)
+    """
+    if get_shard_count() > 1:
+        return ShardedBackend(home=home)
+    return SQLiteBackend()
+
+
+__all__ = [
+    "Backend", "SQLiteBackend", "ShardedBackend", "MemoryBackend", "LogBackend",
+    "BACKENDS", "get_backend", "get_storage_backend", "get_shard_count", "get_shard_paths",
+]
@@ -0,0 +1,158 @@
+"""
+Storage backend interface
+"""
+import threading
+from typing import Dict, List, Optional
+from queuectl.models import Job
+from queuectl.batches import Batch
+
+
+class Backend:
+    """
+    Job storage engine used by workers and the queue API
+
+    Every engine must pass tests/test_backends.py. Jobs move through the
+    same states as in the SQLite schema: pending -> processing -> completed,
+    or back to pending with a delay on failure, and dead once retries run out.
+    """
+    name = ''
+
+    def enqueue(self, job_data: dict) -> Job:
+        """
+        Add a job (same fields as queuectl.queue.enqueue_job)
+
+        Returns:
+            The new job, or the existing one with deduplicated set when the
+            dedup_key matched and the policy is return_existing or coalesce
+
+        Raises:
+            ValueError: If the job is invalid or uses an unsupported field
+            DuplicateJobError: If the ID or active dedup_key already exists
+        """
+        raise NotImplementedError
+
+    def claim(self, worker_id: str, tags: Optional[List[str]] = None) -> Optional[Job]:
+        """
+        Claim the oldest due pending job, or return None
+
+        Args:
+            worker_id: Worker the job is locked to
+            tags: Worker's capability tags; only jobs whose 'requires' tags
+                  are all among them can be claimed
+        """
+        raise NotImplementedError
+
+    def gather_batch(self, job: Job) -> Optional[Batch]:
+        """
+        Claim pending jobs that run in one execution with a claimed job
+        that has 'batch' set (see queuectl.batches)
+
+        Returns:
+            The batch led by job, or None if the job runs alone; engines
+            without batching always return None
+        """
+        return None
+
+    def get_payload(self, job: Job) -> Optional[str]:
+        """Get a job's payload (see queuectl.payloads), or None if it has none or it is missing"""
+        return None
+
+    def complete(self, job: Job, output: str = '') -> None:
+        """Mark a claimed job completed"""
+        raise NotImplementedError
+
+    def fail(self, job: Job, output: str, backoff_base: float = 2.0,
+             exit_code: Optional[int] = None) -> str:
+        """
+        Record a failed run of a claimed job
+
+        Returns:
+            New job state ('pending' when retried, 'dead' otherwise)
+        """
+        raise NotImplementedError
+
+    def release(self, job: Job) -> bool:
+        """
+        Put a claimed job back to pending without counting an attempt
+
+        Returns:
+            False if the job is no longer processing under job.locked_by
+        """
+        raise NotImplementedError
+
+    def complete_from_cache(self, job: Job) -> bool:
+        """Complete a claimed job from a cached result; engines without a cache return False"""
+        return False
+
+    def list_jobs(self, state: Optional[str] = None) -> List[Job]:
+        """List jobs, newest first, optionally filtered by state"""
+        raise NotImplementedError
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        """Get a single job by ID"""
+        raise NotImplementedError
+
+    def get_jobs(self, job_ids: List[str]) -> Dict[str, Job]:
+        """Get several jobs by ID (job ID -> Job, missing IDs left out)"""
+        jobs = {}
+        for job_id in job_ids:
+            job = self.get_job(job_id)
+            if job is not None:
+                jobs[job_id] = job
+        return jobs
+
+    def stats(self) -> Dict:
+        """Get 'state_counts' (state -> count) and 'total_jobs'"""
+        raise NotImplementedError
+
+    def next_run_after(self) -> Optional[float]:
+        """Get the earliest future run_after among pending jobs"""
+        raise NotImplementedError
+
+    def record_backpressure(self, queue: str, event: str) -> None:
+        """Count a producer backpressure event (see queuectl.limits); engines without limits ignore it"""
+        pass
+
+    def register_worker(self, info: dict) -> None:
+        """Add a starting worker to the registry (see queuectl.workers); engines without one ignore it"""
+        pass
+
+    def worker_heartbeat(self, info: dict, stopped: bool = False) -> bool:
+        """
+        Publish a worker's current job and counters
+
+        Returns:
+            True if the worker was asked to stop
+        """
+        return False
+
+    def list_workers(self) -> List[Dict]:
+        """Get registered workers with their 'status' (see queuectl.workers.WORKER_STATES)"""
+        return []
+
+    def stop_workers(self, worker_ids: Optional[List[str]] = None) -> List[Dict]:
+        """Ask live workers (default: all) to stop after their current job, returning them"""
+        return []
+
+    def wait_for_work(self, timeout: float, stop_event: Optional[threading.Event] = None) -> bool:
+        """
+        Idle for up to timeout seconds, returning early when new work may exist
+
+        Returns:
+            True if woken by a change to the stored jobs
+        """
+        if stop_event is not None:
+            stop_event.wait(timeout)
+        else:
+            threading.Event().wait(timeout)
+        return False
+
+    def close(self):
+        """Release files and connections"""
+        pass
+
+    def __enter__(self) -> 'Backend':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
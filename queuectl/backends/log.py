@@ -0,0 +1,169 @@
+"""
+Append-only log storage backend: segment files plus periodic snapshots
+"""
+import json
+import os
+import re
+from typing import List
+from queuectl.models import Job, get_utc_now
+from queuectl.backends.memory import MemoryBackend
+
+
+SEGMENT_PATTERN = re.compile(r'^segment-(\d{8})\.log$')
+SNAPSHOT_FILE = "snapshot.json"
+
+# Roll over to a new segment file after this many bytes
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+
+# Write a snapshot (and drop the segments it covers) after this many records
+DEFAULT_SNAPSHOT_EVERY = 100_000
+
+
+class LogBackend(MemoryBackend):
+    """
+    Backend that keeps jobs in memory and persists every change to a log
+
+    Each change appends the job's full state as one JSON line to the
+    current segment file, so enqueue costs one buffered sequential write
+    and no index maintenance on disk. Every snapshot_every records the
+    whole job set is written to snapshot.json and the segments it covers
+    are deleted. On open, the snapshot is loaded and newer segments are
+    replayed; jobs left in 'processing' by a previous process go back to
+    pending.
+
+    Only one process may open a log directory at a time. Payloads are
+    not supported.
+
+    Args:
+        directory: Directory holding the segments and snapshot
+        segment_bytes: Segment size that triggers a new segment file
+        snapshot_every: Records between snapshots
+        fsync: fsync after every record (default: flush to the OS only,
+               which survives a process crash but not a power loss)
+        **kwargs: Passed to MemoryBackend
+    """
+    name = 'log'
+
+    def __init__(self, directory: str, segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+                 snapshot_every: int = DEFAULT_SNAPSHOT_EVERY, fsync: bool = False, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+
+        self._file = None
+        self._segment = 0
+        self._records = 0
+
+        os.makedirs(directory, exist_ok=True)
+        with self._cond:
+            self._recover()
+
+    def enqueue(self, job_data: dict) -> Job:
+        # Records hold jobs only, so a payload would not survive a reopen
+        if job_data.get('payload') is not None:
+            raise ValueError(f"The {self.name} backend does not support 'payload'")
+        return super().enqueue(job_data)
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, f"segment-{number:08d}.log")
+
+    def _segment_numbers(self) -> List[int]:
+        numbers = []
+        for name in os.listdir(self.directory):
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def _recover(self):
+        """Load the snapshot, replay newer segments and rebuild the claim heaps"""
+        first_segment = 0
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path) as f:
+                snapshot = json.load(f)
+            first_segment = snapshot['segment']
+            for data in snapshot['jobs']:
+                self._load(Job.from_dict(data))
+
+        segments = [number for number in self._segment_numbers() if number >= first_segment]
+        for number in segments:
+            with open(self._segment_path(number)) as f:
+                for line in f:
+                    try:
+                        data = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn final write from a crash
+                        break
+                    self._load(Job.from_dict(data))
+
+        self._segment = (segments[-1] + 1) if segments else first_segment
+        self._open_segment()
+
+        for job in self._jobs.values():
+            if job.state == 'processing':
+                job.state = 'pending'
+                job.locked_by = None
+                job.locked_at = None
+                job.updated_at = get_utc_now()
+                self._record(job)
+            self._index(job)
+
+    def _load(self, job: Job):
+        if job.id not in self._order:
+            self._order[job.id] = next(self._seq)
+        self._jobs[job.id] = job
+
+    def _open_segment(self):
+        self._file = open(self._segment_path(self._segment), 'a', encoding='utf-8')
+
+    def _record(self, job: Job):
+        self._file.write(json.dumps(job.to_dict(), separators=(',', ':')) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+        self._records += 1
+        if self._records >= self.snapshot_every:
+            self._snapshot()
+        elif self._file.tell() >= self.segment_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self._file.close()
+        self._segment += 1
+        self._open_segment()
+
+    def _snapshot(self):
+        """Write every job to snapshot.json and delete the segments it covers (lock held)"""
+        self._rotate()
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        tmp_path = snapshot_path + ".tmp"
+
+        jobs = sorted(self._jobs.values(), key=lambda job: self._order[job.id])
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"segment": self._segment, "jobs": [job.to_dict() for job in jobs]}, f,
+                      separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, snapshot_path)
+
+        for number in self._segment_numbers():
+            if number < self._segment:
+                os.remove(self._segment_path(number))
+        self._records = 0
+
+    def snapshot(self):
+        """Compact the log into a snapshot now"""
+        with self._cond:
+            self._snapshot()
+
+    def close(self):
+        with self._cond:
+            if self._file is None:
+                return
+            self._snapshot()
+            self._file.close()
+            self._file = None
@@ -0,0 +1,271 @@
+"""
+In-memory storage backend: heap-ordered jobs in a single process
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import Counter
+from dataclasses import replace
+from typing import Dict, List, Optional, Tuple
+from queuectl.models import Job, ACTIVE_STATES, get_utc_now, get_unix_timestamp
+from queuectl.queue import DEDUP_POLICIES, DuplicateJobError, build_job
+from queuectl.payloads import encode_payload
+from queuectl.retry import ExponentialBackoff, parse_policy, plan_retry
+from queuectl.tags import requirement_key, satisfies
+from queuectl.backends.base import Backend
+
+
+# How often wait_for_work checks the stop event
+STOP_POLL_INTERVAL = 0.05
+
+
+class MemoryBackend(Backend):
+    """
+    Backend keeping every job in process memory
+
+    Due jobs sit in heaps ordered by enqueue order, one per requirement set
+    ('requires' tags), and delayed jobs in a heap ordered by run_after, so
+    claim is O(log n) per requirement set the worker's tags satisfy. Heap
+    entries are invalidated lazily: an entry is only honoured while its
+    token matches the job's current one.
+
+    Nothing survives the process, and only threads of this process can
+    share the queue; intended for tests, benchmarks and embedding.
+    Dependencies, groups and the result cache are not supported, and
+    claims are always FIFO (tenants are stored but not rotated) and never
+    throttled. Batchable jobs run one at a time with their own command.
+    Payloads are kept uncompressed, once per distinct content.
+
+    Args:
+        max_retries: Default max_retries for jobs that do not set one
+        dedup_policy: Default dedup policy (reject, return_existing, coalesce)
+        retry_max_delay: Cap on growing retry delays without their own max_delay
+    """
+    name = 'memory'
+
+    def __init__(self, max_retries: int = 3, dedup_policy: str = 'reject',
+                 retry_max_delay: Optional[float] = 3600.0):
+        self.max_retries = max_retries
+        self.dedup_policy = dedup_policy
+        self.retry_max_delay = retry_max_delay
+
+        self._cond = threading.Condition()
+        self._version = 0
+        self._jobs: Dict[str, Job] = {}
+        self._order: Dict[str, int] = {}
+        self._seq = itertools.count()
+        self._tokens: Dict[str, int] = {}
+        self._token_seq = itertools.count()
+        self._ready: Dict[str, List[Tuple[int, int, str]]] = {}
+        self._delayed: List[Tuple[float, int, str]] = []
+        self._dedup: Dict[str, str] = {}
+        self._payloads: Dict[str, str] = {}
+
+    def _record(self, job: Job):
+        """Called with the lock held after every change to a job"""
+        pass
+
+    def _index(self, job: Job):
+        """Register a stored job in the claim heaps and dedup map"""
+        if job.dedup_key is not None and job.state in ACTIVE_STATES:
+            self._dedup[job.dedup_key] = job.id
+        if job.state != 'pending':
+            self._tokens.pop(job.id, None)
+            return
+
+        token = next(self._token_seq)
+        self._tokens[job.id] = token
+        if job.run_after and job.run_after > get_unix_timestamp():
+            heapq.heappush(self._delayed, (job.run_after, token, job.id))
+        else:
+            self._push_ready(job, token)
+
+    def _push_ready(self, job: Job, token: int):
+        heapq.heappush(self._ready.setdefault(requirement_key(job.requires), []),
+                       (self._order[job.id], token, job.id))
+
+    def _release(self, job: Job):
+        """Drop a finished job from the dedup map"""
+        if job.dedup_key is not None and self._dedup.get(job.dedup_key) == job.id:
+            del self._dedup[job.dedup_key]
+
+    def _store(self, job: Job):
+        if job.id not in self._order:
+            self._order[job.id] = next(self._seq)
+        self._jobs[job.id] = job
+        self._index(job)
+        self._record(job)
+        self._version += 1
+        self._cond.notify_all()
+
+    def enqueue(self, job_data: dict) -> Job:
+        if job_data.get('depends_on') or job_data.get('group_id') is not None:
+            raise ValueError(f"The {self.name} backend does not support 'depends_on' or 'group_id'")
+
+        payload = encode_payload(job_data.get('payload'))
+        job = build_job(job_data, self.max_retries, payload)
+
+        dedup_policy = job_data.get('dedup_policy') or self.dedup_policy
+        if job.dedup_key is not None and dedup_policy not in DEDUP_POLICIES:
+            raise ValueError(
+                f"Invalid dedup_policy '{dedup_policy}' (expected one of: {', '.join(DEDUP_POLICIES)})"
+            )
+
+        with self._cond:
+            # As in SQLite, an unfinished job holding the dedup_key wins over an ID clash
+            existing_id = self._dedup.get(job.dedup_key) if job.dedup_key is not None else None
+            if existing_id is None and job.id in self._jobs:
+                raise DuplicateJobError(f"Job {job.id} already exists")
+
+            if existing_id is not None:
+                existing = self._jobs[existing_id]
+                if dedup_policy == 'reject':
+                    raise DuplicateJobError(
+                        f"Job with dedup_key '{job.dedup_key}' already queued: {existing.id}", replace(existing)
+                    )
+                if dedup_policy == 'coalesce' and existing.state == 'pending':
+                    existing.run_after = job.run_after
+                    existing.updated_at = job.created_at
+                    self._store(existing)
+                return replace(existing, deduplicated=True)
+
+            if payload is not None:
+                self._payloads.setdefault(payload.digest, payload.data.decode('utf-8'))
+            self._store(job)
+            return replace(job)
+
+    def get_payload(self, job: Job) -> Optional[str]:
+        if job.payload_hash is None:
+            return None
+        with self._cond:
+            return self._payloads.get(job.payload_hash)
+
+    def _pop_due(self, tags: Optional[List[str]] = None) -> Optional[str]:
+        """Pop the oldest due pending job ID whose requirements the tags satisfy (lock held)"""
+        now = get_unix_timestamp()
+        while self._delayed and self._delayed[0][0] <= now:
+            _, token, job_id = heapq.heappop(self._delayed)
+            if self._tokens.get(job_id) == token:
+                self._push_ready(self._jobs[job_id], token)
+
+        oldest = None
+        for key, heap in list(self._ready.items()):
+            if not satisfies(tags, key.split(',') if key else None):
+                continue
+            while heap and self._tokens.get(heap[0][2]) != heap[0][1]:
+                heapq.heappop(heap)
+            if not heap:
+                del self._ready[key]
+            elif oldest is None or heap[0] < oldest[0]:
+                oldest = heap
+        if oldest is None:
+            return None
+
+        _, _, job_id = heapq.heappop(oldest)
+        del self._tokens[job_id]
+        return job_id
+
+    def claim(self, worker_id: str, tags: Optional[List[str]] = None) -> Optional[Job]:
+        with self._cond:
+            job_id = self._pop_due(tags)
+            if job_id is None:
+                return None
+
+            job = self._jobs[job_id]
+            locked_at = get_utc_now()
+            job.state = 'processing'
+            job.locked_by = worker_id
+            job.locked_at = locked_at
+            job.updated_at = locked_at
+            self._record(job)
+            return replace(job)
+
+    def complete(self, job: Job, output: str = '') -> None:
+        with self._cond:
+            stored = self._jobs[job.id]
+            stored.state = 'completed'
+            stored.updated_at = get_utc_now()
+            stored.exit_code = 0
+            stored.locked_by = None
+            stored.locked_at = None
+            self._release(stored)
+            self._store(stored)
+
+    def fail(self, job: Job, output: str, backoff_base: float = 2.0,
+             exit_code: Optional[int] = None) -> str:
+        with self._cond:
+            stored = self._jobs[job.id]
+            if stored.retry_policy:
+                policy = parse_policy(stored.retry_policy)
+            else:
+                policy = ExponentialBackoff(base=backoff_base)
+            if policy.max_delay is None and policy.default_max_delay is not None:
+                policy.max_delay = self.retry_max_delay
+
+            delay, stored.attempts = plan_retry(policy, stored.attempts, stored.max_retries,
+                                                stored.last_delay, exit_code)
+            stored.updated_at = get_utc_now()
+            stored.last_error = output[:1000]
+            stored.exit_code = exit_code
+            stored.locked_by = None
+            stored.locked_at = None
+
+            if delay is not None:
+                stored.state = 'pending'
+                stored.run_after = round(get_unix_timestamp() + delay, 3)
+                stored.last_delay = delay
+            else:
+                stored.state = 'dead'
+                self._release(stored)
+
+            self._store(stored)
+            return stored.state
+
+    def release(self, job: Job) -> bool:
+        with self._cond:
+            stored = self._jobs.get(job.id)
+            if stored is None or stored.state != 'processing' or stored.locked_by != job.locked_by:
+                return False
+            stored.state = 'pending'
+            stored.locked_by = None
+            stored.locked_at = None
+            stored.updated_at = get_utc_now()
+            self._store(stored)
+            return True
+
+    def list_jobs(self, state: Optional[str] = None) -> List[Job]:
+        with self._cond:
+            jobs = [replace(job) for job in self._jobs.values() if state is None or job.state == state]
+        jobs.sort(key=lambda job: self._order[job.id], reverse=True)
+        return jobs
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return replace(job) if job else None
+
+    def stats(self) -> Dict:
+        with self._cond:
+            state_counts = dict(Counter(job.state for job in self._jobs.values()))
+        return {
+            "state_counts": state_counts,
+            "total_jobs": sum(state_counts.values()),
+        }
+
+    def next_run_after(self) -> Optional[float]:
+        with self._cond:
+            while self._delayed and self._tokens.get(self._delayed[0][2]) != self._delayed[0][1]:
+                heapq.heappop(self._delayed)
+            return self._delayed[0][0] if self._delayed else None
+
+    def wait_for_work(self, timeout: float, stop_event: Optional[threading.Event] = None) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            version = self._version
+            while self._version == version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or (stop_event is not None and stop_event.is_set()):
+                    return False
+                self._cond.wait(min(remaining, STOP_POLL_INTERVAL))
+            return True
@@ -0,0 +1,270 @@
+"""
+Sharded SQLite storage: jobs partitioned across several database files
+"""
+import heapq
+import os
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional
+from queuectl.db import get_db_path, ChangeWatcher
+from queuectl.models import Job
+from queuectl.batches import Batch
+from queuectl.backends.base import Backend
+from queuectl.limits import merge_queue_limits
+from queuectl.backends.sqlite import SQLiteBackend
+
+
+# What decides a job's shard
+#   id:    hash of the job ID (spreads every queue over all shards)
+#   queue: hash of the queue name (keeps each queue in one file)
+SHARD_KEYS = ('id', 'queue')
+
+# How often wait_for_work polls the shards for changes
+SHARD_POLL_INTERVAL = 0.05
+
+
+def get_shard_count() -> int:
+    """Get the number of shards from QUEUECTL_SHARDS (default 1: no sharding)"""
+    value = os.environ.get("QUEUECTL_SHARDS", "1")
+    try:
+        count = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid QUEUECTL_SHARDS value '{value}' (expected a positive integer)")
+    if count < 1:
+        raise ValueError(f"Invalid QUEUECTL_SHARDS value '{value}' (expected a positive integer)")
+    return count
+
+
+def get_shard_key() -> str:
+    """Get the routing key from QUEUECTL_SHARD_BY (default 'id')"""
+    shard_by = os.environ.get("QUEUECTL_SHARD_BY", "id")
+    if shard_by not in SHARD_KEYS:
+        raise ValueError(f"Invalid QUEUECTL_SHARD_BY value '{shard_by}' (expected one of: {', '.join(SHARD_KEYS)})")
+    return shard_by
+
+
+def get_shard_paths(count: Optional[int] = None) -> List[str]:
+    """
+    Get the database file of every shard
+
+    Shard 0 is the main database (get_db_path()), which also holds config,
+    schedules and groups; shard N is '<name>.shardN<ext>' next to it.
+    """
+    count = get_shard_count() if count is None else count
+    main = get_db_path()
+    root, ext = os.path.splitext(main)
+    return [main] + [f"{root}.shard{index}{ext}" for index in range(1, count)]
+
+
+def shard_index(key: str, count: int) -> int:
+    """Stable shard number for a routing key (same in every process)"""
+    return zlib.crc32(key.encode('utf-8')) % count
+
+
+class ShardedBackend(Backend):
+    """
+    Backend spreading jobs over several SQLite files
+
+    Each shard has its own writer lock, so producers and workers hitting
+    different shards commit in parallel. Workers claim from their home
+    shard first and steal from the other shards in rotation when it is
+    empty. Reads (list, stats) merge all shards.
+
+    Claims are FIFO within a shard, not across shards. Jobs with a
+    dedup_key are routed by that key so deduplication still holds.
+    Dependencies are not supported across shards, so jobs with
+    'depends_on' are rejected; group members stay on shard 0 with their
+    group. Batches are gathered within one shard.
+
+    Args:
+        paths: Shard database files (default: get_shard_paths())
+        shard_by: Routing key, 'id' or 'queue' (default: get_shard_key())
+        home: Shard this worker claims from first (default: PID modulo shard count)
+    """
+    name = 'sharded'
+
+    def __init__(self, paths: Optional[List[str]] = None, shard_by: Optional[str] = None,
+                 home: Optional[int] = None):
+        paths = paths or get_shard_paths()
+        self.shard_by = shard_by or get_shard_key()
+        if self.shard_by not in SHARD_KEYS:
+            raise ValueError(f"Invalid shard key '{self.shard_by}' (expected one of: {', '.join(SHARD_KEYS)})")
+
+        self.shards = [SQLiteBackend(path) for path in paths]
+        self.home = (os.getpid() if home is None else home) % len(self.shards)
+        self._claimed: Dict[str, int] = {}
+        self._watchers: Optional[List[ChangeWatcher]] = None
+
+    def _route(self, job_data: dict) -> int:
+        if job_data.get('group_id') is not None:
+            return 0
+        # Jobs sharing a dedup_key must meet in one shard's unique index
+        if job_data.get('dedup_key') is not None:
+            return shard_index(str(job_data['dedup_key']), len(self.shards))
+        if self.shard_by == 'queue':
+            return shard_index(job_data.get('queue') or 'default', len(self.shards))
+        return shard_index(str(job_data['id']), len(self.shards))
+
+    def _shard_of(self, job: Job) -> SQLiteBackend:
+        """Shard holding a job (known for jobs this process claimed, searched otherwise)"""
+        index = self._claimed.pop(job.id, None)
+        if index is not None:
+            return self.shards[index]
+        for shard in self.shards:
+            if shard.get_job(job.id) is not None:
+                return shard
+        return self.shards[self._route(job.to_dict())]
+
+    def enqueue(self, job_data: dict) -> Job:
+        if 'id' not in job_data or 'command' not in job_data:
+            raise ValueError("Job must contain 'id' and 'command' fields")
+        if job_data.get('depends_on'):
+            raise ValueError("'depends_on' is not supported with sharded storage (QUEUECTL_SHARDS > 1)")
+        return self.shards[self._route(job_data)].enqueue(job_data)
+
+    def claim(self, worker_id: str, tags: Optional[List[str]] = None) -> Optional[Job]:
+        count = len(self.shards)
+        for offset in range(count):
+            index = (self.home + offset) % count
+            job = self.shards[index].claim(worker_id, tags)
+            if job is not None:
+                self._claimed[job.id] = index
+                return job
+        return None
+
+    def gather_batch(self, job: Job) -> Optional[Batch]:
+        # A batch comes from the shard its lead was claimed from
+        index = self._claimed.get(job.id)
+        if index is None or job.batch is None:
+            return None
+        batch = self.shards[index].gather_batch(job)
+        if batch is not None:
+            for member in batch.jobs[1:]:
+                self._claimed[member.id] = index
+        return batch
+
+    def get_payload(self, job: Job) -> Optional[str]:
+        # A payload is stored in its job's shard
+        if job.payload_hash is None:
+            return None
+        index = self._claimed.get(job.id)
+        shards = [self.shards[index]] if index is not None else self.shards
+        for shard in shards:
+            payload = shard.get_payload(job)
+            if payload is not None:
+                return payload
+        return None
+
+    def complete(self, job: Job, output: str = '') -> None:
+        self._shard_of(job).complete(job, output)
+
+    def fail(self, job: Job, output: str, backoff_base: float = 2.0,
+             exit_code: Optional[int] = None) -> str:
+        return self._shard_of(job).fail(job, output, backoff_base, exit_code)
+
+    def release(self, job: Job) -> bool:
+        return self._shard_of(job).release(job)
+
+    def complete_from_cache(self, job: Job) -> bool:
+        if not job.cache_key:
+            return False
+        index = self._claimed.get(job.id)
+        if index is None:
+            return self._shard_of(job).complete_from_cache(job)
+        if not self.shards[index].complete_from_cache(job):
+            return False
+        self._claimed.pop(job.id, None)
+        return True
+
+    def list_jobs(self, state: Optional[str] = None, replica: bool = False) -> List[Job]:
+        # Each shard lists newest first, so a k-way merge keeps the order
+        return list(heapq.merge(
+            *(shard.list_jobs(state, replica) for shard in self.shards),
+            key=lambda job: job.created_at or '', reverse=True
+        ))
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        for shard in self.shards:
+            job = shard.get_job(job_id)
+            if job is not None:
+                return job
+        return None
+
+    def get_jobs(self, job_ids: List[str]) -> Dict[str, Job]:
+        jobs: Dict[str, Job] = {}
+        for shard in self.shards:
+            missing = [job_id for job_id in job_ids if job_id not in jobs]
+            if not missing:
+                break
+            jobs.update(shard.get_jobs(missing))
+        return jobs
+
+    def stats(self, replica: bool = False) -> Dict:
+        shard_stats = [shard.stats(replica) for shard in self.shards]
+
+        state_counts: Dict[str, int] = {}
+        cache = {"hits": 0, "misses": 0, "entries": 0}
+        for stats in shard_stats:
+            for state, count in stats['state_counts'].items():
+                state_counts[state] = state_counts.get(state, 0) + count
+            for key in cache:
+                cache[key] += stats['cache'][key]
+
+        return {
+            "state_counts": state_counts,
+            "workers": shard_stats[0]['workers'],
+            "worker_pids": shard_stats[0]['worker_pids'],
+            "total_jobs": sum(state_counts.values()),
+            "cache": cache,
+            "queue_limits": merge_queue_limits([stats['queue_limits'] for stats in shard_stats]),
+            "shards": [
+                {"path": shard.path, "total_jobs": stats['total_jobs'],
+                 "pending": stats['state_counts'].get('pending', 0)}
+                for shard, stats in zip(self.shards, shard_stats)
+            ],
+        }
+
+    def next_run_after(self) -> Optional[float]:
+        times = [t for t in (shard.next_run_after() for shard in self.shards) if t is not None]
+        return min(times) if times else None
+
+    def record_backpressure(self, queue: str, event: str) -> None:
+        # Limits live on the queue's shard when routing by queue, on every shard otherwise
+        index = shard_index(queue, len(self.shards)) if self.shard_by == 'queue' else 0
+        self.shards[index].record_backpressure(queue, event)
+
+    # The worker registry lives on shard 0, with the config
+
+    def register_worker(self, info: dict) -> None:
+        self.shards[0].register_worker(info)
+
+    def worker_heartbeat(self, info: dict, stopped: bool = False) -> bool:
+        return self.shards[0].worker_heartbeat(info, stopped)
+
+    def list_workers(self) -> List[Dict]:
+        return self.shards[0].list_workers()
+
+    def stop_workers(self, worker_ids: Optional[List[str]] = None) -> List[Dict]:
+        return self.shards[0].stop_workers(worker_ids)
+
+    def wait_for_work(self, timeout: float, stop_event: Optional[threading.Event] = None) -> bool:
+        if self._watchers is None:
+            self._watchers = [ChangeWatcher(shard.path) for shard in self.shards]
+
+        deadline = time.monotonic() + timeout
+        while True:
+            # Check every shard (no short-circuit) so each watcher's version stays current
+            if any([watcher.changed() for watcher in self._watchers]):
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (stop_event is not None and stop_event.is_set()):
+                return False
+            time.sleep(min(SHARD_POLL_INTERVAL, remaining))
+
+    def close(self):
+        for watcher in self._watchers or []:
+            watcher.close()
+        self._watchers = None
+        for shard in self.shards:
+            shard.close()
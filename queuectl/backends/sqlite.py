@@ -0,0 +1,396 @@
+"""
+SQLite storage backend: the job lifecycle statements against queuectl.db
+"""
+import threading
+from typing import Dict, List, Optional
+from queuectl.db import get_db, get_read_db, init_db, use_db_path, ChangeWatcher
+from queuectl.models import Job, JOB_SELECT_COLUMNS, get_utc_now, get_unix_timestamp
+from queuectl.config import read_config
+from queuectl.cache import lookup_cached_result, store_cached_result
+from queuectl.retry import resolve_policy, plan_retry
+from queuectl.dag import on_job_completed, on_job_dead
+from queuectl.groups import record_group_outcome, record_outcomes_by_job
+from queuectl.limits import release_slots, release_slots_by_job, record_backpressure_event
+from queuectl.queue import enqueue_job, list_jobs, get_job, get_jobs, get_payload, get_status, release_job
+from queuectl.tags import eligible_requirements
+from queuectl.tenants import pick_fair_job
+from queuectl.throttles import ClaimThrottles, has_throttles, next_token_at
+from queuectl.batches import Batch, claim_batch_members, get_batch_type, lingering_batches, render_command
+from queuectl.workers import register_worker, heartbeat_worker, get_workers, request_worker_stop
+from queuectl.backends.base import Backend
+
+
+def claim_job(worker_id: str, tags: Optional[List[str]] = None) -> Optional[Job]:
+    """
+    Atomically claim a pending job
+    
+    Only jobs whose 'requires' tags are all among the worker's tags are
+    considered; they are found through idx_jobs_pending_requires, one
+    index range per requirement set the tags satisfy. The index is named
+    explicitly: without statistics the planner would rather walk
+    idx_jobs_state_run_after and skip over the jobs the worker cannot run.
+    
+    With claim_strategy 'fair' the job is picked by weighted round-robin
+    over tenants instead (see queuectl.tenants.pick_fair_job), under the
+    write lock, since every claim advances the shared rotation.
+    
+    When throttles exist, the claim also runs under the write lock: queues
+    and throttle keys that are out of tokens or at their max_in_flight
+    are left out of the pick, and the claimed job's buckets are charged
+    in the same transaction (see queuectl.throttles).
+    
+    Batch types still lingering for a fuller batch are left out of the
+    pick as well (see queuectl.batches.lingering_batches).
+    
+    Args:
+        worker_id: Unique worker identifier
+        tags: Capability tags the worker advertises
+    
+    Returns:
+        Claimed Job object or None if no jobs available
+    """
+    current_ts = get_unix_timestamp()
+    
+    with get_db('claim') as conn:
+        cursor = conn.cursor()
+        
+        fair = read_config(cursor, 'claim_strategy', 'fifo') == 'fair'
+        throttled = has_throttles(cursor)
+        if fair or throttled:
+            cursor.execute("BEGIN IMMEDIATE")
+        
+        throttles = ClaimThrottles(cursor, current_ts) if throttled else None
+        exclude, exclude_params = throttles.clause() if throttles else ("", [])
+        lingering, _ = lingering_batches(cursor, current_ts)
+        if lingering:
+            exclude += f" AND (batch IS NULL OR batch NOT IN ({', '.join('?' for _ in lingering)}))"
+            exclude_params = [*exclude_params, *lingering]
+        eligible = eligible_requirements(cursor, tags)
+        
+        if fair:
+            job_id = pick_fair_job(cursor, eligible, current_ts, exclude, exclude_params)
+            if job_id is None:
+                return None
+        else:
+            cursor.execute(f"""
+                SELECT id FROM jobs INDEXED BY idx_jobs_pending_requires
+                WHERE state = 'pending' AND requires IN ({', '.join('?' for _ in eligible)}) AND run_after <= ?
+                    {exclude}
+                ORDER BY created_at
+                LIMIT 1
+            """, (*eligible, current_ts, *exclude_params))
+            
+            row = cursor.fetchone()
+            if not row:
+                return None
+            
+            job_id = row[0]
+        locked_at = get_utc_now()
+        
+        cursor.execute("""
+            UPDATE jobs
+            SET state = 'processing',
+                locked_by = ?,
+                locked_at = ?,
+                updated_at = ?
+            WHERE id = ? AND state = 'pending'
+        """, (worker_id, locked_at, locked_at, job_id))
+        
+        if cursor.rowcount == 0:
+            return None
+        
+        cursor.execute(f"""
+            SELECT {JOB_SELECT_COLUMNS}
+            FROM jobs
+            WHERE id = ?
+        """, (job_id,))
+        
+        job = Job.from_db_row(cursor.fetchone())
+        if throttles is not None:
+            throttles.take(cursor, job.queue, job.throttle_key)
+        return job
+
+
+def gather_batch(job: Job) -> Optional[Batch]:
+    """
+    Claim the jobs that run together with a claimed batchable job
+    
+    Compatible due jobs (see queuectl.batches.claim_batch_members) are
+    locked to the same worker, up to the batch type's max_size and what
+    the job's throttles still allow, charging their buckets.
+    
+    Args:
+        job: Job just claimed, with 'batch' set
+    
+    Returns:
+        The batch led by job, or None if it runs alone (no other due
+        compatible job, or an unknown batch type)
+    """
+    current_ts = get_unix_timestamp()
+    
+    with get_db('claim') as conn:
+        cursor = conn.cursor()
+        
+        batch_type = get_batch_type(cursor, job.batch)
+        if batch_type is None:
+            return None
+        
+        limit = batch_type['max_size'] - 1
+        throttles = None
+        if has_throttles(cursor):
+            cursor.execute("BEGIN IMMEDIATE")
+            throttles = ClaimThrottles(cursor, current_ts)
+            allowance = throttles.allowance(job.queue, job.throttle_key)
+            if allowance is not None:
+                limit = min(limit, allowance)
+        if limit <= 0:
+            return None
+        
+        members = claim_batch_members(cursor, job, current_ts, limit)
+        if not members:
+            return None
+        if throttles is not None:
+            throttles.take(cursor, job.queue, job.throttle_key, len(members))
+        
+        jobs = [job] + members
+        return Batch(render_command(batch_type['command'], [member.batch_item for member in jobs]), jobs)
+
+
+def _mark_completed(cursor, job: Job):
+    """Mark a job completed, unblock its dependents and count it towards its group"""
+    cursor.execute("""
+        UPDATE jobs
+        SET state = 'completed',
+            updated_at = ?,
+            exit_code = 0,
+            locked_by = NULL,
+            locked_at = NULL
+        WHERE id = ?
+    """, (get_utc_now(), job.id))
+    on_job_completed(cursor, job.id)
+    if job.group_id is not None:
+        record_group_outcome(cursor, job.group_id, 'completed')
+    release_slots(cursor, job.queue)
+
+
+def complete_from_cache(job: Job) -> bool:
+    """
+    Complete a job from the result cache instead of executing it
+    
+    Args:
+        job: Claimed job with a cache_key
+    
+    Returns:
+        True if a fresh cached result existed and the job was completed
+    """
+    with get_db('result') as conn:
+        cursor = conn.cursor()
+        
+        if lookup_cached_result(cursor, job.cache_key) is None:
+            return False
+        
+        _mark_completed(cursor, job)
+        return True
+
+
+def handle_job_result(job: Job, success: bool, output: str, backoff_base: float,
+                      exit_code: Optional[int] = None) -> str:
+    """
+    Update job state based on execution result
+    
+    Failures are retried according to the job's retry policy (see
+    queuectl.retry.resolve_policy); its exit-code rules can send a job
+    straight to the DLQ or retry it without counting an attempt.
+    
+    Args:
+        job: Job that was executed
+        success: Whether execution succeeded
+        output: Output or error message
+        backoff_base: Exponential backoff base for the default retry policy
+        exit_code: Command exit code, if it ran to completion
+    
+    Returns:
+        New job state
+    """
+    with get_db('result') as conn:
+        cursor = conn.cursor()
+        
+        if success:
+            _mark_completed(cursor, job)
+            
+            if job.cache_key:
+                store_cached_result(cursor, job.cache_key, output)
+        
+            return 'completed'
+        
+        else:
+            policy = resolve_policy(cursor, job.retry_policy, job.queue, backoff_base)
+            delay, new_attempts = plan_retry(policy, job.attempts, job.max_retries,
+                                             job.last_delay, exit_code)
+            
+            if delay is not None:
+                run_after = round(get_unix_timestamp() + delay, 3)
+                
+                cursor.execute("""
+                    UPDATE jobs
+                    SET state = 'pending',
+                        attempts = ?,
+                        run_after = ?,
+                        last_delay = ?,
+                        updated_at = ?,
+                        last_error = ?,
+                        exit_code = ?,
+                        locked_by = NULL,
+                        locked_at = NULL
+                    WHERE id = ?
+                """, (new_attempts, run_after, delay, get_utc_now(), output[:1000], exit_code, job.id))
+                return 'pending'
+            
+            else:
+                cursor.execute("""
+                    UPDATE jobs
+                    SET state = 'dead',
+                        attempts = ?,
+                        updated_at = ?,
+                        last_error = ?,
+                        exit_code = ?,
+                        locked_by = NULL,
+                        locked_at = NULL
+                    WHERE id = ?
+                """, (new_attempts, get_utc_now(), output[:1000], exit_code, job.id))
+                cascaded = on_job_dead(cursor, job.id, read_config(cursor, 'dep_failure_policy', 'cascade'))
+                if job.group_id is not None:
+                    record_group_outcome(cursor, job.group_id, 'dead')
+                record_outcomes_by_job(cursor, cascaded, 'dead')
+                release_slots(cursor, job.queue)
+                release_slots_by_job(cursor, cascaded)
+                return 'dead'
+
+
+def get_next_run_after() -> Optional[float]:
+    """
+    Get the earliest future run_after among pending jobs (index lookup),
+    or the earliest refill of an empty throttle bucket or end of a batch
+    linger if that comes first
+    """
+    now = get_unix_timestamp()
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT MIN(run_after) FROM jobs
+            WHERE state = 'pending' AND run_after > ?
+        """, (now,))
+        row = cursor.fetchone()
+        _, linger_until = lingering_batches(cursor, now)
+        times = [t for t in (row[0] if row else None, next_token_at(cursor, now), linger_until) if t is not None]
+        return min(times) if times else None
+
+
+class SQLiteBackend(Backend):
+    """
+    Backend over a SQLite database file (the default engine)
+
+    Supports every job feature (dependencies, groups, dedup, result cache,
+    payloads) and any number of worker processes sharing the file. list_jobs and
+    stats also accept replica=True to read the replica file.
+
+    Args:
+        path: Database file (default: get_db_path())
+    """
+    name = 'sqlite'
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._watcher: Optional[ChangeWatcher] = None
+        with use_db_path(self.path):
+            init_db()
+
+    def enqueue(self, job_data: dict) -> Job:
+        with use_db_path(self.path):
+            return enqueue_job(job_data)
+
+    def claim(self, worker_id: str, tags: Optional[List[str]] = None) -> Optional[Job]:
+        with use_db_path(self.path):
+            return claim_job(worker_id, tags)
+
+    def gather_batch(self, job: Job) -> Optional[Batch]:
+        if job.batch is None:
+            return None
+        with use_db_path(self.path):
+            return gather_batch(job)
+
+    def get_payload(self, job: Job) -> Optional[str]:
+        if job.payload_hash is None:
+            return None
+        with use_db_path(self.path):
+            return get_payload(job.payload_hash)
+
+    def complete(self, job: Job, output: str = '') -> None:
+        with use_db_path(self.path):
+            handle_job_result(job, True, output, 0.0)
+
+    def fail(self, job: Job, output: str, backoff_base: float = 2.0,
+             exit_code: Optional[int] = None) -> str:
+        with use_db_path(self.path):
+            return handle_job_result(job, False, output, backoff_base, exit_code)
+
+    def release(self, job: Job) -> bool:
+        with use_db_path(self.path):
+            return release_job(job.id, job.locked_by)
+
+    def complete_from_cache(self, job: Job) -> bool:
+        if not job.cache_key:
+            return False
+        with use_db_path(self.path):
+            return complete_from_cache(job)
+
+    def list_jobs(self, state: Optional[str] = None, replica: bool = False) -> List[Job]:
+        with use_db_path(self.path):
+            return list_jobs(state, replica)
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        with use_db_path(self.path):
+            return get_job(job_id)
+
+    def get_jobs(self, job_ids: List[str]) -> Dict[str, Job]:
+        with use_db_path(self.path):
+            return get_jobs(job_ids)
+
+    def stats(self, replica: bool = False) -> Dict:
+        with use_db_path(self.path):
+            return get_status(replica)
+
+    def next_run_after(self) -> Optional[float]:
+        with use_db_path(self.path):
+            return get_next_run_after()
+
+    def record_backpressure(self, queue: str, event: str) -> None:
+        with use_db_path(self.path):
+            record_backpressure_event(queue, event)
+
+    def register_worker(self, info: dict) -> None:
+        with use_db_path(self.path):
+            register_worker(info)
+
+    def worker_heartbeat(self, info: dict, stopped: bool = False) -> bool:
+        with use_db_path(self.path):
+            return heartbeat_worker(info, stopped)
+
+    def list_workers(self) -> List[Dict]:
+        with use_db_path(self.path), get_read_db() as conn:
+            return get_workers(conn.cursor())
+
+    def stop_workers(self, worker_ids: Optional[List[str]] = None) -> List[Dict]:
+        with use_db_path(self.path):
+            return request_worker_stop(worker_ids)
+
+    def wait_for_work(self, timeout: float, stop_event: Optional[threading.Event] = None) -> bool:
+        # Commits by producers and other workers bump data_version
+        if self._watcher is None:
+            self._watcher = ChangeWatcher(self.path)
+        return self._watcher.wait(timeout, stop_event)
+
+    def close(self):
+        if self._watcher is not None:
+            self._watcher.close()
+            self._watcher = None
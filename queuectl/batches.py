@@ -0,0 +1,203 @@
+"""
+Batchable jobs: compatible pending jobs claimed together and run as one process
+"""
+import json
+import shlex
+import sqlite3
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from queuectl.db import get_db
+from queuectl.models import Job, JOB_COLUMNS, JOB_SELECT_COLUMNS
+
+
+BATCH_TYPE_COLUMNS = ("name", "command", "max_size", "linger")
+BATCH_TYPE_SELECT_COLUMNS = ", ".join(BATCH_TYPE_COLUMNS)
+
+# Placeholder in a batch type's command for the batch's items, shell-quoted
+ITEMS_PLACEHOLDER = '{items}'
+
+# Environment variable holding the batch's items, one per line
+ITEMS_ENV_VAR = 'QUEUECTL_BATCH_ITEMS'
+
+# Columns that must match for jobs to share an execution (besides 'batch')
+COMPATIBLE_COLUMNS = ("queue", "tenant", "requires", "throttle_key", "env")
+
+
+@dataclass
+class Batch:
+    """Jobs claimed together (the job claimed first leads) and the command that runs them"""
+    command: str
+    jobs: List[Job]
+
+    def items(self) -> List[str]:
+        return [job.batch_item for job in self.jobs]
+
+    def to_dict(self) -> dict:
+        return {"command": self.command, "jobs": [job.to_dict() for job in self.jobs]}
+
+    @staticmethod
+    def from_dict(data: dict) -> 'Batch':
+        return Batch(data['command'], [Job.from_dict(job) for job in data['jobs']])
+
+
+def render_command(template: str, items: List[str]) -> str:
+    """Substitute the shell-quoted items for {items} in a batch type's command"""
+    return template.replace(ITEMS_PLACEHOLDER, ' '.join(shlex.quote(item) for item in items))
+
+
+def set_batch_type(name: str, command: str, max_size: int, linger: float = 0.0):
+    """
+    Declare how jobs with 'batch' set to name are run together
+
+    Args:
+        name: Batch type jobs refer to
+        command: Command running a whole batch; {items} is replaced by the
+                 items, which are also in QUEUECTL_BATCH_ITEMS
+        max_size: Most jobs per batch
+        linger: Seconds due jobs wait for a full batch before a smaller one runs
+
+    Raises:
+        ValueError: If the command is empty, max_size is below 2 or linger is negative
+    """
+    if not command.strip():
+        raise ValueError("A batch type needs a command")
+    if max_size < 2:
+        raise ValueError("max_size must be at least 2")
+    if linger < 0:
+        raise ValueError("linger must not be negative")
+    with get_db('config') as conn:
+        conn.execute(f"""
+            INSERT OR REPLACE INTO batch_types ({BATCH_TYPE_SELECT_COLUMNS})
+            VALUES (?, ?, ?, ?)
+        """, (name, command, max_size, linger))
+
+
+def remove_batch_type(name: str) -> bool:
+    """Remove a batch type, returning False if there was none (its jobs then run one at a time)"""
+    with get_db('config') as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM batch_types WHERE name = ?", (name,))
+        return cursor.rowcount > 0
+
+
+def get_batch_types(cursor: sqlite3.Cursor) -> List[Dict]:
+    cursor.execute(f"SELECT {BATCH_TYPE_SELECT_COLUMNS} FROM batch_types ORDER BY name")
+    return [dict(zip(BATCH_TYPE_COLUMNS, row)) for row in cursor.fetchall()]
+
+
+def get_batch_type(cursor: sqlite3.Cursor, name: str) -> Optional[Dict]:
+    cursor.execute(f"SELECT {BATCH_TYPE_SELECT_COLUMNS} FROM batch_types WHERE name = ?", (name,))
+    row = cursor.fetchone()
+    return dict(zip(BATCH_TYPE_COLUMNS, row)) if row else None
+
+
+def lingering_batches(cursor: sqlite3.Cursor, now: float) -> Tuple[List[str], Optional[float]]:
+    """
+    Batch types whose due jobs are still waiting for a fuller batch
+
+    A batch type lingers while it has fewer than max_size due jobs and the
+    oldest became due less than linger seconds ago. Each check reads at
+    most max_size entries of idx_jobs_pending_batch.
+
+    Returns:
+        Tuple of (lingering batch type names, earliest time one stops lingering)
+    """
+    cursor.execute("SELECT name, max_size, linger FROM batch_types WHERE linger > 0")
+    names, until = [], None
+    for name, max_size, linger in cursor.fetchall():
+        cursor.execute("""
+            SELECT COUNT(*), MIN(run_after) FROM (
+                SELECT run_after FROM jobs INDEXED BY idx_jobs_pending_batch
+                WHERE state = 'pending' AND batch = ? AND run_after <= ?
+                ORDER BY run_after
+                LIMIT ?
+            )
+        """, (name, now, max_size))
+        count, oldest = cursor.fetchone()
+        if 0 < count < max_size and oldest + linger > now:
+            names.append(name)
+            until = oldest + linger if until is None else min(until, oldest + linger)
+    return names, until
+
+
+def claim_batch_members(cursor: sqlite3.Cursor, job: Job, now: float, limit: int) -> List[Job]:
+    """
+    Claim up to limit due pending jobs that can run in one execution with job
+
+    Members share the job's batch type and every COMPATIBLE_COLUMNS value,
+    so the batch runs with one environment, passes the same tag and
+    throttle checks, and stays within one tenant's turn. They are locked
+    to the job's worker, oldest first.
+    """
+    stored = dict(zip(JOB_COLUMNS, job.to_db_row()))
+    cursor.execute(f"""
+        SELECT id FROM jobs INDEXED BY idx_jobs_pending_batch
+        WHERE state = 'pending' AND batch = ? AND run_after <= ?
+          AND {' AND '.join(f'{column} IS ?' for column in COMPATIBLE_COLUMNS)}
+        ORDER BY run_after
+        LIMIT ?
+    """, (job.batch, now, *(stored[column] for column in COMPATIBLE_COLUMNS), limit))
+    job_ids = [row[0] for row in cursor.fetchall()]
+    if not job_ids:
+        return []
+
+    placeholders = ', '.join('?' for _ in job_ids)
+    cursor.execute(f"""
+        UPDATE jobs
+        SET state = 'processing',
+            locked_by = ?,
+            locked_at = ?,
+            updated_at = ?
+        WHERE id IN ({placeholders}) AND state = 'pending'
+    """, (job.locked_by, job.locked_at, job.locked_at, *job_ids))
+    cursor.execute(f"""
+        SELECT {JOB_SELECT_COLUMNS} FROM jobs
+        WHERE id IN ({placeholders}) AND state = 'processing' AND locked_by = ? AND locked_at = ?
+        ORDER BY run_after
+    """, (*job_ids, job.locked_by, job.locked_at))
+    return [Job.from_db_row(row) for row in cursor.fetchall()]
+
+
+def parse_batch_results(stdout: str, items: List[str], returncode: Optional[int],
+                        stderr: str = '') -> Dict[str, Tuple[bool, str, Optional[int]]]:
+    """
+    Map a batch's output back to its items
+
+    The batch command reports each item as one JSON line on stdout:
+
+        {"item": "42", "ok": true, "output": "..."}
+        {"item": "43", "ok": false, "error": "...", "exit_code": 3}
+
+    Other lines are ignored. An item without a result line failed, with
+    the batch's exit code if it was non-zero.
+
+    Returns:
+        Item -> (success, output or error, exit code), like execute_job
+    """
+    wanted = set(items)
+    results = {}
+    for line in stdout.splitlines():
+        line = line.strip()
+        if not line.startswith('{'):
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if not isinstance(record, dict) or str(record.get('item')) not in wanted:
+            continue
+
+        if record.get('ok') is True:
+            results[str(record['item'])] = (True, str(record.get('output') or ''), 0)
+        else:
+            exit_code = record.get('exit_code')
+            results[str(record['item'])] = (False, str(record.get('error') or 'Item failed'),
+                                            exit_code if isinstance(exit_code, int) else None)
+
+    for item in items:
+        if item not in results:
+            message = f"No result reported for item '{item}' (batch exit code {returncode})"
+            if stderr:
+                message += f": {stderr[:500]}"
+            results[item] = (False, message, returncode or None)
+    return results
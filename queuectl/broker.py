@@ -0,0 +1,653 @@
+"""
+Network broker: one process owns the database, remote workers connect over a socket
+
+Protocol: newline-delimited JSON over TCP or a Unix socket. Every request
+carries a client-chosen "id" and an "op"; every response echoes the id:
+
+    -> {"id": 1, "op": "enqueue", "job": {"id": "job1", "command": "echo hi"}}
+    <- {"id": 1, "ok": true, "result": {...job...}}
+    <- {"id": 2, "ok": false, "error": "...", "type": "ValueError"}
+
+Requests on one connection may be pipelined (sent without waiting for
+earlier responses). Storage calls run in submission order on a single
+thread, so pipelined writes apply in the order they were sent, while
+responses may come back out of order (e.g. a pending "wait").
+
+Claimed jobs are leased to the claiming worker. Workers renew leases with
+"heartbeat"; jobs whose lease expires go back to pending.
+"""
+import asyncio
+import itertools
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+from queuectl.models import Job
+from queuectl.config import get_config_float
+from queuectl.db import use_db_path
+from queuectl.queue import DuplicateJobError
+from queuectl.limits import QueueFullError
+from queuectl.tags import parse_tags
+from queuectl.batches import Batch
+from queuectl.backends.base import Backend
+
+
+DEFAULT_PORT = 7070
+DEFAULT_LEASE = 30.0
+
+# Largest accepted request or response line
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+# How often expired leases are requeued
+REAPER_INTERVAL = 1.0
+
+# Longest single 'wait' request; clients loop for longer waits
+MAX_WAIT = 5.0
+
+
+def parse_address(address: str) -> Tuple[Optional[str], Optional[int], Optional[str]]:
+    """
+    Parse a broker address
+
+    Accepts 'host:port', ':port', or a Unix socket as 'unix:/path' or any
+    value containing '/'.
+
+    Returns:
+        Tuple of (host, port, unix socket path)
+    """
+    if address.startswith('unix:'):
+        return None, None, address[len('unix:'):]
+    if '/' in address:
+        return None, None, address
+
+    host, _, port = address.rpartition(':')
+    try:
+        return host or '127.0.0.1', int(port), None
+    except ValueError:
+        raise ValueError(f"Invalid broker address '{address}' (expected host:port or unix:/path)")
+
+
+@dataclass
+class Lease:
+    """A claimed job and the worker that holds it"""
+    job: Job
+    worker_id: str
+    expires: float
+
+
+class Broker:
+    """
+    Serve a storage backend to remote workers
+
+    Args:
+        backend: Backend the broker owns and closes when it stops
+                 (normally SQLite or sharded SQLite)
+        lease: Seconds a claimed job stays leased without a heartbeat
+    """
+
+    def __init__(self, backend: Backend, lease: float = DEFAULT_LEASE):
+        self.backend = backend
+        self.lease = lease
+        self.leases: Dict[str, Lease] = {}
+
+        # One thread runs every storage call, in submission order; a second
+        # one runs the shared change watcher
+        self._storage = ThreadPoolExecutor(max_workers=1, thread_name_prefix="broker-storage")
+        self._watch = ThreadPoolExecutor(max_workers=1, thread_name_prefix="broker-watch")
+        self._work_event: Optional[asyncio.Event] = None
+        self._server = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.ops = {
+            "hello": self.op_hello,
+            "enqueue": self.op_enqueue,
+            "claim_batch": self.op_claim_batch,
+            "gather_batch": self.op_gather_batch,
+            "get_payload": self.op_get_payload,
+            "heartbeat": self.op_heartbeat,
+            "complete": self.op_complete,
+            "fail": self.op_fail,
+            "complete_from_cache": self.op_complete_from_cache,
+            "release": self.op_release,
+            "get": self.op_get,
+            "list": self.op_list,
+            "status": self.op_status,
+            "next_run_after": self.op_next_run_after,
+            "record_backpressure": self.op_record_backpressure,
+            "register_worker": self.op_register_worker,
+            "worker_heartbeat": self.op_worker_heartbeat,
+            "list_workers": self.op_list_workers,
+            "stop_workers": self.op_stop_workers,
+            "wait": self.op_wait,
+        }
+
+    async def _call(self, func, *args):
+        """Run a storage call on the storage thread"""
+        return await asyncio.get_running_loop().run_in_executor(self._storage, func, *args)
+
+    # Operations
+
+    def _read_config(self, key: str, default: float) -> float:
+        # From the backend's own database (a sharded backend keeps config in the main one)
+        with use_db_path(getattr(self.backend, 'path', None)):
+            return get_config_float(key, default)
+
+    async def op_hello(self, request: dict) -> dict:
+        backoff_base = await self._call(self._read_config, 'backoff_base', 2.0)
+        idle_max_wait = await self._call(self._read_config, 'idle_max_wait', 5.0)
+        return {"lease": self.lease, "backoff_base": backoff_base, "idle_max_wait": idle_max_wait}
+
+    async def op_enqueue(self, request: dict) -> dict:
+        job = await self._call(self.backend.enqueue, request['job'])
+        self._work_event.set()
+        return job.to_dict()
+
+    async def op_claim_batch(self, request: dict) -> List[dict]:
+        worker_id = request['worker_id']
+        limit = max(1, int(request.get('max', 1)))
+        tags = parse_tags(request.get('tags'), 'tags')
+
+        def claim_batch() -> List[Job]:
+            jobs = []
+            while len(jobs) < limit:
+                job = self.backend.claim(worker_id, tags)
+                if job is None:
+                    break
+                jobs.append(job)
+            return jobs
+
+        jobs = await self._call(claim_batch)
+        expires = time.monotonic() + self.lease
+        for job in jobs:
+            self.leases[job.id] = Lease(job, worker_id, expires)
+        return [job.to_dict() for job in jobs]
+
+    async def op_gather_batch(self, request: dict) -> Optional[dict]:
+        lease = await self._lease_for(request['worker_id'], request['job_id'])
+        batch = await self._call(self.backend.gather_batch, lease.job)
+        if batch is None:
+            return None
+        expires = time.monotonic() + self.lease
+        for job in batch.jobs[1:]:
+            self.leases[job.id] = Lease(job, lease.worker_id, expires)
+        return batch.to_dict()
+
+    async def op_get_payload(self, request: dict) -> Optional[str]:
+        lease = await self._lease_for(request['worker_id'], request['job_id'])
+        return await self._call(self.backend.get_payload, lease.job)
+
+    async def _lease_for(self, worker_id: str, job_id: str) -> Lease:
+        """
+        Find the lease a worker holds on a job
+
+        A job still processing under the worker in storage is adopted, so
+        workers keep their jobs across a broker restart.
+
+        Raises:
+            ValueError: If the worker no longer holds the job
+        """
+        lease = self.leases.get(job_id)
+        if lease is not None and lease.worker_id == worker_id:
+            return lease
+
+        if lease is None:
+            job = await self._call(self.backend.get_job, job_id)
+            if job is not None and job.state == 'processing' and job.locked_by == worker_id:
+                lease = Lease(job, worker_id, time.monotonic() + self.lease)
+                self.leases[job_id] = lease
+                return lease
+
+        raise ValueError(f"Lease on job {job_id} lost by {worker_id}")
+
+    async def op_heartbeat(self, request: dict) -> dict:
+        worker_id = request['worker_id']
+        renewed, lost = [], []
+        expires = time.monotonic() + self.lease
+        for job_id in request.get('job_ids', []):
+            try:
+                lease = await self._lease_for(worker_id, job_id)
+            except ValueError:
+                lost.append(job_id)
+                continue
+            lease.expires = expires
+            renewed.append(job_id)
+        return {"renewed": renewed, "lost": lost}
+
+    async def op_complete(self, request: dict) -> None:
+        lease = await self._lease_for(request['worker_id'], request['job_id'])
+        del self.leases[lease.job.id]
+        await self._call(self.backend.complete, lease.job, request.get('output', ''))
+        self._work_event.set()
+
+    async def op_fail(self, request: dict) -> str:
+        lease = await self._lease_for(request['worker_id'], request['job_id'])
+        del self.leases[lease.job.id]
+        state = await self._call(self.backend.fail, lease.job, request.get('output', ''),
+                                 float(request.get('backoff_base', 2.0)), request.get('exit_code'))
+        self._work_event.set()
+        return state
+
+    async def op_complete_from_cache(self, request: dict) -> bool:
+        lease = await self._lease_for(request['worker_id'], request['job_id'])
+        completed = await self._call(self.backend.complete_from_cache, lease.job)
+        if completed:
+            del self.leases[lease.job.id]
+            self._work_event.set()
+        return completed
+
+    async def op_release(self, request: dict) -> bool:
+        lease = await self._lease_for(request['worker_id'], request['job_id'])
+        del self.leases[lease.job.id]
+        released = await self._call(self.backend.release, lease.job)
+        self._work_event.set()
+        return released
+
+    async def op_get(self, request: dict) -> Optional[dict]:
+        job = await self._call(self.backend.get_job, request['job_id'])
+        return job.to_dict() if job else None
+
+    async def op_list(self, request: dict) -> List[dict]:
+        jobs = await self._call(self.backend.list_jobs, request.get('state'))
+        return [job.to_dict() for job in jobs]
+
+    async def op_status(self, request: dict) -> dict:
+        stats = await self._call(self.backend.stats)
+        stats["leases"] = len(self.leases)
+        return stats
+
+    async def op_next_run_after(self, request: dict) -> Optional[float]:
+        return await self._call(self.backend.next_run_after)
+
+    async def op_record_backpressure(self, request: dict) -> None:
+        await self._call(self.backend.record_backpressure, request['queue'], request['event'])
+
+    async def op_register_worker(self, request: dict) -> None:
+        await self._call(self.backend.register_worker, request['worker'])
+
+    async def op_worker_heartbeat(self, request: dict) -> bool:
+        return await self._call(self.backend.worker_heartbeat, request['worker'], request.get('stopped', False))
+
+    async def op_list_workers(self, request: dict) -> List[dict]:
+        return await self._call(self.backend.list_workers)
+
+    async def op_stop_workers(self, request: dict) -> List[dict]:
+        return await self._call(self.backend.stop_workers, request.get('worker_ids'))
+
+    async def op_wait(self, request: dict) -> bool:
+        """Wait until stored jobs change (shared by every waiting client)"""
+        timeout = min(float(request.get('timeout', MAX_WAIT)), MAX_WAIT)
+        event = self._work_event
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    # Background tasks
+
+    async def _watch_changes(self):
+        """Wake waiting clients when anyone (broker or local writers) changes the jobs"""
+        loop = asyncio.get_running_loop()
+        while not self._stopping.is_set():
+            changed = await loop.run_in_executor(self._watch, self.backend.wait_for_work, 0.5)
+            if changed:
+                self._work_event.set()
+            if self._work_event.is_set():
+                # Waiters hold the old event; the next change needs a fresh one
+                self._work_event = asyncio.Event()
+
+    async def _reap_leases(self):
+        """Requeue jobs whose lease expired"""
+        while not self._stopping.is_set():
+            await asyncio.sleep(REAPER_INTERVAL)
+            now = time.monotonic()
+            for job_id, lease in list(self.leases.items()):
+                if lease.expires > now or self.leases.get(job_id) is not lease:
+                    continue
+                del self.leases[job_id]
+                if await self._call(self.backend.release, lease.job):
+                    print(f"[Broker] Lease on job {job_id} held by {lease.worker_id} expired, requeued")
+                    self._work_event.set()
+
+    # Connections
+
+    async def _respond(self, request: dict, writer: asyncio.StreamWriter):
+        response = {"id": request.get('id')}
+        try:
+            op = self.ops.get(request.get('op'))
+            if op is None:
+                raise ValueError(f"Unknown op '{request.get('op')}'")
+            response.update(ok=True, result=await op(request))
+        except DuplicateJobError as e:
+            response.update(ok=False, error=str(e), type="DuplicateJobError",
+                            existing=e.existing.to_dict() if e.existing else None)
+        except QueueFullError as e:
+            response.update(ok=False, error=str(e), type="QueueFullError", queue=e.queue)
+        except (ValueError, KeyError, TypeError) as e:
+            response.update(ok=False, error=str(e), type="ValueError")
+        except Exception as e:
+            response.update(ok=False, error=f"{type(e).__name__}: {e}", type="Error")
+
+        if not writer.is_closing():
+            writer.write(json.dumps(response, separators=(',', ':')).encode('utf-8') + b"\n")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        pending = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as e:
+                    writer.write(json.dumps({"id": None, "ok": False, "error": f"Invalid JSON: {e}",
+                                             "type": "ValueError"}).encode('utf-8') + b"\n")
+                    continue
+                # Tasks start in arrival order, so storage calls keep pipeline order
+                task = asyncio.ensure_future(self._respond(request, writer))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            writer.close()
+
+    async def serve(self, address: str, ready: Optional[threading.Event] = None):
+        """
+        Serve until stop() is called
+
+        Args:
+            address: 'host:port' or 'unix:/path' (port 0 picks a free port)
+            ready: Set once the socket is listening
+        """
+        host, port, path = parse_address(address)
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._work_event = asyncio.Event()
+
+        if path is not None:
+            if os.path.exists(path):
+                os.remove(path)
+            self._server = await asyncio.start_unix_server(self._handle, path, limit=MAX_LINE_BYTES)
+            self.address = f"unix:{path}"
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port, limit=MAX_LINE_BYTES)
+            bound_port = self._server.sockets[0].getsockname()[1]
+            self.address = f"{host}:{bound_port}"
+
+        tasks = [asyncio.ensure_future(self._watch_changes()), asyncio.ensure_future(self._reap_leases())]
+        print(f"[Broker] Listening on {self.address} (backend: {self.backend.name}, lease: {self.lease:g}s)")
+        if ready is not None:
+            ready.set()
+
+        try:
+            await self._stopping.wait()
+        finally:
+            self._server.close()
+            await self._server.wait_closed()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Hand unfinished leases back so no job stays stuck in processing
+            for lease in list(self.leases.values()):
+                await self._call(self.backend.release, lease.job)
+            self.leases.clear()
+            # The change watcher's connection belongs to the watch thread
+            await asyncio.get_running_loop().run_in_executor(self._watch, self.backend.close)
+            self._storage.shutdown(wait=True)
+            self._watch.shutdown(wait=True)
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+
+    def stop(self):
+        """Stop serving (safe to call from any thread)"""
+        if self._loop is not None and self._stopping is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    def start_in_thread(self, address: str) -> threading.Thread:
+        """Serve from a background thread; returns once the socket is listening"""
+        ready = threading.Event()
+        thread = threading.Thread(target=asyncio.run, args=(self.serve(address, ready),), daemon=True)
+        thread.start()
+        ready.wait()
+        return thread
+
+
+class RemoteBackend(Backend):
+    """
+    Backend talking to a queuectl broker
+
+    Claims jobs in batches and keeps a local buffer, so a busy worker pays
+    one round trip per batch instead of one per job. A background thread
+    renews the leases of buffered and running jobs.
+
+    Args:
+        address: Broker address ('host:port' or 'unix:/path')
+        batch_size: Jobs claimed per round trip
+
+    Raises:
+        ConnectionError: If the broker cannot be reached
+    """
+    name = 'remote'
+
+    def __init__(self, address: str, batch_size: int = 10):
+        self.address = address
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._responses: Dict[int, dict] = {}
+        self._sock, self._file = self._connect()
+
+        self._buffer: Deque[Job] = deque()
+        self._held: Dict[str, str] = {}
+        self._held_lock = threading.Lock()
+
+        hello = self._call("hello")
+        self.lease = hello['lease']
+        self.backoff_base = hello['backoff_base']
+        self.idle_max_wait = hello['idle_max_wait']
+
+        self._closed = threading.Event()
+        self._heartbeat = threading.Thread(target=self._renew_leases, daemon=True)
+        self._heartbeat.start()
+
+    def _connect(self):
+        host, port, path = parse_address(self.address)
+        sock = None
+        try:
+            if path is not None:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(path)
+            else:
+                sock = socket.create_connection((host, port))
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError as e:
+            if sock is not None:
+                sock.close()
+            raise ConnectionError(f"Cannot reach broker {self.address}: {e.strerror or e}") from e
+        return sock, sock.makefile('rwb')
+
+    def _call_many(self, requests: List[Tuple[str, dict]]) -> List:
+        """
+        Send several requests back to back, then collect their responses
+
+        Raises:
+            The first request's error, after every response has been read
+        """
+        with self._lock:
+            ids = []
+            for op, params in requests:
+                request_id = next(self._ids)
+                ids.append(request_id)
+                line = json.dumps({"id": request_id, "op": op, **params}, separators=(',', ':'))
+                self._file.write(line.encode('utf-8') + b"\n")
+            self._file.flush()
+
+            while any(request_id not in self._responses for request_id in ids):
+                line = self._file.readline()
+                if not line:
+                    raise ConnectionError(f"Broker {self.address} closed the connection")
+                response = json.loads(line)
+                self._responses[response['id']] = response
+
+            responses = [self._responses.pop(request_id) for request_id in ids]
+
+        results = []
+        for response in responses:
+            if not response['ok']:
+                if response.get('type') == "DuplicateJobError":
+                    existing = response.get('existing')
+                    raise DuplicateJobError(response['error'], Job.from_dict(existing) if existing else None)
+                if response.get('type') == "QueueFullError":
+                    raise QueueFullError(response['error'], response['queue'])
+                raise ValueError(response['error'])
+            results.append(response['result'])
+        return results
+
+    def _call(self, op: str, **params):
+        return self._call_many([(op, params)])[0]
+
+    def _renew_leases(self):
+        interval = max(self.lease / 3, 0.1)
+        while not self._closed.wait(interval):
+            with self._held_lock:
+                held: Dict[str, List[str]] = {}
+                for job_id, worker_id in self._held.items():
+                    held.setdefault(worker_id, []).append(job_id)
+            try:
+                for worker_id, job_ids in held.items():
+                    self._call("heartbeat", worker_id=worker_id, job_ids=job_ids)
+            except (OSError, ValueError) as e:
+                print(f"[Remote] Heartbeat to {self.address} failed: {e}")
+
+    def _drop(self, job: Job):
+        with self._held_lock:
+            self._held.pop(job.id, None)
+
+    def enqueue(self, job_data: dict) -> Job:
+        return Job.from_dict(self._call("enqueue", job=job_data))
+
+    def enqueue_many(self, jobs: List[dict]) -> List[Job]:
+        """Enqueue several jobs with pipelined requests (one round trip)"""
+        results = self._call_many([("enqueue", {"job": job_data}) for job_data in jobs])
+        return [Job.from_dict(result) for result in results]
+
+    def claim(self, worker_id: str, tags: Optional[List[str]] = None) -> Optional[Job]:
+        if not self._buffer:
+            jobs = [Job.from_dict(data) for data in
+                    self._call("claim_batch", worker_id=worker_id, max=self.batch_size, tags=tags)]
+            with self._held_lock:
+                for job in jobs:
+                    self._held[job.id] = worker_id
+            self._buffer.extend(jobs)
+        return self._buffer.popleft() if self._buffer else None
+
+    def gather_batch(self, job: Job) -> Optional[Batch]:
+        if job.batch is None:
+            return None
+        data = self._call("gather_batch", worker_id=job.locked_by, job_id=job.id)
+        if data is None:
+            return None
+        batch = Batch.from_dict(data)
+        with self._held_lock:
+            for member in batch.jobs[1:]:
+                self._held[member.id] = job.locked_by
+        return batch
+
+    def get_payload(self, job: Job) -> Optional[str]:
+        if job.payload_hash is None:
+            return None
+        return self._call("get_payload", worker_id=job.locked_by, job_id=job.id)
+
+    def complete(self, job: Job, output: str = '') -> None:
+        self._call("complete", worker_id=job.locked_by, job_id=job.id, output=output)
+        self._drop(job)
+
+    def fail(self, job: Job, output: str, backoff_base: float = 2.0,
+             exit_code: Optional[int] = None) -> str:
+        state = self._call("fail", worker_id=job.locked_by, job_id=job.id, output=output,
+                           backoff_base=backoff_base, exit_code=exit_code)
+        self._drop(job)
+        return state
+
+    def release(self, job: Job) -> bool:
+        try:
+            released = self._call("release", worker_id=job.locked_by, job_id=job.id)
+        except ValueError:
+            return False
+        self._drop(job)
+        return released
+
+    def complete_from_cache(self, job: Job) -> bool:
+        if not job.cache_key:
+            return False
+        completed = self._call("complete_from_cache", worker_id=job.locked_by, job_id=job.id)
+        if completed:
+            self._drop(job)
+        return completed
+
+    def list_jobs(self, state: Optional[str] = None) -> List[Job]:
+        return [Job.from_dict(data) for data in self._call("list", state=state)]
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        data = self._call("get", job_id=job_id)
+        return Job.from_dict(data) if data else None
+
+    def stats(self) -> Dict:
+        return self._call("status")
+
+    def next_run_after(self) -> Optional[float]:
+        return self._call("next_run_after")
+
+    def record_backpressure(self, queue: str, event: str) -> None:
+        self._call("record_backpressure", queue=queue, event=event)
+
+    def register_worker(self, info: dict) -> None:
+        self._call("register_worker", worker=info)
+
+    def worker_heartbeat(self, info: dict, stopped: bool = False) -> bool:
+        return self._call("worker_heartbeat", worker=info, stopped=stopped)
+
+    def list_workers(self) -> List[Dict]:
+        return self._call("list_workers")
+
+    def stop_workers(self, worker_ids: Optional[List[str]] = None) -> List[Dict]:
+        return self._call("stop_workers", worker_ids=worker_ids)
+
+    def wait_for_work(self, timeout: float, stop_event: Optional[threading.Event] = None) -> bool:
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (stop_event is not None and stop_event.is_set()):
+                return False
+            # Short slices so a stop request is noticed promptly
+            if self._call("wait", timeout=min(remaining, 1.0)):
+                return True
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        # Unstarted buffered jobs go back to the queue for other workers
+        buffered = list(self._buffer)
+        self._buffer.clear()
+        try:
+            if buffered:
+                self._call_many([("release", {"worker_id": job.locked_by, "job_id": job.id})
+                                 for job in buffered])
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._file.close()
+            self._sock.close()
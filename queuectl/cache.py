@@ -0,0 +1,114 @@
+"""
+Result memoization for deterministic jobs
+"""
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Optional, Dict
+from queuectl.db import increment_counter
+
+
+def compute_cache_key(command: str, env: Optional[Dict[str, str]] = None,
+                      payload_hash: Optional[str] = None) -> str:
+    """Derive a cache key from the command, its extra environment and its payload"""
+    inputs = {"command": command, "env": env or {}}
+    if payload_hash is not None:
+        inputs["payload"] = payload_hash
+    material = json.dumps(inputs, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _read_config_number(cursor: sqlite3.Cursor, key: str, default: float) -> float:
+    """Read a numeric config value inside the caller's transaction"""
+    cursor.execute("SELECT value FROM config WHERE key = ?", (key,))
+    row = cursor.fetchone()
+    try:
+        return float(row[0]) if row else default
+    except (TypeError, ValueError):
+        return default
+
+
+def lookup_cached_result(cursor: sqlite3.Cursor, cache_key: str) -> Optional[str]:
+    """
+    Look up a fresh cached result and record the hit or miss
+
+    Args:
+        cursor: Cursor inside an open write transaction
+        cache_key: Job cache key
+
+    Returns:
+        Cached output, or None on a miss or expired entry
+    """
+    now = time.time()
+    ttl = _read_config_number(cursor, "cache_ttl", 86400)
+
+    cursor.execute("""
+        SELECT output FROM result_cache
+        WHERE cache_key = ? AND created_at >= ?
+    """, (cache_key, now - ttl))
+    row = cursor.fetchone()
+
+    if row is None:
+        increment_counter(cursor, "cache_misses")
+        return None
+
+    cursor.execute("""
+        UPDATE result_cache SET last_used_at = ? WHERE cache_key = ?
+    """, (now, cache_key))
+    increment_counter(cursor, "cache_hits")
+    return row[0] or ""
+
+
+def store_cached_result(cursor: sqlite3.Cursor, cache_key: str, output: str):
+    """
+    Store a successful result and evict least recently used entries
+
+    The entry count lives in the counters table, so eviction never has to
+    COUNT(*) the cache table.
+
+    Args:
+        cursor: Cursor inside an open write transaction
+        cache_key: Job cache key
+        output: Job output (truncated like last_error)
+    """
+    now = time.time()
+    max_entries = int(_read_config_number(cursor, "cache_max_entries", 10000))
+
+    cursor.execute("SELECT 1 FROM result_cache WHERE cache_key = ?", (cache_key,))
+    is_new = cursor.fetchone() is None
+
+    cursor.execute("""
+        INSERT OR REPLACE INTO result_cache (cache_key, output, created_at, last_used_at)
+        VALUES (?, ?, ?, ?)
+    """, (cache_key, (output or "")[:1000], now, now))
+
+    if not is_new:
+        return
+
+    increment_counter(cursor, "cache_entries")
+    cursor.execute("SELECT value FROM counters WHERE name = 'cache_entries'")
+    entries = cursor.fetchone()[0]
+
+    if entries > max_entries:
+        cursor.execute("""
+            DELETE FROM result_cache
+            WHERE cache_key IN (
+                SELECT cache_key FROM result_cache
+                ORDER BY last_used_at
+                LIMIT ?
+            )
+        """, (entries - max_entries,))
+        increment_counter(cursor, "cache_entries", -cursor.rowcount)
+
+
+def get_cache_stats(cursor: sqlite3.Cursor) -> Dict[str, int]:
+    """Get cache hit/miss counters and entry count"""
+    cursor.execute("""
+        SELECT name, value FROM counters
+        WHERE name IN ('cache_hits', 'cache_misses', 'cache_entries')
+    """)
+    stats = {"hits": 0, "misses": 0, "entries": 0}
+    for name, value in cursor.fetchall():
+        stats[name[len("cache_"):]] = value
+    return stats
@@ -3,55 +3,168 @@ CLI entrypoint using Click
 """
 import sys
 import json
+import asyncio
 import time
 import signal
+import socket
 import os
+import threading
+from datetime import datetime, timezone
+import multiprocessing.connection
 from multiprocessing import Process
 import click
-from queuectl.db import init_db, get_db_path
+from queuectl.db import init_db, get_db_path, get_read_db, get_replica_path, sync_replica, use_db_path
 from queuectl.queue import (
-    enqueue_job, list_jobs, get_status, list_dlq, retry_dlq_job
+    get_job, retry_dlq_job, count_dlq_jobs, retry_dlq_jobs, purge_dlq_jobs,
+    export_dlq_jobs, create_group, parse_since
 )
 from queuectl.config import get_config, set_config
-from queuectl.worker import start_worker
+from queuectl.worker import run_worker_process
+from queuectl.recycle import RECYCLE_EXIT_CODE, RecycleLimits, parse_duration
+from queuectl.tags import parse_tags
+from queuectl.tenants import CLAIM_STRATEGIES, get_tenants, set_tenant_weight
+from queuectl.throttles import set_throttle, remove_throttle, get_throttles
+from queuectl.batches import set_batch_type, remove_batch_type, get_batch_types
+from queuectl.payloads import collect_garbage, get_payload_stats
+from queuectl.archive import export_archive, import_archive, open_archive
+from queuectl.backends import get_storage_backend, get_shard_paths
+from queuectl.backends.sharded import get_shard_key, shard_index
+from queuectl.metrics import (
+    MetricsServer, get_metrics_dir, parse_http_address, read_snapshots, render_metrics, write_textfile
+)
+from queuectl.profiling import get_profile_dir
+from queuectl.workers import LIVE_WORKER_STATES, LOST_AFTER
+from queuectl.locktrace import get_trace_dir, read_traces, clear_traces, summarize_contention
+from queuectl.limits import (
+    FULL_POLICIES, QueueFullError, enqueue_with_backpressure, set_queue_limit,
+    remove_queue_limit, drain_spill, get_spill_path
+)
+from queuectl.client import AsyncClient
+from queuectl.broker import Broker, RemoteBackend, parse_address, DEFAULT_PORT, DEFAULT_LEASE
+from queuectl.scheduler import add_schedule, list_schedules, remove_schedule, run_scheduler
+from queuectl.retry import parse_policy, simulate_retry_load
+from queuectl.dag import get_dag_status
+from queuectl.groups import get_group_status
+from queuectl.models import JOB_STATES
+
+
+# Commands that can run against a broker (--broker); they set up the schema
+# themselves, and only when they use the database
+BROKER_COMMANDS = ('enqueue', 'worker')
 
 
 @click.group()
-def cli():
+@click.pass_context
+def cli(ctx):
     """
     queuectl - A CLI-based background job queue
     
     Manage background jobs with SQLite persistence, retry logic, and DLQ support.
     """
-    init_db()
+    if ctx.invoked_subcommand not in BROKER_COMMANDS:
+        _init_shards()
+
+
+def _init_shards():
+    """Every shard needs its schema before commands write to all of them"""
+    for path in get_shard_paths():
+        with use_db_path(path):
+            init_db()
+
+
+def _local_backend():
+    """Storage backend of the configured database, schema included"""
+    _init_shards()
+    return get_storage_backend()
+
+
+def _on_each_shard(func, *args, **kwargs) -> list:
+    """Call func once per shard database (only the main one without sharding)"""
+    results = []
+    for path in get_shard_paths():
+        with use_db_path(path):
+            results.append(func(*args, **kwargs))
+    return results
+
+
+def _shard_with_job(job_id: str) -> str:
+    """Database file holding a job (the main database if no shard has it)"""
+    for path in get_shard_paths():
+        with use_db_path(path):
+            if get_job(job_id) is not None:
+                return path
+    return get_db_path()
+
+
+# Exit status of 'queuectl enqueue' when the queue is full, so scripts can back off
+EXIT_QUEUE_FULL = 75
 
 
 @cli.command()
 @click.argument('job_json')
-def enqueue(job_json):
+@click.option('--broker', default=None, help='Enqueue through a broker (host:port or unix:/path)')
+@click.option('--on-full', type=click.Choice(FULL_POLICIES), default='reject', show_default=True,
+              help='What to do when the job\'s queue has reached its max_pending limit')
+@click.option('--timeout', type=float, default=None, help='Longest wait with --on-full block (default: forever)')
+def enqueue(job_json, broker, on_full, timeout):
     """
     Enqueue a new job
     
     JOB_JSON must be a JSON string containing at least 'id' and 'command' fields.
     
-    Optional fields: 'max_retries' (default: 3), 'run_at' (ISO timestamp)
+    Optional fields: 'max_retries' (default: 3), 'run_at' (ISO timestamp),
+    'dedup_key', 'dedup_policy' (reject, return_existing, coalesce),
+    'env' (object), 'cache_key' or 'cache': true (reuse a cached result),
+    'queue', 'retry_policy' (see 'queuectl retry simulate --help'),
+    'depends_on' (list of job IDs), 'on_dep_failure' (cascade, ignore, block),
+    'group_id' (existing group, see 'queuectl group create --help'),
+    'requires' (tags; only workers started with all of them in --tags claim the job),
+    'tenant' (owner, for fair claims; see 'queuectl tenant --help'),
+    'throttle_key' (rate limit / concurrency cap; see 'queuectl throttle --help'),
+    'batch' and 'batch_item' (run with other jobs; see 'queuectl batch --help'),
+    'payload' (input stored out of row, on stdin) and 'payload_via' (stdin, file)
     
     Examples:
     
         queuectl enqueue '{"id":"job1","command":"echo Hello"}'
     
         queuectl enqueue '{"id":"job2","command":"sleep 5","max_retries":2}'
+    
+        queuectl enqueue '{"id":"job3","command":"make report","dedup_key":"report","dedup_policy":"return_existing"}'
+    
+        queuectl enqueue --broker queue-host:7070 '{"id":"job4","command":"echo remote"}'
+    
+        queuectl enqueue --on-full block --timeout 30 '{"id":"job5","command":"echo later"}'
+    
+        queuectl enqueue '{"id":"job6","command":"./train.sh","requires":["gpu"]}'
     """
     try:
         job_data = json.loads(job_json)
-        job = enqueue_job(job_data)
+        with (RemoteBackend(broker) if broker else _local_backend()) as backend:
+            job = enqueue_with_backpressure(backend, job_data, on_full, timeout)
+        if job is None:
+            click.echo(f"Queue full, job {job_data.get('id')} spilled to {get_spill_path()}")
+            click.echo("Run 'queuectl queue drain' to enqueue it once there is room")
+            return
+        if job.deduplicated:
+            click.echo(f"Duplicate of queued job: {job.id} (dedup_key: {job.dedup_key})")
+            return
         click.echo(f"Enqueued job: {job.id}")
         click.echo(f"  Command: {job.command}")
         click.echo(f"  Max retries: {job.max_retries}")
+        if job.requires:
+            click.echo(f"  Requires: {', '.join(job.requires)}")
+        if job.batch:
+            click.echo(f"  Batch: {job.batch} (item: {job.batch_item})")
+        if job.payload_hash:
+            click.echo(f"  Payload: {job.payload_hash[:12]} (via {job.payload_via or 'stdin'})")
     except json.JSONDecodeError as e:
         click.echo(f"Invalid JSON: {e}", err=True)
         sys.exit(1)
-    except ValueError as e:
+    except QueueFullError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(EXIT_QUEUE_FULL)
+    except (ValueError, OSError) as e:
         click.echo(f"Error: {e}", err=True)
         sys.exit(1)
     except Exception as e:
@@ -69,136 +182,366 @@ def worker():
 @click.option('--count', default=1, help='Number of worker processes to start')
 @click.option('--backoff-base', default=None, type=float, help='Exponential backoff base (default: from config)')
 @click.option('--daemon', is_flag=True, help='Run workers as daemon processes')
-def worker_start(count, backoff_base, daemon):
+@click.option('--no-scheduler', is_flag=True, help='Do not run the recurring-job scheduler in the first worker')
+@click.option('--broker', default=None, help='Claim jobs from a broker (host:port or unix:/path) instead of the database')
+@click.option('--metrics', 'with_metrics', is_flag=True,
+              help='Write per-worker metrics snapshots for \'queuectl metrics serve/write\'')
+@click.option('--metrics-listen', default=None,
+              help='Also serve Prometheus metrics from this process (host:port, implies --metrics)')
+@click.option('--profile', 'with_profile', is_flag=True,
+              help='Time every phase of the worker loop; summaries on SIGUSR1 and at shutdown')
+@click.option('--profile-cpu', default=None, type=click.FloatRange(min=0),
+              help='Also run cProfile for the first SECONDS of each worker (implies --profile)')
+@click.option('--trace-locks', is_flag=True,
+              help='Trace SQLite lock waits and hold times for \'queuectl diag contention\'')
+@click.option('--max-jobs-per-worker', default=None, type=click.IntRange(min=1),
+              help='Replace a worker after it has processed this many jobs')
+@click.option('--max-rss-mb', default=None, type=click.FloatRange(min=1),
+              help='Replace a worker once its resident memory exceeds this many MiB')
+@click.option('--max-age', default=None,
+              help='Replace a worker after it has run this long (seconds, or 30m, 6h, 1d)')
+@click.option('--tags', default=None,
+              help='Comma-separated capability tags; workers only claim jobs whose \'requires\' tags they all have')
+def worker_start(count, backoff_base, daemon, no_scheduler, broker, with_metrics, metrics_listen,
+                 with_profile, profile_cpu, trace_locks, max_jobs_per_worker, max_rss_mb, max_age, tags):
     """
     Start worker processes
     
     Workers will process jobs from the queue in the background.
     Use Ctrl+C to stop workers gracefully.
     
+    The first worker also runs the recurring-job scheduler unless
+    --no-scheduler is given. Workers started with --broker talk only to
+    the broker (see 'queuectl serve') and never run the scheduler.
+    
+    A worker claims a job only when every tag in the job's 'requires' is
+    among its --tags; untagged workers only claim jobs without
+    requirements.
+    
+    A worker that reaches --max-jobs-per-worker, --max-rss-mb or --max-age
+    finishes its current job, exits cleanly and is replaced by a new
+    process in the same slot (home shard, scheduler).
+    
     Examples:
     
         queuectl worker start --count 3
     
         queuectl worker start --count 1 --backoff-base 3
+    
+        queuectl worker start --count 8 --broker queue-host:7070
+    
+        queuectl worker start --count 4 --metrics-listen 127.0.0.1:9464
+    
+        queuectl worker start --count 2 --profile-cpu 60
+    
+        queuectl worker start --count 4 --max-jobs-per-worker 1000 --max-rss-mb 512 --max-age 6h
+    
+        queuectl worker start --count 2 --tags gpu,cuda12
     """
+    if metrics_listen and daemon:
+        click.echo("Error: --metrics-listen needs a foreground supervisor; use --metrics "
+                   "with 'queuectl metrics serve' for daemon workers", err=True)
+        sys.exit(1)
+    
+    try:
+        recycle = RecycleLimits(max_jobs_per_worker, max_rss_mb,
+                                parse_duration(max_age) if max_age is not None else None)
+        tags = parse_tags(tags, 'tags')
+        if broker:
+            # Fail here rather than in every worker process
+            RemoteBackend(broker).close()
+        else:
+            _init_shards()
+    except (ValueError, OSError) as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    
+    metrics_dir = get_metrics_dir() if (with_metrics or metrics_listen) else None
+    profile = profile_cpu if profile_cpu is not None else (0 if with_profile else None)
+    if trace_locks:
+        # Inherited by the worker processes
+        os.environ['QUEUECTL_TRACE_LOCKS'] = '1'
+        click.echo(f"Tracing SQLite locks to {get_trace_dir()}")
+    if profile is not None:
+        click.echo(f"Profiling workers; summaries go to {get_profile_dir()} (kill -USR1 <pid> for one now)")
+    
+    def spawn(index: int) -> Process:
+        p = Process(target=run_worker_process,
+                    args=(backoff_base, index == 0 and not no_scheduler, index, broker, metrics_dir, profile,
+                          recycle, time.time(), tags))
+        p.start()
+        return p
+    
+    click.echo(f"Starting {count} worker(s) in {'daemon' if daemon else 'foreground'} mode...")
+    if not daemon:
+        click.echo("Press Ctrl+C to stop workers gracefully\n")
+    
+    processes = {}
+    for i in range(count):
+        processes[i] = spawn(i)
+        click.echo(f"  Worker {i+1} started (PID: {processes[i].pid})")
+    
     if daemon:
-        click.echo(f"Starting {count} worker(s) in daemon mode...")
-        processes = []
-        pids = []
-        
-        for i in range(count):
-            p = Process(target=start_worker, args=(backoff_base,))
-            p.start()
-            processes.append(p)
-            pids.append(str(p.pid))
-            click.echo(f"  Worker {i+1} started (PID: {p.pid})")
-        
-        set_config('worker_pids', ','.join(pids))
-        
         click.echo(f"\n{count} worker(s) started in background")
-        click.echo("Use 'queuectl worker stop' to stop them")
+        click.echo("Use 'queuectl worker list' to see them and 'queuectl worker stop' to stop them")
     
-    else:
-        click.echo(f"Starting {count} worker(s) in foreground mode...")
-        click.echo("Press Ctrl+C to stop workers gracefully\n")
-        
-        processes = []
-        pids = []
-        
-        for i in range(count):
-            p = Process(target=start_worker, args=(backoff_base,))
-            p.start()
-            processes.append(p)
-            pids.append(str(p.pid))
-            click.echo(f"  Worker {i+1} started (PID: {p.pid})")
+    if metrics_listen:
+        # Workers attached to a broker have no database to read queue depth from
+        paths = None if broker else get_shard_paths()
+        server = MetricsServer(lambda: render_metrics(read_snapshots(metrics_dir), paths),
+                               parse_http_address(metrics_listen))
+        server.start_in_thread()
+        click.echo(f"Serving metrics on http://{server.address[0]}:{server.address[1]}/metrics\n")
+    
+    try:
+        _supervise(processes, spawn)
+    except KeyboardInterrupt:
+        click.echo("\n\nStopping workers...")
+        for p in processes.values():
+            if p.is_alive():
+                p.terminate()
         
-        set_config('worker_pids', ','.join(pids))
+        for p in processes.values():
+            p.join(timeout=5)
         
-        try:
-            for p in processes:
-                p.join()
-        except KeyboardInterrupt:
-            click.echo("\n\nStopping workers...")
-            for p in processes:
-                if p.is_alive():
-                    p.terminate()
-            
-            for p in processes:
-                p.join(timeout=5)
-            
-            click.echo("Workers stopped")
-        finally:
-            set_config('worker_pids', '')
+        click.echo("Workers stopped")
 
 
-@worker.command('stop')
-def worker_stop():
+def _supervise(processes: dict, spawn):
+    """
+    Wait for the worker processes, replacing each one that exits to be recycled
+    
+    Args:
+        processes: Worker index -> running Process (kept up to date)
+        spawn: Starts the worker process for an index
+    """
+    while processes:
+        multiprocessing.connection.wait([p.sentinel for p in processes.values()])
+        for index, p in list(processes.items()):
+            if p.is_alive():
+                continue
+            p.join()
+            if p.exitcode == RECYCLE_EXIT_CODE:
+                processes[index] = spawn(index)
+                click.echo(f"  Worker {index + 1} recycled (PID {p.pid}), replaced by PID {processes[index].pid}")
+            else:
+                del processes[index]
+
+
+def _workers_backend(broker):
+    """Registry of the database, or of the broker's database"""
+    return RemoteBackend(broker) if broker else _local_backend()
+
+
+def _format_age(seconds: float) -> str:
+    """Compact age like 42s, 7m, 3h, 2d"""
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= size:
+            return f"{int(seconds // size)}{unit}"
+    return f"{int(seconds)}s"
+
+
+@worker.command('list')
+@click.option('--all', 'show_all', is_flag=True, help='Include stopped and lost workers')
+@click.option('--broker', default=None, help='List the workers registered with a broker')
+def worker_list(show_all, broker):
     """
-    Stop all running workers
+    List registered workers
     
-    Sends SIGTERM to worker processes for graceful shutdown.
+    Shows each worker's host, PID, state, capability tags, current job,
+    job counts and throughput since it started. Workers publish their entry every
+    10 seconds; one that misses 30 seconds of heartbeats is 'lost'.
     """
-    worker_pids_str = get_config('worker_pids', '')
+    try:
+        with _workers_backend(broker) as backend:
+            workers = backend.list_workers()
+    except (ValueError, OSError) as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
     
-    if not worker_pids_str:
-        click.echo("No workers running (no PIDs found in config)")
+    if not show_all:
+        workers = [worker for worker in workers if worker['status'] in LIVE_WORKER_STATES]
+    if not workers:
+        click.echo("No workers running" if not show_all else "No workers registered")
         return
     
-    pids = [pid.strip() for pid in worker_pids_str.split(',') if pid.strip()]
+    now = time.time()
+    click.echo(f"{'Worker':<34} {'Host':<16} {'PID':>7} {'State':<9} {'Up':>5} {'Seen':>5} "
+               f"{'Done':>7} {'Failed':>7} {'Jobs/min':>9}  {'Tags':<16} Current job")
+    click.echo("-" * 137)
+    for worker in workers:
+        end = worker['stopped_at'] or worker['heartbeat_at']
+        uptime = max(end - worker['started_at'], 0.0)
+        rate = 60 * (worker['jobs_done'] + worker['jobs_failed']) / uptime if uptime > 0 else 0.0
+        click.echo(f"{worker['id'][:33]:<34} {worker['host'][:15]:<16} {worker['pid']:>7} "
+                   f"{worker['status']:<9} {_format_age(uptime):>5} "
+                   f"{_format_age(now - worker['heartbeat_at']):>5} {worker['jobs_done']:>7} "
+                   f"{worker['jobs_failed']:>7} {rate:>9.1f}  {','.join(worker['tags']) or '-':<16} "
+                   f"{worker['current_job'] or '-'}")
+    
+    live = sum(worker['status'] in LIVE_WORKER_STATES for worker in workers)
+    click.echo(f"\n{live} live worker(s)")
+
+
+@worker.command('stop')
+@click.argument('workers', nargs=-1)
+@click.option('--broker', default=None, help='Stop workers registered with a broker')
+def worker_stop(workers, broker):
+    """
+    Stop running workers
+    
+    Marks live workers (all of them, or those given by worker ID or PID)
+    as asked to stop. Each finishes its current job and exits, on any
+    host, at its next heartbeat. Workers on this host also get SIGTERM,
+    so they stop at once. Only workers with a recent heartbeat are
+    signalled, so a PID reused by an unrelated process is never hit.
+    
+    Examples:
+    
+        queuectl worker stop
     
-    if not pids:
+        queuectl worker stop worker-4242-1a2b3c4d 4243
+    """
+    try:
+        with _workers_backend(broker) as backend:
+            worker_ids = None
+            if workers:
+                worker_ids = [worker['id'] for worker in backend.list_workers()
+                              if worker['id'] in workers or str(worker['pid']) in workers]
+                if not worker_ids:
+                    click.echo(f"No registered worker matches: {', '.join(workers)}")
+                    return
+            targets = backend.stop_workers(worker_ids)
+    except (ValueError, OSError) as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    
+    if not targets:
         click.echo("No workers running")
         return
     
-    click.echo(f"Stopping {len(pids)} worker(s)...")
-    
-    for pid_str in pids:
+    click.echo(f"Stopping {len(targets)} worker(s)...")
+    host = socket.gethostname()
+    for worker in targets:
+        if worker['host'] != host:
+            click.echo(f"  {worker['id']} on {worker['host']}: stops at its next heartbeat")
+            continue
         try:
-            pid = int(pid_str)
-            os.kill(pid, signal.SIGTERM)
-            click.echo(f"  Sent SIGTERM to PID {pid}")
-        except (ValueError, ProcessLookupError, OSError) as e:
-            click.echo(f"  Could not stop PID {pid_str}: {e}")
-    
-    set_config('worker_pids', '')
+            os.kill(worker['pid'], signal.SIGTERM)
+            click.echo(f"  Sent SIGTERM to {worker['id']} (PID {worker['pid']})")
+        except OSError as e:
+            click.echo(f"  {worker['id']} (PID {worker['pid']}): {e}; stops at its next heartbeat")
     
     click.echo("Workers stop signal sent")
 
 
 @cli.command()
-def status():
+@click.option('--listen', default=f"127.0.0.1:{DEFAULT_PORT}", show_default=True,
+              help='host:port (0.0.0.0 for all interfaces) or unix:/path')
+@click.option('--lease', default=DEFAULT_LEASE, type=float, show_default=True,
+              help='Seconds a claimed job stays leased without a heartbeat')
+@click.option('--no-scheduler', is_flag=True, help='Do not run the recurring-job scheduler in the broker')
+def serve(listen, lease, no_scheduler):
+    """
+    Run a broker that shares this database with remote workers
+    
+    The broker owns the database and serves enqueue, claim_batch,
+    heartbeat, complete and status requests as newline-delimited JSON.
+    Jobs held by a worker that stops sending heartbeats go back to
+    pending after the lease expires. There is no authentication: only
+    listen on trusted networks.
+    
+    Examples:
+    
+        queuectl serve
+    
+        queuectl serve --listen 0.0.0.0:7070 --lease 60
+    
+        queuectl serve --listen unix:/tmp/queuectl.sock
+    """
+    try:
+        parse_address(listen)
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    
+    broker = Broker(get_storage_backend(), lease=lease)
+    scheduler_stop = threading.Event()
+    
+    def shutdown(signum, frame):
+        click.echo("\nStopping broker...")
+        scheduler_stop.set()
+        broker.stop()
+    
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    
+    if not no_scheduler:
+        threading.Thread(target=run_scheduler, args=(scheduler_stop,), daemon=True).start()
+    
+    asyncio.run(broker.serve(listen))
+    click.echo("Broker stopped")
+
+
+@cli.command()
+@click.option('--replica', is_flag=True, help='Read from the replica file instead of the live database')
+def status(replica):
     """
     Show queue status
     
-    Displays job counts by state and active worker PIDs.
+    Displays job counts by state and the workers in the registry.
     """
-    status_data = get_status()
+    try:
+        with get_storage_backend() as backend:
+            status_data = backend.stats(replica=replica)
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
     
     click.echo("Queue Status")
     click.echo("=" * 40)
     click.echo(f"Total jobs: {status_data['total_jobs']}")
     click.echo("\nJobs by state:")
     
-    for state in ['pending', 'processing', 'completed', 'failed', 'dead']:
+    for state in JOB_STATES:
         count = status_data['state_counts'].get(state, 0)
         click.echo(f"  {state:12s}: {count}")
     
-    click.echo(f"\nActive workers: {len(status_data['worker_pids'])}")
-    if status_data['worker_pids']:
-        click.echo(f"  PIDs: {', '.join(status_data['worker_pids'])}")
+    cache = status_data['cache']
+    click.echo(f"\nResult cache: {cache['entries']} entries, "
+               f"{cache['hits']} hits, {cache['misses']} misses")
+    
+    live_workers = [worker for worker in status_data['workers'] if worker['status'] in LIVE_WORKER_STATES]
+    lost_workers = [worker for worker in status_data['workers'] if worker['status'] == 'lost']
+    click.echo(f"\nActive workers: {len(live_workers)}")
+    for worker in live_workers:
+        current = f", running {worker['current_job']}" if worker['current_job'] else ""
+        click.echo(f"  {worker['id']} on {worker['host']} (PID {worker['pid']}, {worker['status']}"
+                   f"{current}, {worker['jobs_done']} done, {worker['jobs_failed']} failed)")
+    if lost_workers:
+        click.echo(f"  Lost (no heartbeat for {LOST_AFTER:g}s+): {', '.join(worker['id'] for worker in lost_workers)}")
     
-    click.echo(f"\nDatabase: {get_db_path()}")
+    click.echo(f"\nDatabase: {get_replica_path() if replica else get_db_path()}")
+    
+    for index, shard in enumerate(status_data.get('shards', [])):
+        click.echo(f"  Shard {index}: {shard['path']} ({shard['total_jobs']} jobs, {shard['pending']} pending)")
+    
+    if status_data.get('queue_limits'):
+        click.echo("\nQueue limits:")
+        for limit in status_data['queue_limits']:
+            click.echo(f"  {limit['queue']}: {limit['unfinished']}/{limit['max_pending']} unfinished, "
+                       f"{limit['refused']} refused, {limit['blocked']} blocked, {limit['spilled']} spilled")
 
 
 @cli.command('list')
-@click.option('--state', type=click.Choice(['pending', 'processing', 'completed', 'failed', 'dead']), 
+@click.option('--state', type=click.Choice(JOB_STATES), 
               help='Filter by job state')
-def list_cmd(state):
+@click.option('--replica', is_flag=True, help='Read from the replica file instead of the live database')
+def list_cmd(state, replica):
     """
     List jobs
     
-    Optionally filter by state: pending, processing, completed, failed, dead
+    Optionally filter by state: blocked, pending, processing, completed, failed, dead
     
     Examples:
     
@@ -206,7 +549,12 @@ def list_cmd(state):
     
         queuectl list --state pending
     """
-    jobs = list_jobs(state)
+    try:
+        with get_storage_backend() as backend:
+            jobs = backend.list_jobs(state, replica=replica)
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
     
     if not jobs:
         click.echo("No jobs found")
@@ -223,6 +571,58 @@ def list_cmd(state):
     click.echo(f"\nTotal: {len(jobs)} job(s)")
 
 
+# Exit status of 'queuectl wait' when the timeout expires (as with timeout(1))
+WAIT_TIMEOUT_STATUS = 124
+
+
+def _job_exit_status(job) -> int:
+    """Shell exit status for a finished job: its command's, 128+N if killed by signal N, else 1"""
+    if job.state == 'completed':
+        return 0
+    if job.exit_code is None or job.exit_code == 0:
+        return 1
+    if job.exit_code < 0:
+        return 128 - job.exit_code
+    return job.exit_code if job.exit_code < 256 else 1
+
+
+@cli.command('wait')
+@click.argument('job_id')
+@click.option('--timeout', type=float, default=None, help='Give up after this many seconds (exit status 124)')
+def wait_cmd(job_id, timeout):
+    """
+    Wait for a job to complete or die and exit with its status
+
+    Exits 0 when the job completed, with the command's exit code when it
+    died, 1 if it died without one (e.g. a timeout), and 124 if --timeout
+    expires first.
+
+    Examples:
+
+        queuectl wait job1
+
+        queuectl enqueue '{"id":"build","command":"make"}' && queuectl wait build --timeout 600
+    """
+    async def wait_for_job():
+        async with AsyncClient() as client:
+            return await client.wait(job_id, timeout)
+
+    try:
+        job = asyncio.run(wait_for_job())
+    except asyncio.TimeoutError:
+        click.echo(f"Timed out waiting for job {job_id}", err=True)
+        sys.exit(WAIT_TIMEOUT_STATUS)
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+    exit_code = "-" if job.exit_code is None else job.exit_code
+    click.echo(f"Job {job.id} {job.state} (attempts: {job.attempts}, exit code: {exit_code})")
+    if job.state == 'dead' and job.last_error:
+        click.echo(f"  Last error: {job.last_error.strip()[:200]}")
+    sys.exit(_job_exit_status(job))
+
+
 @cli.group()
 def dlq():
     """Dead Letter Queue (DLQ) management"""
@@ -230,13 +630,19 @@ def dlq():
 
 
 @dlq.command('list')
-def dlq_list():
+@click.option('--replica', is_flag=True, help='Read from the replica file instead of the live database')
+def dlq_list(replica):
     """
     List jobs in the Dead Letter Queue
     
     Shows jobs that have exceeded max retries.
     """
-    jobs = list_dlq()
+    try:
+        with get_storage_backend() as backend:
+            jobs = backend.list_jobs('dead', replica=replica)
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
     
     if not jobs:
         click.echo("No jobs in DLQ")
@@ -253,24 +659,69 @@ def dlq_list():
     click.echo(f"\nTotal: {len(jobs)} job(s) in DLQ")
 
 
+def dlq_filter_options(func):
+    """Add the shared DLQ filter options to a command"""
+    func = click.option('--command-prefix', default=None, help='Only jobs whose command starts with this text')(func)
+    func = click.option('--since', default=None, help='Only jobs that died since an ISO time or age (30m, 2h, 1d)')(func)
+    func = click.option('--error-match', default=None, help='Only jobs whose last error contains this text')(func)
+    return func
+
+
+def _dlq_filters(error_match, since, command_prefix) -> dict:
+    """Collect DLQ filter options that were given"""
+    filters = {'error_match': error_match, 'since': since, 'command_prefix': command_prefix}
+    return {key: value for key, value in filters.items() if value}
+
+
 @dlq.command('retry')
-@click.argument('job_id')
-def dlq_retry(job_id):
+@click.argument('job_id', required=False)
+@click.option('--all', 'all_jobs', is_flag=True, help='Retry every dead job matching the filters')
+@dlq_filter_options
+@click.option('--dry-run', is_flag=True, help='Only count the matching jobs')
+def dlq_retry(job_id, all_jobs, error_match, since, command_prefix, dry_run):
     """
-    Retry a job from the DLQ
+    Retry jobs from the DLQ
     
-    Moves the job back to pending state and resets attempts to 0.
+    Moves jobs back to pending state and resets attempts to 0.
     
-    JOB_ID is the ID of the job to retry.
+    JOB_ID is the ID of a single job to retry. Without it, pass --all
+    and/or filters to retry matching jobs in chunked set-based updates.
     
-    Example:
+    Examples:
     
         queuectl dlq retry job1
+    
+        queuectl dlq retry --all --dry-run
+    
+        queuectl dlq retry --error-match "Connection refused" --since 2h
     """
+    filters = _dlq_filters(error_match, since, command_prefix)
+    
     try:
-        job = retry_dlq_job(job_id)
-        click.echo(f"Job {job.id} moved back to pending state")
-        click.echo(f"  Attempts reset to 0")
+        if job_id:
+            if filters or all_jobs:
+                click.echo("Error: JOB_ID cannot be combined with --all or filters", err=True)
+                sys.exit(1)
+            with use_db_path(_shard_with_job(job_id)):
+                job = retry_dlq_job(job_id)
+            click.echo(f"Job {job.id} moved back to {job.state} state")
+            click.echo(f"  Attempts reset to 0")
+            return
+        
+        if not (filters or all_jobs):
+            click.echo("Error: give a JOB_ID, --all, or at least one filter", err=True)
+            sys.exit(1)
+        
+        if dry_run:
+            click.echo(f"{sum(_on_each_shard(count_dlq_jobs, **filters))} job(s) would be retried")
+            return
+        
+        results = _on_each_shard(retry_dlq_jobs, **filters)
+        retried = sum(result[0] for result in results)
+        skipped = sum(result[1] for result in results)
+        click.echo(f"{retried} job(s) moved back to pending state")
+        if skipped:
+            click.echo(f"  {skipped} job(s) skipped: another job with the same dedup_key is queued")
     except ValueError as e:
         click.echo(f"Error: {e}", err=True)
         sys.exit(1)
@@ -279,49 +730,964 @@ def dlq_retry(job_id):
         sys.exit(1)
 
 
+@dlq.command('purge')
+@click.option('--all', 'all_jobs', is_flag=True, help='Delete every dead job matching the filters')
+@dlq_filter_options
+@click.option('--dry-run', is_flag=True, help='Only count the matching jobs')
+def dlq_purge(all_jobs, error_match, since, command_prefix, dry_run):
+    """
+    Delete jobs from the DLQ
+    
+    Requires --all and/or filters. Deletes run in chunked set-based
+    statements so workers are never blocked for long.
+    
+    Examples:
+    
+        queuectl dlq purge --command-prefix "legacy-" --dry-run
+    
+        queuectl dlq purge --all
+    """
+    filters = _dlq_filters(error_match, since, command_prefix)
+    
+    if not (filters or all_jobs):
+        click.echo("Error: give --all or at least one filter", err=True)
+        sys.exit(1)
+    
+    try:
+        if dry_run:
+            click.echo(f"{sum(_on_each_shard(count_dlq_jobs, **filters))} job(s) would be deleted")
+            return
+        
+        click.echo(f"{sum(_on_each_shard(purge_dlq_jobs, **filters))} job(s) deleted from DLQ")
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+
+@dlq.command('export')
+@click.option('--output', '-o', type=click.File('w'), default='-', help='Output file (default: stdout)')
+@dlq_filter_options
+def dlq_export(output, error_match, since, command_prefix):
+    """
+    Export dead jobs as NDJSON (one JSON object per line)
+    
+    Examples:
+    
+        queuectl dlq export -o dead.ndjson
+    
+        queuectl dlq export --since 1d | jq .last_error
+    """
+    try:
+        count = sum(_on_each_shard(export_dlq_jobs, output, **_dlq_filters(error_match, since, command_prefix)))
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    
+    click.echo(f"Exported {count} job(s)", err=True)
+
+
+@cli.command('export')
+@click.option('--output', '-o', default='-', help='Archive file (default: stdout)')
+def export_cmd(output):
+    """
+    Export the whole queue to a gzip-compressed NDJSON archive
+    
+    Every table (jobs, payloads, config, schedules, limits, ...) of every
+    shard is streamed from one read snapshot per database, so workers and
+    producers keep running. Load it with 'queuectl import'.
+    
+    Examples:
+    
+        queuectl export -o queue.ndjson.gz
+    
+        queuectl export | gzip -dc | jq -c 'select(.table?) | .table'
+    """
+    try:
+        with open_archive(output, 'w') as out:
+            counts = export_archive(out, get_shard_paths())
+    except (ValueError, OSError) as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    click.echo(f"Exported {sum(counts.values())} row(s) from {len(counts)} table(s), "
+               f"{counts.get('jobs', 0)} job(s)", err=True)
+
+
+@cli.command('import')
+@click.argument('archive')
+def import_cmd(archive):
+    """
+    Load an archive from 'queuectl export' into a fresh database
+    
+    The configured database (or every shard, with the same QUEUECTL_SHARDS
+    as the export) must have no rows in the archive's tables, and no
+    worker or other command may have it open. Rows are bulk-loaded
+    before any index is built, then the file replaces the target.
+    
+    Examples:
+    
+        QUEUECTL_DB_PATH=/srv/new/queuectl.db queuectl import queue.ndjson.gz
+    """
+    try:
+        with open_archive(archive, 'r') as source:
+            counts = import_archive(source, get_shard_paths())
+    except (ValueError, OSError) as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    click.echo(f"Imported {sum(counts.values())} row(s) into {len(counts)} table(s), "
+               f"{counts.get('jobs', 0)} job(s)")
+
+
 @cli.group()
-def config():
-    """Configuration management"""
+def schedule():
+    """Recurring job schedules"""
     pass
 
 
-@config.command('get')
-@click.argument('key')
-def config_get(key):
+@schedule.command('add')
+@click.argument('schedule_json')
+def schedule_add(schedule_json):
     """
-    Get configuration value
+    Add a recurring schedule
     
-    KEY is the configuration key to retrieve.
+    SCHEDULE_JSON must contain 'id', 'command' and either 'cron'
+    (5-field expression, UTC) or 'interval' (seconds).
     
-    Example:
+    Optional fields: 'max_retries', 'catchup' (all, latest, skip),
+    'start_at' (ISO timestamp of the first fire)
     
-        queuectl config get backoff_base
-    """
-    value = get_config(key)
+    Examples:
     
-    if value is None:
-        click.echo(f"Configuration key '{key}' not found", err=True)
+        queuectl schedule add '{"id":"nightly","command":"make backup","cron":"0 2 * * *"}'
+    
+        queuectl schedule add '{"id":"ping","command":"curl -s host","interval":300}'
+    """
+    try:
+        sched = add_schedule(json.loads(schedule_json))
+        click.echo(f"Added schedule: {sched.id}")
+        click.echo(f"  Command: {sched.command}")
+        click.echo(f"  Next run: {_format_timestamp(sched.next_run)}")
+    except json.JSONDecodeError as e:
+        click.echo(f"Invalid JSON: {e}", err=True)
+        sys.exit(1)
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
         sys.exit(1)
+
+
+@schedule.command('list')
+def schedule_list():
+    """List recurring schedules"""
+    schedules = list_schedules()
     
-    click.echo(f"{key} = {value}")
+    if not schedules:
+        click.echo("No schedules found")
+        return
+    
+    click.echo(f"{'ID':<20} {'Every':<16} {'Catch-up':<10} {'Next Run':<22} {'Command':<30}")
+    click.echo("=" * 100)
+    
+    for sched in schedules:
+        every = sched.cron if sched.cron else f"{sched.interval_seconds:g}s"
+        cmd_preview = sched.command[:27] + '...' if len(sched.command) > 30 else sched.command
+        click.echo(f"{sched.id:<20} {every:<16} {sched.catchup:<10} {_format_timestamp(sched.next_run):<22} {cmd_preview:<30}")
+    
+    click.echo(f"\nTotal: {len(schedules)} schedule(s)")
 
 
-@config.command('set')
-@click.argument('key')
-@click.argument('value')
-def config_set(key, value):
+@schedule.command('remove')
+@click.argument('schedule_id')
+def schedule_remove(schedule_id):
+    """Remove a recurring schedule"""
+    if not remove_schedule(schedule_id):
+        click.echo(f"Error: Schedule {schedule_id} not found", err=True)
+        sys.exit(1)
+    click.echo(f"Removed schedule: {schedule_id}")
+
+
+@schedule.command('run')
+def schedule_run():
     """
-    Set configuration value
+    Run the scheduler in the foreground without workers
     
-    KEY is the configuration key, VALUE is the value to set.
+    Useful when workers are started with --no-scheduler. Running several
+    schedulers at once is safe: each fire is materialized only once.
+    """
+    click.echo("Scheduler running. Press Ctrl+C to stop")
+    stop = threading.Event()
+    try:
+        run_scheduler(stop)
+    except KeyboardInterrupt:
+        stop.set()
+        click.echo("\nScheduler stopped")
+
+
+def _format_timestamp(timestamp: float) -> str:
+    """Format a Unix timestamp as a UTC ISO string"""
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+@cli.group()
+def dag():
+    """Job dependency (DAG) inspection"""
+    pass
+
+
+@dag.command('status')
+@click.argument('root_id')
+def dag_status(root_id):
+    """
+    Show progress of a job and everything that depends on it
     
-    Common keys: backoff_base, max_retries
+    ROOT_ID is the ID of the first job in the workflow.
     
     Example:
     
-        queuectl config set backoff_base 3
+        queuectl dag status build
     """
-    set_config(key, value)
+    status_data = get_dag_status(root_id)
+    
+    if status_data is None:
+        click.echo(f"Error: Job {root_id} not found", err=True)
+        sys.exit(1)
+    
+    nodes = status_data['nodes']
+    done = status_data['state_counts'].get('completed', 0)
+    click.echo(f"DAG {root_id}: {done}/{len(nodes)} job(s) completed")
+    click.echo("=" * 60)
+    
+    for node in nodes:
+        detail = node['state']
+        if node['state'] == 'blocked':
+            detail += f", waiting on {node['deps_remaining']}"
+        after = f"  (after {', '.join(node['parents'])})" if node['parents'] else ""
+        click.echo(f"{'  ' * node['depth']}{node['id']} [{detail}]{after}")
+    
+    click.echo("\nJobs by state:")
+    for state in JOB_STATES:
+        count = status_data['state_counts'].get(state, 0)
+        if count:
+            click.echo(f"  {state:12s}: {count}")
+
+
+@cli.group()
+def group():
+    """Fan-out job groups with a completion callback"""
+    pass
+
+
+@group.command('create')
+@click.argument('group_json')
+def group_create(group_json):
+    """
+    Create a group and enqueue all of its jobs at once
+    
+    GROUP_JSON is a JSON object (or '-' to read it from stdin) with 'id' and
+    'jobs' (list of job objects as accepted by enqueue, without 'depends_on'
+    or 'dedup_key'). The optional 'callback' job (no 'payload' either) is
+    validated up front and enqueued exactly once, when every member has
+    completed or died.
+    
+    Example:
+    
+        queuectl group create '{"id":"resize","jobs":[{"id":"r1","command":"resize 1.png"},{"id":"r2","command":"resize 2.png"}],"callback":{"command":"make zip"}}'
+    """
+    try:
+        if group_json == '-':
+            group_json = sys.stdin.read()
+        group_id, count = create_group(json.loads(group_json))
+        click.echo(f"Created group {group_id} with {count} job(s)")
+    except json.JSONDecodeError as e:
+        click.echo(f"Invalid JSON: {e}", err=True)
+        sys.exit(1)
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+
+@group.command('status')
+@click.argument('group_id')
+def group_status(group_id):
+    """
+    Show a group's progress
+    
+    Example:
+    
+        queuectl group status resize
+    """
+    status_data = get_group_status(group_id)
+    
+    if status_data is None:
+        click.echo(f"Error: Group {group_id} not found", err=True)
+        sys.exit(1)
+    
+    state = "finished" if status_data['finished'] else "running"
+    click.echo(f"Group {group_id}: {state}")
+    click.echo("=" * 40)
+    click.echo(f"  {'total':12s}: {status_data['total']}")
+    click.echo(f"  {'pending':12s}: {status_data['pending']}")
+    click.echo(f"  {'completed':12s}: {status_data['completed']}")
+    click.echo(f"  {'dead':12s}: {status_data['dead']}")
+    
+    if status_data['callback'] is not None:
+        enqueued = "enqueued" if status_data['callback_enqueued'] else "waiting"
+        click.echo(f"\nCallback: {status_data['callback_job_id']} ({enqueued})")
+
+
+@cli.group()
+def retry():
+    """Retry policy tools"""
+    pass
+
+
+@retry.command('simulate')
+@click.option('--policy', 'policy_spec', default=None,
+              help='Policy JSON or type name (default: config retry_policy, else exponential)')
+@click.option('--jobs', default=1000, help='Number of jobs failing at the same moment')
+@click.option('--attempts', default=3, help='Retries simulated per job')
+@click.option('--bucket', default=1.0, type=float, help='Histogram bucket width in seconds')
+def retry_simulate(policy_spec, jobs, attempts, bucket):
+    """
+    Show how retries of a mass failure spread out over time
+    
+    Policy types: exponential (base), decorrelated_jitter (base),
+    linear (step), fixed (delay). All accept max_delay, jitter (0-1),
+    dead_exit_codes and free_exit_codes.
+    
+    Examples:
+    
+        queuectl retry simulate --policy exponential --jobs 10000
+    
+        queuectl retry simulate --policy '{"type":"decorrelated_jitter","base":1,"max_delay":60}'
+    """
+    try:
+        policy = parse_policy(policy_spec or get_config('retry_policy') or 'exponential')
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    
+    buckets = simulate_retry_load(policy, jobs, attempts, bucket)
+    peak = max(buckets.values()) if buckets else 0
+    
+    click.echo(f"Policy: {json.dumps(policy.to_dict())}")
+    click.echo(f"{jobs} job(s) failing at t=0, {attempts} retries each\n")
+    click.echo(f"{'Time (s)':>10}  {'Retries':>8}")
+    click.echo("=" * 70)
+    
+    for start, count in buckets.items():
+        bar = '#' * max(1, round(40 * count / peak))
+        click.echo(f"{start:>10g}  {count:>8}  {bar}")
+    
+    click.echo(f"\nPeak: {peak} retries per {bucket:g}s bucket")
+
+
+@cli.group('queue')
+def queue_group():
+    """Queue limits (producer backpressure)"""
+    pass
+
+
+def _limit_shares(queue_name: str, max_pending: int) -> list:
+    """
+    Split a queue's limit over the shard databases as (path, share) pairs
+
+    Routing by job ID spreads a queue evenly, so the limit is split into
+    equal shares; routing by queue keeps it on one shard, which gets the
+    whole limit.
+    """
+    paths = get_shard_paths()
+    if len(paths) == 1:
+        return [(paths[0], max_pending)]
+    if get_shard_key() == 'queue':
+        return [(paths[shard_index(queue_name, len(paths))], max_pending)]
+    share, extra = divmod(max_pending, len(paths))
+    return [(path, share + (1 if index < extra else 0)) for index, path in enumerate(paths)]
+
+
+@queue_group.command('set-limit')
+@click.argument('queue_name')
+@click.argument('max_pending', type=int)
+def queue_set_limit(queue_name, max_pending):
+    """
+    Cap a queue's unfinished (pending, processing, blocked) jobs
+
+    Enqueues beyond the limit are refused; producers choose whether to
+    fail, wait or spill with 'queuectl enqueue --on-full'. Jobs already
+    queued are counted once when the limit is set; after that the count
+    is kept up to date as jobs are added and finish.
+
+    Examples:
+
+        queuectl queue set-limit default 10000
+    """
+    if max_pending < 1:
+        click.echo("Error: MAX_PENDING must be a positive integer", err=True)
+        sys.exit(1)
+    
+    try:
+        unfinished = 0
+        for path, share in _limit_shares(queue_name, max_pending):
+            with use_db_path(path):
+                unfinished += set_queue_limit(queue_name, share)
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    
+    click.echo(f"Queue '{queue_name}' limited to {max_pending} unfinished jobs ({unfinished} now)")
+
+
+@queue_group.command('remove-limit')
+@click.argument('queue_name')
+def queue_remove_limit(queue_name):
+    """Remove a queue's limit"""
+    if any(_on_each_shard(remove_queue_limit, queue_name)):
+        click.echo(f"Removed limit on queue '{queue_name}'")
+    else:
+        click.echo(f"Queue '{queue_name}' has no limit")
+
+
+@queue_group.command('drain')
+@click.option('--path', default=None, help='Overflow file (default: QUEUECTL_SPILL_PATH or <db path>.spill.jsonl)')
+def queue_drain(path):
+    """
+    Enqueue jobs spilled by 'enqueue --on-full spill'
+
+    Jobs that still do not fit stay in the overflow file, in order.
+    """
+    path = path or get_spill_path()
+    with get_storage_backend() as backend:
+        enqueued, skipped, waiting = drain_spill(backend, path)
+    
+    click.echo(f"Enqueued {enqueued} spilled job(s) from {path}")
+    if skipped:
+        click.echo(f"  Skipped {skipped} job(s) that already exist or are invalid")
+    if waiting:
+        click.echo(f"  {waiting} job(s) still waiting for room")
+
+
+@cli.group()
+def throttle():
+    """Rate limits and concurrency caps per queue or throttle key"""
+    pass
+
+
+def _throttle_shares(scope: str, name: str) -> list:
+    """
+    Split a throttle over the shard databases as (path, fraction) pairs
+
+    Like queue limits: a queue routed to one shard (QUEUECTL_SHARD_BY=queue)
+    keeps its whole throttle there; otherwise jobs spread evenly and each
+    shard gets an equal fraction.
+    """
+    paths = get_shard_paths()
+    if len(paths) == 1:
+        return [(paths[0], 1.0)]
+    if scope == 'queue' and get_shard_key() == 'queue':
+        return [(paths[shard_index(name, len(paths))], 1.0)]
+    return [(path, 1.0 / len(paths)) for path in paths]
+
+
+@throttle.command('set')
+@click.argument('name')
+@click.option('--key', 'by_key', is_flag=True, help="NAME is a job 'throttle_key' instead of a queue")
+@click.option('--rate', type=float, default=None, help='Claims per second (token bucket)')
+@click.option('--burst', type=float, default=None, help='Claims allowed at once after a quiet spell (default: max(1, rate))')
+@click.option('--max-in-flight', type=int, default=None, help='Most jobs processing at once')
+def throttle_set(name, by_key, rate, burst, max_in_flight):
+    """
+    Limit the claim rate and/or concurrency of a queue or throttle key
+
+    Checked inside the claim transaction: while a queue or key is out of
+    tokens or at its cap, workers skip its jobs and take other work.
+    Jobs count against their queue's throttle and, if they set
+    'throttle_key', against that key's throttle too.
+
+    With sharding the limits are split over the shards (caps round up to
+    at least 1 per shard).
+
+    Examples:
+
+        queuectl throttle set api-calls --rate 20 --max-in-flight 5
+
+        queuectl throttle set --key partner-x --rate 0.5
+    """
+    scope = 'key' if by_key else 'queue'
+    try:
+        shares = _throttle_shares(scope, name)
+        for index, (path, fraction) in enumerate(shares):
+            share_in_flight = None
+            if max_in_flight is not None:
+                share, extra = divmod(max_in_flight, len(shares))
+                share_in_flight = max(1, share + (1 if index < extra else 0))
+            with use_db_path(path):
+                set_throttle(scope, name,
+                             rate * fraction if rate is not None else None,
+                             max(1.0, burst * fraction) if burst is not None else None,
+                             share_in_flight)
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    
+    limits = [f"{rate:g}/s" if rate is not None else None,
+              f"burst {burst:g}" if burst is not None else None,
+              f"{max_in_flight} in flight" if max_in_flight is not None else None]
+    click.echo(f"Throttled {scope} '{name}': {', '.join(limit for limit in limits if limit)}")
+
+
+@throttle.command('remove')
+@click.argument('name')
+@click.option('--key', 'by_key', is_flag=True, help="NAME is a job 'throttle_key' instead of a queue")
+def throttle_remove(name, by_key):
+    """Remove a queue's or throttle key's throttle"""
+    scope = 'key' if by_key else 'queue'
+    if any(_on_each_shard(remove_throttle, scope, name)):
+        click.echo(f"Removed throttle on {scope} '{name}'")
+    else:
+        click.echo(f"{scope.capitalize()} '{name}' has no throttle")
+
+
+@throttle.command('list')
+def throttle_list():
+    """List throttles with their tokens left and jobs in flight"""
+    def read_throttles():
+        with get_read_db() as conn:
+            return get_throttles(conn.cursor())
+    
+    throttles = {}
+    for shard_throttles in _on_each_shard(read_throttles):
+        for row in shard_throttles:
+            merged = throttles.setdefault((row['scope'], row['name']), dict(
+                row, rate=None, burst=None, max_in_flight=None, tokens=None, in_flight=0))
+            for column in ('rate', 'burst', 'max_in_flight', 'tokens', 'in_flight'):
+                if row[column] is not None:
+                    merged[column] = (merged[column] or 0) + row[column]
+    
+    if not throttles:
+        click.echo("No throttles")
+        return
+    
+    def show(value, spec):
+        return '-' if value is None else format(value, spec)
+    
+    click.echo(f"{'Scope':<6} {'Name':<24} {'Rate/s':>8} {'Burst':>7} {'Tokens':>7} {'In flight':>10}")
+    click.echo("-" * 67)
+    for row in throttles.values():
+        in_flight = f"{row['in_flight']}/{row['max_in_flight']}" if row['max_in_flight'] is not None \
+            else str(row['in_flight'])
+        click.echo(f"{row['scope']:<6} {row['name'][:23]:<24} {show(row['rate'], 'g'):>8} "
+                   f"{show(row['burst'], 'g'):>7} {show(row['tokens'], '.1f'):>7} {in_flight:>10}")
+
+
+@cli.group()
+def batch():
+    """Batchable jobs: compatible jobs claimed together and run as one process"""
+    pass
+
+
+@batch.command('set')
+@click.argument('name')
+@click.option('--command', 'command', required=True,
+              help="Command running a batch; {items} is replaced by the jobs' items")
+@click.option('--max-size', type=click.IntRange(min=2), required=True, help='Most jobs per batch')
+@click.option('--linger', default=None,
+              help='How long due jobs wait for a full batch, in seconds or like 2s, 1m (default: 0)')
+def batch_set(name, command, max_size, linger):
+    """
+    Declare how jobs with "batch": NAME run together
+
+    A worker that claims such a job also claims up to max-size - 1 other
+    due jobs of the batch type (same queue, tenant, requires, throttle_key
+    and env) and runs the command once for all of them. The command gets
+    each job's 'batch_item' (default: the job ID), shell-quoted in place
+    of {items} and one per line in QUEUECTL_BATCH_ITEMS, and reports
+    every item as a JSON line on stdout:
+
+        {"item": "42", "ok": true, "output": "..."}
+
+        {"item": "43", "ok": false, "error": "...", "exit_code": 3}
+
+    Items are completed, retried or sent to the DLQ one by one; an item
+    without a result line failed. A job that finds no batch mates runs its
+    own command.
+
+    Examples:
+
+        queuectl batch set items --command 'process-items {items}' --max-size 100 --linger 2
+    """
+    try:
+        _on_each_shard(set_batch_type, name, command, max_size,
+                       parse_duration(linger) if linger is not None else 0.0)
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    click.echo(f"Batch type '{name}': up to {max_size} jobs per run" +
+               (f", linger {linger}" if linger is not None else ""))
+
+
+@batch.command('remove')
+@click.argument('name')
+def batch_remove(name):
+    """Remove a batch type (its jobs then run one at a time)"""
+    if any(_on_each_shard(remove_batch_type, name)):
+        click.echo(f"Removed batch type '{name}'")
+    else:
+        click.echo(f"No batch type '{name}'")
+
+
+@batch.command('list')
+def batch_list():
+    """List batch types"""
+    with get_read_db() as conn:
+        batch_types = get_batch_types(conn.cursor())
+    
+    if not batch_types:
+        click.echo("No batch types")
+        return
+    
+    click.echo(f"{'Name':<20} {'Max size':>8} {'Linger':>8}  Command")
+    click.echo("-" * 70)
+    for row in batch_types:
+        click.echo(f"{row['name'][:19]:<20} {row['max_size']:>8} {row['linger']:>7g}s  {row['command']}")
+
+
+@cli.group()
+def payload():
+    """Job payloads (compressed, stored once per distinct content)"""
+    pass
+
+
+@payload.command('show')
+@click.argument('job_id')
+def payload_show(job_id):
+    """Print a job's payload"""
+    with get_storage_backend() as backend:
+        job = backend.get_job(job_id)
+        if job is None:
+            click.echo(f"Error: Job {job_id} not found", err=True)
+            sys.exit(1)
+        if job.payload_hash is None:
+            click.echo(f"Error: Job {job_id} has no payload", err=True)
+            sys.exit(1)
+        data = backend.get_payload(job)
+    if data is None:
+        click.echo(f"Error: Payload {job.payload_hash} is missing", err=True)
+        sys.exit(1)
+    click.echo(data)
+
+
+@payload.command('stats')
+def payload_stats():
+    """Show how many payloads are stored and how well they compress"""
+    def read_stats():
+        with get_read_db() as conn:
+            return get_payload_stats(conn.cursor())
+    
+    totals = {}
+    for stats in _on_each_shard(read_stats):
+        for key, value in stats.items():
+            totals[key] = totals.get(key, 0) + value
+    
+    click.echo(f"Payloads: {totals['payloads']} ({totals['compressed']} compressed)")
+    click.echo(f"Size: {totals['size']:,} bytes, stored in {totals['stored']:,} bytes")
+
+
+@payload.command('gc')
+def payload_gc():
+    """
+    Delete payloads no job refers to any more
+
+    Payloads outlive their jobs once those are deleted (e.g. by
+    'queuectl dlq purge'); run this afterwards to reclaim the space.
+    """
+    results = _on_each_shard(collect_garbage)
+    click.echo(f"Deleted {sum(count for count, _ in results)} payload(s), "
+               f"freeing {sum(freed for _, freed in results):,} bytes")
+
+
+@cli.group()
+def tenant():
+    """Fair scheduling across tenants (claim_strategy fair)"""
+    pass
+
+
+@tenant.command('set-weight')
+@click.argument('tenant_name')
+@click.argument('weight', type=float)
+def tenant_set_weight(tenant_name, weight):
+    """
+    Set how many jobs a tenant gets per round-robin turn
+
+    Weights are relative and take effect with
+    'queuectl config set claim_strategy fair'. Tenants without a weight
+    get 1.
+
+    Examples:
+
+        queuectl tenant set-weight acme 3
+    """
+    try:
+        _on_each_shard(set_tenant_weight, tenant_name, weight)
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    click.echo(f"Tenant '{tenant_name}' weight set to {weight:g}")
+
+
+@tenant.command('list')
+def tenant_list():
+    """
+    List tenants with pending jobs or a weight
+
+    Active tenants are in round-robin order; the deficit is the share of
+    its current turn a tenant has left.
+    """
+    def read_tenants():
+        with get_read_db() as conn:
+            return get_tenants(conn.cursor())
+    
+    tenants = {}
+    for shard_tenants in _on_each_shard(read_tenants):
+        for row in shard_tenants:
+            merged = tenants.setdefault(row['tenant'], dict(row, pending=0))
+            merged['pending'] += row['pending']
+            merged['active'] = merged['active'] or row['active']
+    
+    if not tenants:
+        click.echo("No tenants with pending jobs")
+        return
+    
+    click.echo(f"Claim strategy: {get_config('claim_strategy', 'fifo')}\n")
+    click.echo(f"{'Tenant':<24} {'Weight':>7} {'Pending':>9} {'Active':<7} {'Deficit':>8}")
+    click.echo("-" * 59)
+    for row in tenants.values():
+        click.echo(f"{row['tenant'][:23]:<24} {row['weight']:>7g} {row['pending']:>9} "
+                   f"{'yes' if row['active'] else 'no':<7} {row['deficit']:>8.2f}")
+
+
+@cli.group()
+def metrics():
+    """Prometheus metrics"""
+    pass
+
+
+@metrics.command('serve')
+@click.option('--listen', default='127.0.0.1:9464', show_default=True, help='Address to serve /metrics on')
+def metrics_serve(listen):
+    """
+    Serve Prometheus metrics over HTTP
+
+    Reports queue depth and oldest pending age from the database, plus
+    latency histograms, job counters and busy errors from workers started
+    with --metrics.
+
+    Examples:
+
+        queuectl worker start --count 4 --daemon --metrics && queuectl metrics serve
+    """
+    try:
+        server = MetricsServer(lambda: render_metrics(read_snapshots(), get_shard_paths()),
+                               parse_http_address(listen))
+    except (ValueError, OSError) as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    
+    click.echo(f"Serving metrics on http://{server.address[0]}:{server.address[1]}/metrics")
+    click.echo("Press Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+@metrics.command('write')
+@click.option('--path', required=True, help='Output file, e.g. in the node_exporter textfile directory (*.prom)')
+@click.option('--interval', type=float, default=0, help='Rewrite every N seconds (default: write once)')
+def metrics_write(path, interval):
+    """
+    Write Prometheus metrics to a textfile-collector file
+
+    The file is replaced atomically, so node_exporter never reads a
+    partial write.
+
+    Examples:
+
+        queuectl metrics write --path /var/lib/node_exporter/queuectl.prom --interval 15
+    """
+    while True:
+        write_textfile(path, render_metrics(read_snapshots(), get_shard_paths()))
+        if interval <= 0:
+            click.echo(f"Metrics written to {path}")
+            return
+        try:
+            time.sleep(interval)
+        except KeyboardInterrupt:
+            return
+
+
+@cli.group()
+def diag():
+    """Diagnostics"""
+    pass
+
+
+def _contention_table(title: str, rows: list, columns: list, top: int):
+    """Print one section of the contention report"""
+    click.echo(f"\n{title}")
+    header = "".join(f"{name:<{width}}" for name, width, _ in columns)
+    click.echo(header + f"{'Txns':>7} {'Writes':>7} {'Hold s':>9} {'p95 ms':>8} {'Max ms':>8} "
+                        f"{'Waited':>7} {'Wait s':>8} {'Max ms':>8} {'Retries':>8} {'Timeouts':>9}")
+    click.echo("-" * (len(header) + 88))
+    for row in rows[:top]:
+        click.echo("".join(f"{str(fmt(row))[:width - 1]:<{width}}" for _, width, fmt in columns)
+                   + f"{row['transactions']:>7} {row['writes']:>7} {row['hold_total']:>9.3f} "
+                   f"{1000 * row['hold_p95']:>8.1f} {1000 * row['hold_max']:>8.1f} "
+                   f"{row['waited']:>7} {row['wait_total']:>8.3f} {1000 * row['wait_max']:>8.1f} "
+                   f"{row['retries']:>8} {row['timeouts']:>9}")
+    if len(rows) > top:
+        click.echo(f"... {len(rows) - top} more")
+
+
+@diag.command('contention')
+@click.option('--since', default=None, help='Only transactions since an ISO time or age (30m, 2h, 1d)')
+@click.option('--top', default=10, show_default=True, help='Rows per section')
+@click.option('--dir', 'directory', default=None, help='Trace directory (default: QUEUECTL_TRACE_DIR or <db path>.trace)')
+@click.option('--clear', is_flag=True, help='Delete the trace files instead of reporting')
+def diag_contention(since, top, directory, clear):
+    """
+    Report SQLite writer-lock contention from lock traces
+
+    Run workers and producers with QUEUECTL_TRACE_LOCKS=1 (or
+    'worker start --trace-locks') to record every transaction's lock
+    waits, retries and writer-lock hold time, then summarise them by
+    statement type, by code path and by process.
+
+    Examples:
+
+        QUEUECTL_TRACE_LOCKS=1 queuectl worker start --count 4
+
+        queuectl diag contention --since 10m
+    """
+    if clear:
+        click.echo(f"Removed {clear_traces(directory)} trace file(s)")
+        return
+    
+    since_ts = None
+    if since:
+        try:
+            since_ts = datetime.fromisoformat(parse_since(since).rstrip('Z')).replace(tzinfo=timezone.utc).timestamp()
+        except ValueError as e:
+            click.echo(f"Error: {e}", err=True)
+            sys.exit(1)
+    
+    records = read_traces(directory, since_ts)
+    if not records:
+        click.echo(f"No lock traces in {directory or get_trace_dir()} (run with QUEUECTL_TRACE_LOCKS=1)")
+        return
+    
+    span = max(record['t'] for record in records) - min(record['t'] - record['duration'] for record in records)
+    held = sum(record['hold'] or 0 for record in records)
+    click.echo(f"{len(records)} transaction(s) from {len({record['pid'] for record in records})} process(es) "
+               f"over {span:.1f}s; writer lock held {held:.3f}s "
+               f"({100 * held / span if span > 0 else 0:.1f}% of the time, summed over database files)")
+    
+    _contention_table("By statement type", summarize_contention(records, ('label',)),
+                      [('Type', 10, lambda row: row['label'])], top)
+    _contention_table("Longest writer-lock holders by code path", summarize_contention(records, ('path', 'label')),
+                      [('Code path', 44, lambda row: row['path'])], top)
+    _contention_table("By process", summarize_contention(records, ('pid', 'cmd')),
+                      [('PID', 9, lambda row: row['pid']), ('Command', 16, lambda row: row['cmd'])], top)
+
+
+@cli.group()
+def replica():
+    """Read replica management"""
+    pass
+
+
+@replica.command('sync')
+@click.option('--path', default=None, help='Replica file path (default: QUEUECTL_REPLICA_PATH or <db>.replica)')
+@click.option('--interval', default=0, type=float, help='Keep syncing every N seconds (default: sync once)')
+def replica_sync(path, interval):
+    """
+    Copy the live database into a read replica
+    
+    Uses SQLite's online backup API, so workers keep writing while the
+    copy is taken. Read it with 'status --replica', 'list --replica'
+    or 'dlq list --replica'. With sharding, every shard gets its own
+    replica next to it (--path names shard 0's).
+    
+    Examples:
+    
+        queuectl replica sync
+    
+        queuectl replica sync --interval 60
+    """
+    while True:
+        for index, shard_path in enumerate(get_shard_paths()):
+            with use_db_path(shard_path):
+                dest = sync_replica(path if index == 0 else None)
+            click.echo(f"Replica written: {dest}")
+        
+        if interval <= 0:
+            break
+        
+        try:
+            time.sleep(interval)
+        except KeyboardInterrupt:
+            break
+
+
+@cli.group()
+def config():
+    """Configuration management"""
+    pass
+
+
+@config.command('get')
+@click.argument('key')
+def config_get(key):
+    """
+    Get configuration value
+    
+    KEY is the configuration key to retrieve.
+    
+    Example:
+    
+        queuectl config get backoff_base
+    """
+    value = get_config(key)
+    
+    if value is None:
+        click.echo(f"Configuration key '{key}' not found", err=True)
+        sys.exit(1)
+    
+    click.echo(f"{key} = {value}")
+
+
+@config.command('set')
+@click.argument('key')
+@click.argument('value')
+def config_set(key, value):
+    """
+    Set configuration value
+    
+    KEY is the configuration key, VALUE is the value to set.
+    
+    Common keys: backoff_base, max_retries, claim_strategy (fifo or fair)
+    
+    With sharding the value is written to every shard, since workers read
+    config from the shard a job lives in.
+    
+    Example:
+    
+        queuectl config set backoff_base 3
+    """
+    if key == 'claim_strategy' and value not in CLAIM_STRATEGIES:
+        click.echo(f"Error: claim_strategy must be one of: {', '.join(CLAIM_STRATEGIES)}", err=True)
+        sys.exit(1)
+    
+    _on_each_shard(set_config, key, value)
     click.echo(f"Set {key} = {value}")
 
 
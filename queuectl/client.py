@@ -0,0 +1,147 @@
+"""
+asyncio client: enqueue jobs and wait for their results without polling
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from queuectl.models import Job, FINISHED_STATES
+from queuectl.backends import Backend, get_storage_backend
+
+
+# Longest single wait on the storage's change signal, so close() is noticed promptly
+WATCH_SLICE = 1.0
+
+
+class AsyncClient:
+    """
+    asyncio front end to a storage backend
+
+    Storage calls run on one worker thread, so they never block the event
+    loop. Every wait() shares one watcher: a second thread blocks on the
+    backend's change signal (PRAGMA data_version for SQLite), and after
+    each change the watcher reads all waited-on jobs in one query and
+    resolves the ones that finished. An idle client runs no queries.
+
+    Usage:
+        async with AsyncClient() as client:
+            await client.enqueue({"id": "job1", "command": "echo hi"})
+            job = await client.wait("job1", timeout=60)
+
+    Args:
+        backend: Storage to use (default: get_storage_backend()); the client
+                 owns it and closes it in close()
+    """
+
+    def __init__(self, backend: Optional[Backend] = None):
+        self.backend = backend or get_storage_backend()
+        self._storage = ThreadPoolExecutor(max_workers=1, thread_name_prefix="queuectl-client")
+        self._watch = ThreadPoolExecutor(max_workers=1, thread_name_prefix="queuectl-watch")
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._watcher: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def _call(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._storage, func, *args)
+
+    async def enqueue(self, job_data: dict) -> Job:
+        """
+        Add a job (same fields as queuectl.queue.enqueue_job)
+
+        Raises:
+            ValueError: If the job is invalid
+            DuplicateJobError: If the ID or active dedup_key already exists
+        """
+        return await self._call(self.backend.enqueue, job_data)
+
+    async def enqueue_many(self, jobs: List[dict]) -> List[Job]:
+        """
+        Add several jobs in one hop to the storage thread
+
+        Jobs are enqueued in order; on the first error the jobs before it
+        stay enqueued and the error is raised.
+        """
+        return await self._call(lambda: [self.backend.enqueue(job_data) for job_data in jobs])
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        """Get a single job by ID"""
+        return await self._call(self.backend.get_job, job_id)
+
+    async def wait(self, job_id: str, timeout: Optional[float] = None) -> Job:
+        """
+        Wait until a job is completed or dead
+
+        Args:
+            job_id: Job to wait for
+            timeout: Seconds to wait (None waits forever)
+
+        Returns:
+            The finished job (see its state and exit_code)
+
+        Raises:
+            ValueError: If the job does not exist
+            asyncio.TimeoutError: If the job is still unfinished after timeout
+        """
+        if self._closed:
+            raise ValueError("Client is closed")
+
+        # Register before the first read, so a change committed after it
+        # is always seen by the watcher
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(job_id, []).append(future)
+        try:
+            job = await self.get(job_id)
+            if job is None:
+                raise ValueError(f"Job {job_id} not found")
+            if job.state in FINISHED_STATES:
+                return job
+
+            if self._watcher is None or self._watcher.done():
+                self._watcher = asyncio.create_task(self._watch_jobs())
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            waiters = self._waiters.get(job_id, [])
+            if future in waiters:
+                waiters.remove(future)
+            if not waiters:
+                self._waiters.pop(job_id, None)
+
+    async def _watch_jobs(self):
+        """Resolve finished waiters after each change, until nobody is waiting"""
+        loop = asyncio.get_running_loop()
+        # Arm the change signal, then catch up on jobs that finished before it
+        await loop.run_in_executor(self._watch, self.backend.wait_for_work, 0)
+        changed = True
+        while self._waiters and not self._closed:
+            if changed:
+                jobs = await self._call(self.backend.get_jobs, list(self._waiters))
+                for job_id, job in jobs.items():
+                    if job.state not in FINISHED_STATES:
+                        continue
+                    for future in self._waiters.pop(job_id, []):
+                        if not future.done():
+                            future.set_result(job)
+                if not self._waiters:
+                    break
+            changed = await loop.run_in_executor(self._watch, self.backend.wait_for_work, WATCH_SLICE)
+
+    async def close(self):
+        """Stop the watcher, cancel pending waits and close the backend"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._watcher is not None:
+            await asyncio.gather(self._watcher, return_exceptions=True)
+        for futures in self._waiters.values():
+            for future in futures:
+                future.cancel()
+        self._waiters.clear()
+        # The backend's change watcher belongs to the watch thread
+        await asyncio.get_running_loop().run_in_executor(self._watch, self.backend.close)
+        self._storage.shutdown(wait=True)
+        self._watch.shutdown(wait=True)
+
+    async def __aenter__(self) -> 'AsyncClient':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -7,16 +7,23 @@ from queuectl.db import get_db
 
 def get_config(key: str, default: Optional[str] = None) -> Optional[str]:
     """Get configuration value by key"""
-    with get_db() as conn:
+    with get_db('config') as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT value FROM config WHERE key = ?", (key,))
         row = cursor.fetchone()
         return row[0] if row else default
 
 
+def read_config(cursor, key: str, default: Optional[str] = None) -> Optional[str]:
+    """Get configuration value inside the caller's transaction"""
+    cursor.execute("SELECT value FROM config WHERE key = ?", (key,))
+    row = cursor.fetchone()
+    return row[0] if row else default
+
+
 def set_config(key: str, value: str):
     """Set configuration value"""
-    with get_db() as conn:
+    with get_db('config') as conn:
         cursor = conn.cursor()
         cursor.execute("""
             INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)
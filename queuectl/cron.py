@@ -0,0 +1,126 @@
+"""
+Minimal 5-field cron expression parser (UTC)
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Set
+
+
+ALIASES = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+# (name, min, max) for minute, hour, day of month, month, day of week
+FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day of month", 1, 31),
+    ("month", 1, 12),
+    ("day of week", 0, 7),
+)
+
+# Give up if no match is found within this horizon (e.g. "0 0 30 2 *")
+MAX_SEARCH_DAYS = 366 * 5
+
+
+def _parse_field(text: str, name: str, low: int, high: int) -> Set[int]:
+    """Parse one cron field into the set of matching values"""
+    values = set()
+
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            if not step_text.isdigit() or int(step_text) == 0:
+                raise ValueError(f"Invalid step in {name} field: '{text}'")
+            step = int(step_text)
+
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            if not (start_text.isdigit() and end_text.isdigit()):
+                raise ValueError(f"Invalid range in {name} field: '{text}'")
+            start, end = int(start_text), int(end_text)
+        elif part.isdigit():
+            start = int(part)
+            end = high if step > 1 else start
+        else:
+            raise ValueError(f"Invalid {name} field: '{text}'")
+
+        if start < low or end > high or start > end:
+            raise ValueError(f"{name} field out of range ({low}-{high}): '{text}'")
+
+        values.update(range(start, end + 1, step))
+
+    return values
+
+
+class CronExpression:
+    """Parsed cron expression: minute hour day-of-month month day-of-week"""
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        text = ALIASES.get(expression.strip().lower(), expression)
+        parts = text.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression must have 5 fields: '{expression}'")
+
+        parsed = [
+            _parse_field(part, name, low, high)
+            for part, (name, low, high) in zip(parts, FIELDS)
+        ]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        # Both 0 and 7 mean Sunday; Python's weekday() has Monday=0
+        self.weekdays = {(day - 1) % 7 for day in weekdays}
+        self.days_restricted = parts[2] != "*"
+        self.weekdays_restricted = parts[4] != "*"
+
+    def _day_matches(self, dt: datetime) -> bool:
+        """Standard cron rule: if both day fields are restricted, either may match"""
+        day_ok = dt.day in self.days
+        weekday_ok = dt.weekday() in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, timestamp: float) -> float:
+        """
+        Get the first fire time strictly after a Unix timestamp
+
+        Args:
+            timestamp: Unix timestamp
+
+        Returns:
+            Unix timestamp of the next matching minute
+        """
+        dt = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+        dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=MAX_SEARCH_DAYS)
+
+        while dt < limit:
+            if dt.month not in self.months:
+                year, month = (dt.year + 1, 1) if dt.month == 12 else (dt.year, dt.month + 1)
+                dt = dt.replace(year=year, month=month, day=1, hour=0, minute=0)
+                continue
+
+            if not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+
+            if dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+                continue
+
+            if dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+                continue
+
+            return dt.timestamp()
+
+        raise ValueError(f"Cron expression never fires: '{self.expression}'")
@@ -0,0 +1,189 @@
+"""
+Job dependencies: edge table, unblocking and failure cascade
+"""
+import sqlite3
+from collections import Counter, deque
+from typing import Dict, List, Optional, Tuple
+from queuectl.db import get_read_db
+from queuectl.models import get_utc_now
+
+
+# What happens to a blocked job when one of its dependencies dies
+#   cascade: the job dies too (and so do its own dependents)
+#   ignore:  the dead dependency counts as satisfied
+#   block:   the job stays blocked until the dependency is retried and completes
+DEP_FAILURE_POLICIES = ('cascade', 'ignore', 'block')
+
+
+def _placeholders(values) -> str:
+    return ', '.join('?' for _ in values)
+
+
+def check_dependencies(cursor: sqlite3.Cursor, job_id: str, depends_on: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    Validate dependencies and split them by parent state
+
+    Must run in the same write transaction that inserts the job, so a
+    parent cannot complete between this check and the edge insert.
+
+    Returns:
+        Tuple of (completed parent IDs, dead parent IDs)
+
+    Raises:
+        ValueError: If a dependency is missing or the job depends on itself
+    """
+    if job_id in depends_on:
+        raise ValueError(f"Job {job_id} cannot depend on itself")
+
+    cursor.execute(f"""
+        SELECT id, state FROM jobs WHERE id IN ({_placeholders(depends_on)})
+    """, depends_on)
+    states = dict(cursor.fetchall())
+
+    missing = [parent for parent in depends_on if parent not in states]
+    if missing:
+        raise ValueError(f"Dependencies not found: {', '.join(missing)}")
+
+    completed = [parent for parent in depends_on if states[parent] == 'completed']
+    dead = [parent for parent in depends_on if states[parent] == 'dead']
+    return completed, dead
+
+
+def insert_edges(cursor: sqlite3.Cursor, job_id: str, depends_on: List[str], resolved: List[str]):
+    """Record dependency edges; edges to already-satisfied parents are stored resolved"""
+    cursor.executemany("""
+        INSERT OR IGNORE INTO job_deps (parent_id, child_id, resolved) VALUES (?, ?, ?)
+    """, [(parent, job_id, 1 if parent in resolved else 0) for parent in depends_on])
+
+
+def delete_edges(cursor: sqlite3.Cursor, job_ids: List[str]):
+    """Delete every edge to or from jobs that are being deleted"""
+    cursor.execute(f"""
+        DELETE FROM job_deps
+        WHERE parent_id IN ({_placeholders(job_ids)}) OR child_id IN ({_placeholders(job_ids)})
+    """, (*job_ids, *job_ids))
+
+
+def _resolve_edges(cursor: sqlite3.Cursor, parent_id: str, child_ids: Optional[List[str]] = None):
+    """Mark edges from a parent satisfied and unblock children with no remaining dependencies"""
+    if child_ids is None:
+        cursor.execute("""
+            SELECT child_id FROM job_deps WHERE parent_id = ? AND resolved = 0
+        """, (parent_id,))
+        child_ids = [row[0] for row in cursor.fetchall()]
+
+    if not child_ids:
+        return
+
+    cursor.execute(f"""
+        UPDATE job_deps SET resolved = 1
+        WHERE parent_id = ? AND child_id IN ({_placeholders(child_ids)})
+    """, (parent_id, *child_ids))
+
+    cursor.execute(f"""
+        UPDATE jobs
+        SET deps_remaining = deps_remaining - 1
+        WHERE id IN ({_placeholders(child_ids)})
+    """, child_ids)
+
+    cursor.execute(f"""
+        UPDATE jobs
+        SET state = 'pending',
+            updated_at = ?
+        WHERE id IN ({_placeholders(child_ids)}) AND state = 'blocked' AND deps_remaining <= 0
+    """, (get_utc_now(), *child_ids))
+
+
+def on_job_completed(cursor: sqlite3.Cursor, job_id: str):
+    """Unblock dependents of a completed job (inside the result transaction)"""
+    _resolve_edges(cursor, job_id)
+
+
+def on_job_dead(cursor: sqlite3.Cursor, job_id: str, default_policy: str = 'cascade') -> List[str]:
+    """
+    Apply dependency-failure policies to dependents of a dead job
+
+    Cascades breadth-first through the edge index, so only affected jobs
+    are touched.
+
+    Returns:
+        IDs of jobs that died through the cascade
+    """
+    cascaded = []
+    queue = deque([job_id])
+
+    while queue:
+        parent_id = queue.popleft()
+        cursor.execute("""
+            SELECT j.id, COALESCE(j.dep_failure, ?)
+            FROM job_deps d JOIN jobs j ON j.id = d.child_id
+            WHERE d.parent_id = ? AND d.resolved = 0 AND j.state = 'blocked'
+        """, (default_policy, parent_id))
+        children = cursor.fetchall()
+
+        ignored = [child for child, policy in children if policy == 'ignore']
+        doomed = [child for child, policy in children if policy == 'cascade']
+
+        _resolve_edges(cursor, parent_id, ignored)
+
+        if doomed:
+            cursor.execute(f"""
+                UPDATE jobs
+                SET state = 'dead',
+                    updated_at = ?,
+                    last_error = ?
+                WHERE id IN ({_placeholders(doomed)}) AND state = 'blocked'
+            """, (get_utc_now(), f"Dependency {parent_id} failed", *doomed))
+            cascaded.extend(doomed)
+            queue.extend(doomed)
+
+    return cascaded
+
+
+def get_dag_status(root_id: str) -> Optional[Dict]:
+    """
+    Get progress of a job and everything that depends on it
+
+    Args:
+        root_id: ID of the root job
+
+    Returns:
+        Dictionary with 'nodes' (BFS order: id, state, depth, parents,
+        deps_remaining) and 'state_counts', or None if the root does not exist
+    """
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM jobs WHERE id = ?", (root_id,))
+        if not cursor.fetchone():
+            return None
+
+        depth = {root_id: 0}
+        order = [root_id]
+        queue = deque([root_id])
+        while queue:
+            parent_id = queue.popleft()
+            cursor.execute("SELECT child_id FROM job_deps WHERE parent_id = ?", (parent_id,))
+            for (child_id,) in cursor.fetchall():
+                if child_id not in depth:
+                    depth[child_id] = depth[parent_id] + 1
+                    order.append(child_id)
+                    queue.append(child_id)
+
+        nodes = []
+        for job_id in order:
+            cursor.execute("SELECT state, deps_remaining FROM jobs WHERE id = ?", (job_id,))
+            state, remaining = cursor.fetchone()
+            cursor.execute("SELECT parent_id FROM job_deps WHERE child_id = ?", (job_id,))
+            parents = [row[0] for row in cursor.fetchall() if row[0] in depth]
+            nodes.append({
+                "id": job_id,
+                "state": state,
+                "depth": depth[job_id],
+                "parents": parents,
+                "deps_remaining": remaining,
+            })
+
+    return {
+        "nodes": nodes,
+        "state_counts": dict(Counter(node["state"] for node in nodes)),
+    }
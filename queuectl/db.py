@@ -3,31 +3,102 @@ SQLite database wrapper and schema migrations
 """
 import sqlite3
 import os
+import time
+from pathlib import Path
 from typing import Optional
 from contextlib import contextmanager
+from contextvars import ContextVar
 
 
 DB_PATH = "queuectl.db"
+REPLICA_SUFFIX = ".replica"
+
+# How long a statement waits for a lock before failing with "database is locked"
+BUSY_TIMEOUT_MS = 5000
+
+# Stored in PRAGMA user_version once init_db() has run; bump it with every schema change
+SCHEMA_VERSION = 1
+
+# Rows init_db() puts in the config table
+CONFIG_DEFAULTS = {
+    "backoff_base": "2",
+    "max_retries": "3",
+    "dedup_policy": "reject",
+    "cache_ttl": "86400",
+    "cache_max_entries": "10000",
+    "schedule_misfire_grace": "60",
+    "idle_max_wait": "5",
+    "retry_max_delay": "3600",
+    "dep_failure_policy": "cascade",
+    "claim_strategy": "fifo"
+}
+
+# Database path override for the current thread/task (see use_db_path)
+_db_path_override: ContextVar[Optional[str]] = ContextVar("queuectl_db_path", default=None)
 
 
 def get_db_path() -> str:
     """Get the database file path"""
-    return os.environ.get("QUEUECTL_DB_PATH", DB_PATH)
+    return _db_path_override.get() or os.environ.get("QUEUECTL_DB_PATH", DB_PATH)
+
+
+@contextmanager
+def use_db_path(path: Optional[str]):
+    """
+    Point every database helper at another file for the duration of the block
+
+    The override is a context variable, so other threads keep using their
+    own path. None leaves the current path in place.
+    """
+    token = _db_path_override.set(path or _db_path_override.get())
+    try:
+        yield
+    finally:
+        _db_path_override.reset(token)
 
 
-def get_connection() -> sqlite3.Connection:
-    """Create and return a database connection"""
-    conn = sqlite3.connect(get_db_path(), timeout=10.0)
+def get_replica_path() -> str:
+    """
+    Get the read replica file path (defaults to the database path + '.replica')
+
+    QUEUECTL_REPLICA_PATH only applies to the main database; other files
+    selected with use_db_path() (e.g. shards) keep their replica next to them.
+    """
+    db_path = get_db_path()
+    if db_path == os.environ.get("QUEUECTL_DB_PATH", DB_PATH) and "QUEUECTL_REPLICA_PATH" in os.environ:
+        return os.environ["QUEUECTL_REPLICA_PATH"]
+    return db_path + REPLICA_SUFFIX
+
+
+def get_connection(label: str = 'other') -> sqlite3.Connection:
+    """
+    Create and return a database connection
+
+    With QUEUECTL_TRACE_LOCKS set, the connection records its lock waits
+    and writer-lock hold times under label (see queuectl.locktrace).
+    """
+    if os.environ.get("QUEUECTL_TRACE_LOCKS"):
+        from queuectl.locktrace import TracedConnection
+        conn = sqlite3.connect(get_db_path(), timeout=0, factory=TracedConnection)
+        conn.label = label
+    else:
+        conn = sqlite3.connect(get_db_path(), timeout=10.0)
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
     # Enable WAL mode for better concurrency
     conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA busy_timeout=5000")
     return conn
 
 
 @contextmanager
-def get_db():
-    """Context manager for database connections"""
-    conn = get_connection()
+def get_db(label: str = 'other'):
+    """
+    Context manager for database connections
+
+    Args:
+        label: Statement type reported by the lock-contention tracer
+               (claim, result, enqueue, config, ...)
+    """
+    conn = get_connection(label)
     try:
         yield conn
         conn.commit()
@@ -38,9 +109,159 @@ def get_db():
         conn.close()
 
 
+def get_readonly_connection(path: Optional[str] = None) -> sqlite3.Connection:
+    """
+    Open a read-only connection (mode=ro, query_only)
+
+    Read-only connections never take the writer lock, so inspection
+    commands cannot block or delay workers.
+    """
+    db_path = path or get_db_path()
+    if not os.path.exists(db_path):
+        raise ValueError(f"Database file not found: {db_path}")
+
+    uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, timeout=10.0, isolation_level=None)
+    conn.execute("PRAGMA query_only=ON")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return conn
+
+
+@contextmanager
+def get_read_db(replica: bool = False):
+    """
+    Context manager for read-only snapshot connections
+
+    All queries inside the block run in one read transaction, so they see a
+    single consistent WAL snapshot. Nothing is ever committed.
+
+    Args:
+        replica: Read from the replica file instead of the live database
+    """
+    conn = get_readonly_connection(get_replica_path() if replica else None)
+    try:
+        conn.execute("BEGIN")
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        conn.close()
+
+
+def sync_replica(path: Optional[str] = None) -> str:
+    """
+    Copy the live database into a replica file using SQLite's backup API
+
+    The copy is taken from one read snapshot (writers keep going) into a
+    temporary file, which then atomically replaces the previous replica.
+
+    Args:
+        path: Replica file path (default: get_replica_path())
+
+    Returns:
+        Path of the written replica
+    """
+    dest = path or get_replica_path()
+    tmp_path = dest + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    src = get_connection('replica')
+    dst = sqlite3.connect(tmp_path)
+    try:
+        src.backup(dst)
+        # Replica is read-only; a rollback journal avoids stray -wal/-shm files
+        dst.execute("PRAGMA journal_mode=DELETE")
+        dst.commit()
+    finally:
+        dst.close()
+        src.close()
+
+    os.replace(tmp_path, dest)
+    return dest
+
+
+class ChangeWatcher:
+    """
+    Detect commits made by other connections
+
+    Polls PRAGMA data_version on a dedicated read-only connection. The check
+    only reads the WAL index header, so it is cheap enough to run every few
+    milliseconds while idle.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.conn = get_readonly_connection(path)
+        self.version = self._read_version()
+
+    def _read_version(self) -> int:
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def changed(self) -> bool:
+        """Return True if another connection committed since the last check"""
+        version = self._read_version()
+        if version != self.version:
+            self.version = version
+            return True
+        return False
+
+    def wait(self, timeout: float, stop_event=None, poll_interval: float = 0.05) -> bool:
+        """
+        Sleep until the database changes, the timeout expires or stop_event is set
+
+        Returns:
+            True if woken by a database change
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.changed():
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (stop_event is not None and stop_event.is_set()):
+                return False
+            time.sleep(min(poll_interval, remaining))
+
+    def close(self):
+        self.conn.close()
+
+
+def add_column_if_missing(cursor: sqlite3.Cursor, table: str, column: str, definition: str):
+    """Add a column to an existing table (schema migration for older databases)"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def increment_counter(cursor: sqlite3.Cursor, name: str, delta: int = 1):
+    """Add delta to a named counter inside the caller's transaction"""
+    cursor.execute("""
+        INSERT INTO counters (name, value) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+    """, (name, delta))
+
+
+def schema_is_current() -> bool:
+    """
+    Check whether init_db() has already brought the database up to SCHEMA_VERSION
+
+    Reads the header on a read-only connection, so commands that only
+    inspect the queue never wait for (or take) the writer lock.
+    """
+    if not os.path.exists(get_db_path()):
+        return False
+    conn = get_readonly_connection()
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    finally:
+        conn.close()
+
+
 def init_db():
-    """Initialize database schema"""
-    conn = get_connection()
+    """Initialize database schema (a read-only check once it is current)"""
+    if schema_is_current():
+        return
+
+    conn = get_connection('schema')
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -55,15 +276,244 @@ def init_db():
             locked_by TEXT,
             locked_at TEXT,
             last_error TEXT,
-            run_after INTEGER DEFAULT 0
+            run_after REAL DEFAULT 0,
+            dedup_key TEXT,
+            cache_key TEXT,
+            env TEXT,
+            queue TEXT NOT NULL DEFAULT 'default',
+            retry_policy TEXT,
+            last_delay REAL,
+            deps_remaining INTEGER NOT NULL DEFAULT 0,
+            dep_failure TEXT,
+            group_id TEXT,
+            exit_code INTEGER,
+            requires TEXT NOT NULL DEFAULT '',
+            tenant TEXT NOT NULL DEFAULT 'default',
+            throttle_key TEXT,
+            batch TEXT,
+            batch_item TEXT,
+            payload_hash TEXT,
+            payload_via TEXT
         )
     """)
     
+    add_column_if_missing(cursor, "jobs", "dedup_key", "TEXT")
+    add_column_if_missing(cursor, "jobs", "cache_key", "TEXT")
+    add_column_if_missing(cursor, "jobs", "env", "TEXT")
+    add_column_if_missing(cursor, "jobs", "queue", "TEXT NOT NULL DEFAULT 'default'")
+    add_column_if_missing(cursor, "jobs", "retry_policy", "TEXT")
+    add_column_if_missing(cursor, "jobs", "last_delay", "REAL")
+    add_column_if_missing(cursor, "jobs", "deps_remaining", "INTEGER NOT NULL DEFAULT 0")
+    add_column_if_missing(cursor, "jobs", "dep_failure", "TEXT")
+    add_column_if_missing(cursor, "jobs", "group_id", "TEXT")
+    add_column_if_missing(cursor, "jobs", "exit_code", "INTEGER")
+    add_column_if_missing(cursor, "jobs", "requires", "TEXT NOT NULL DEFAULT ''")
+    add_column_if_missing(cursor, "jobs", "tenant", "TEXT NOT NULL DEFAULT 'default'")
+    add_column_if_missing(cursor, "jobs", "throttle_key", "TEXT")
+    add_column_if_missing(cursor, "jobs", "batch", "TEXT")
+    add_column_if_missing(cursor, "jobs", "batch_item", "TEXT")
+    add_column_if_missing(cursor, "jobs", "payload_hash", "TEXT")
+    add_column_if_missing(cursor, "jobs", "payload_via", "TEXT")
+    
     cursor.execute("""
         CREATE INDEX IF NOT EXISTS idx_jobs_state_run_after 
         ON jobs(state, run_after, created_at)
     """)
     
+    # Claims look up pending jobs by the requirement sets a worker's tags satisfy
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_jobs_pending_requires
+        ON jobs(requires, run_after, created_at)
+        WHERE state = 'pending'
+    """)
+    
+    # Fair claims look up one tenant's pending jobs at a time (see queuectl.tenants)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_jobs_pending_tenant
+        ON jobs(tenant, requires, run_after, created_at)
+        WHERE state = 'pending'
+    """)
+    
+    # Tenants with pending jobs, in round-robin turn order, with their DRR deficit
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'active_tenants'")
+    seed_active_tenants = cursor.fetchone() is None
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS active_tenants (
+            tenant TEXT PRIMARY KEY,
+            turn INTEGER NOT NULL,
+            deficit REAL NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_active_tenants_turn
+        ON active_tenants(turn)
+    """)
+    if seed_active_tenants:
+        cursor.execute("""
+            INSERT INTO active_tenants (tenant, turn)
+            SELECT tenant, 0 FROM jobs WHERE state = 'pending' GROUP BY tenant
+        """)
+    
+    # A job becoming pending, however it gets there (enqueue, retry, release,
+    # unblocked dependency, DLQ retry, schedule), makes its tenant active
+    for event, condition in (("INSERT", "NEW.state = 'pending'"),
+                             ("UPDATE OF state", "NEW.state = 'pending' AND OLD.state != 'pending'")):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS jobs_activate_tenant_{event.split()[0].lower()}
+            AFTER {event} ON jobs
+            WHEN {condition}
+            BEGIN
+                INSERT OR IGNORE INTO active_tenants (tenant, turn)
+                VALUES (NEW.tenant, (SELECT COALESCE(MAX(turn), 0) + 1 FROM active_tenants));
+            END
+        """)
+    
+    # Tenant weights for fair claims (tenants without a row weigh 1)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tenants (
+            tenant TEXT PRIMARY KEY,
+            weight REAL NOT NULL DEFAULT 1
+        )
+    """)
+    
+    # Jobs in flight per queue and throttle key, counted by claims (see queuectl.throttles)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_jobs_processing
+        ON jobs(queue, throttle_key)
+        WHERE state = 'processing'
+    """)
+    
+    # Token buckets and concurrency caps per queue or throttle key
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS throttles (
+            scope TEXT NOT NULL,
+            name TEXT NOT NULL,
+            rate REAL,
+            burst REAL,
+            max_in_flight INTEGER,
+            tokens REAL,
+            refilled_at REAL,
+            PRIMARY KEY (scope, name)
+        )
+    """)
+    
+    # Pending batchable jobs by batch type, for gathering batches (see queuectl.batches)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_jobs_pending_batch
+        ON jobs(batch, run_after)
+        WHERE state = 'pending' AND batch IS NOT NULL
+    """)
+    
+    # Batch commands, sizes and linger times per batch type
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS batch_types (
+            name TEXT PRIMARY KEY,
+            command TEXT NOT NULL,
+            max_size INTEGER NOT NULL,
+            linger REAL NOT NULL DEFAULT 0
+        )
+    """)
+    
+    # Job payloads, compressed and stored once per distinct content (see queuectl.payloads)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS payloads (
+            hash TEXT PRIMARY KEY,
+            codec TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL
+        )
+    """)
+    
+    # Payload garbage collection looks up the jobs referring to a payload
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_jobs_payload
+        ON jobs(payload_hash)
+        WHERE payload_hash IS NOT NULL
+    """)
+    
+    # Distinct requirement sets of enqueued jobs (see queuectl.tags)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_requirements (
+            requires TEXT PRIMARY KEY
+        ) WITHOUT ROWID
+    """)
+    
+    # At most one unfinished job per dedup key; finished jobs drop out of the index
+    # (idx_jobs_dedup_key predates the 'blocked' state)
+    cursor.execute("DROP INDEX IF EXISTS idx_jobs_dedup_key")
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedup_active
+        ON jobs(dedup_key)
+        WHERE dedup_key IS NOT NULL AND state IN ('pending', 'processing', 'blocked')
+    """)
+    
+    # Dependency edges; the primary key serves parent -> children lookups
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_deps (
+            parent_id TEXT NOT NULL,
+            child_id TEXT NOT NULL,
+            resolved INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (parent_id, child_id)
+        ) WITHOUT ROWID
+    """)
+    
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_job_deps_child
+        ON job_deps(child_id)
+    """)
+    
+    # Fan-out groups; counters are kept up to date so status is a single-row read
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_groups (
+            id TEXT PRIMARY KEY,
+            total INTEGER NOT NULL DEFAULT 0,
+            pending INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0,
+            dead INTEGER NOT NULL DEFAULT 0,
+            callback TEXT,
+            callback_job_id TEXT,
+            callback_enqueued INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_jobs_group_id
+        ON jobs(group_id)
+        WHERE group_id IS NOT NULL
+    """)
+    
+    # Worker registry, kept current by each worker's heartbeat thread (see queuectl.workers)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS workers (
+            id TEXT PRIMARY KEY,
+            host TEXT NOT NULL,
+            pid INTEGER NOT NULL,
+            backend TEXT,
+            started_at REAL NOT NULL,
+            heartbeat_at REAL NOT NULL,
+            stopped_at REAL,
+            stop_requested INTEGER NOT NULL DEFAULT 0,
+            current_job TEXT,
+            jobs_done INTEGER NOT NULL DEFAULT 0,
+            jobs_failed INTEGER NOT NULL DEFAULT 0,
+            tags TEXT NOT NULL DEFAULT ''
+        )
+    """)
+    add_column_if_missing(cursor, "workers", "tags", "TEXT NOT NULL DEFAULT ''")
+    
+    # Per-queue backlog limits; unfinished is kept up to date so enqueue never counts rows
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS queue_limits (
+            queue TEXT PRIMARY KEY,
+            max_pending INTEGER NOT NULL,
+            unfinished INTEGER NOT NULL DEFAULT 0,
+            refused INTEGER NOT NULL DEFAULT 0,
+            blocked INTEGER NOT NULL DEFAULT 0,
+            spilled INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS config (
             key TEXT PRIMARY KEY,
@@ -71,17 +521,48 @@ def init_db():
         )
     """)
     
-    defaults = {
-        "backoff_base": "2",
-        "max_retries": "3",
-        "worker_pids": ""
-    }
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schedules (
+            id TEXT PRIMARY KEY,
+            command TEXT NOT NULL,
+            cron TEXT,
+            interval_seconds REAL,
+            max_retries INTEGER NOT NULL DEFAULT 3,
+            catchup TEXT NOT NULL DEFAULT 'latest',
+            next_run REAL NOT NULL,
+            last_run REAL,
+            enabled INTEGER NOT NULL DEFAULT 1,
+            created_at TEXT NOT NULL
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS result_cache (
+            cache_key TEXT PRIMARY KEY,
+            output TEXT,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_result_cache_last_used
+        ON result_cache(last_used_at)
+    """)
     
-    for key, value in defaults.items():
+    for key, value in CONFIG_DEFAULTS.items():
         cursor.execute("""
             INSERT OR IGNORE INTO config (key, value) VALUES (?, ?)
         """, (key, value))
     
+    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     conn.commit()
     conn.close()
 
@@ -0,0 +1,167 @@
+"""
+Fan-out / fan-in job groups with aggregate completion counters
+"""
+import json
+import sqlite3
+from typing import Dict, List, Optional
+from queuectl.db import get_read_db
+from queuectl.models import Job, JOB_COLUMNS, JOB_SELECT_COLUMNS, get_utc_now
+from queuectl.limits import add_unfinished
+from queuectl.tags import register_requirements
+
+
+GROUP_COLUMNS = (
+    "id", "total", "pending", "completed", "dead",
+    "callback", "callback_job_id", "callback_enqueued", "created_at",
+)
+GROUP_SELECT_COLUMNS = ", ".join(GROUP_COLUMNS)
+
+
+def create_group_row(cursor: sqlite3.Cursor, group_id: str, callback: Optional[Job]):
+    """
+    Insert an empty group
+
+    Args:
+        cursor: Cursor inside an open write transaction
+        group_id: Group ID
+        callback: The validated callback job (see queuectl.queue.build_job)
+
+    Raises:
+        ValueError: If the group already exists
+    """
+    try:
+        cursor.execute("""
+            INSERT INTO job_groups (id, total, pending, completed, dead,
+                                    callback, callback_job_id, callback_enqueued, created_at)
+            VALUES (?, 0, 0, 0, 0, ?, ?, 0, ?)
+        """, (group_id, json.dumps(callback.to_dict()) if callback else None,
+              callback.id if callback else None, get_utc_now()))
+    except sqlite3.IntegrityError:
+        raise ValueError(f"Group {group_id} already exists")
+
+
+def add_group_members(cursor: sqlite3.Cursor, group_id: str, states: List[str]):
+    """
+    Count newly inserted member jobs into their group
+
+    Raises:
+        ValueError: If the group does not exist
+    """
+    dead = sum(1 for state in states if state == 'dead')
+    cursor.execute("""
+        UPDATE job_groups
+        SET total = total + ?,
+            pending = pending + ?,
+            dead = dead + ?
+        WHERE id = ?
+    """, (len(states), len(states) - dead, dead, group_id))
+
+    if cursor.rowcount == 0:
+        raise ValueError(f"Group {group_id} not found")
+
+    if dead:
+        _maybe_enqueue_callback(cursor, group_id)
+
+
+def record_group_outcome(cursor: sqlite3.Cursor, group_id: str, outcome: str, count: int = 1):
+    """
+    Move members from pending to completed or dead (inside the result transaction)
+
+    Args:
+        cursor: Cursor inside an open write transaction
+        group_id: Group ID
+        outcome: 'completed' or 'dead'
+        count: Number of members that reached the outcome
+    """
+    column = 'completed' if outcome == 'completed' else 'dead'
+    cursor.execute(f"""
+        UPDATE job_groups
+        SET pending = pending - ?,
+            {column} = {column} + ?
+        WHERE id = ?
+    """, (count, count, group_id))
+    _maybe_enqueue_callback(cursor, group_id)
+
+
+def record_group_revival(cursor: sqlite3.Cursor, group_id: str, count: int = 1):
+    """Move dead members back to pending after a DLQ retry"""
+    cursor.execute("""
+        UPDATE job_groups
+        SET pending = pending + ?,
+            dead = dead - ?
+        WHERE id = ?
+    """, (count, count, group_id))
+
+
+def record_group_removal(cursor: sqlite3.Cursor, group_id: str, count: int = 1):
+    """Drop dead members deleted by a DLQ purge from the group's counters"""
+    cursor.execute("""
+        UPDATE job_groups
+        SET total = total - ?,
+            dead = dead - ?
+        WHERE id = ?
+    """, (count, count, group_id))
+
+
+def record_outcomes_by_job(cursor: sqlite3.Cursor, job_ids: List[str], outcome: str):
+    """Record an outcome for a set of jobs, aggregated per group"""
+    if not job_ids:
+        return
+    cursor.execute(f"""
+        SELECT group_id, COUNT(*) FROM jobs
+        WHERE id IN ({', '.join('?' for _ in job_ids)}) AND group_id IS NOT NULL
+        GROUP BY group_id
+    """, job_ids)
+    for group_id, count in cursor.fetchall():
+        record_group_outcome(cursor, group_id, outcome, count)
+
+
+def _maybe_enqueue_callback(cursor: sqlite3.Cursor, group_id: str):
+    """
+    Enqueue the group's callback job once, when no member is left pending
+
+    Raises:
+        ValueError: If a job has taken the callback's ID since the group was created
+    """
+    cursor.execute("""
+        UPDATE job_groups
+        SET callback_enqueued = 1
+        WHERE id = ? AND pending = 0 AND callback_enqueued = 0 AND callback IS NOT NULL
+    """, (group_id,))
+
+    if cursor.rowcount == 0:
+        return
+
+    cursor.execute("SELECT callback FROM job_groups WHERE id = ?", (group_id,))
+    job = Job.from_dict(json.loads(cursor.fetchone()[0]))
+    job.created_at = job.updated_at = get_utc_now()
+    try:
+        cursor.execute(f"""
+            INSERT INTO jobs ({JOB_SELECT_COLUMNS})
+            VALUES ({', '.join('?' for _ in JOB_COLUMNS)})
+        """, job.to_db_row())
+    except sqlite3.IntegrityError:
+        raise ValueError(f"Callback job {job.id} of group {group_id} collides with an existing job")
+    add_unfinished(cursor, job.queue)
+    register_requirements(cursor, [job.requires])
+
+
+def get_group_status(group_id: str) -> Optional[Dict]:
+    """Get a group's counters (single-row lookup, independent of group size)"""
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT {GROUP_SELECT_COLUMNS}
+            FROM job_groups
+            WHERE id = ?
+        """, (group_id,))
+        row = cursor.fetchone()
+
+    if not row:
+        return None
+
+    status = dict(zip(GROUP_COLUMNS, row))
+    status['callback'] = json.loads(status['callback']) if status['callback'] else None
+    status['callback_enqueued'] = bool(status['callback_enqueued'])
+    status['finished'] = status['pending'] == 0 and status['total'] > 0
+    return status
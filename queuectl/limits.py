@@ -0,0 +1,306 @@
+"""
+Per-queue backlog limits (producer backpressure) with incremental counters
+"""
+import json
+import os
+import sqlite3
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from queuectl.db import get_db, get_db_path
+from queuectl.models import ACTIVE_STATES
+
+
+# What a producer does when its queue is full
+#   reject: raise QueueFullError
+#   block:  wait (up to a timeout) for the workers to make room
+#   spill:  append the job to a local overflow file for 'queuectl queue drain'
+FULL_POLICIES = ('reject', 'block', 'spill')
+
+# Backpressure events counted per queue by enqueue_with_backpressure:
+# enqueues that failed, enqueues that had to wait, jobs spilled to the overflow file
+BACKPRESSURE_EVENTS = ('refused', 'blocked', 'spilled')
+
+LIMIT_COLUMNS = ("queue", "max_pending", "unfinished", "refused", "blocked", "spilled")
+LIMIT_SELECT_COLUMNS = ", ".join(LIMIT_COLUMNS)
+
+SPILL_SUFFIX = ".spill.jsonl"
+
+# Longest single wait on the change signal while a blocked producer waits for room
+BLOCK_WAIT_SLICE = 1.0
+
+
+class QueueFullError(ValueError):
+    """Raised when an enqueue would take a queue past its max_pending limit"""
+
+    def __init__(self, message: str, queue: str):
+        super().__init__(message)
+        self.queue = queue
+
+
+def reserve_slots(cursor: sqlite3.Cursor, queue: str, count: int = 1) -> bool:
+    """
+    Count newly inserted unfinished jobs against their queue's limit
+
+    A single conditional UPDATE on the queue's counter row, so the check
+    costs the same however long the queue is. Queues without a limit have
+    no row and always have room.
+
+    Returns:
+        False if the queue has a limit and no room for count more jobs
+    """
+    cursor.execute("""
+        UPDATE queue_limits
+        SET unfinished = unfinished + ?
+        WHERE queue = ? AND unfinished + ? <= max_pending
+    """, (count, queue, count))
+    if cursor.rowcount:
+        return True
+
+    cursor.execute("SELECT 1 FROM queue_limits WHERE queue = ?", (queue,))
+    return cursor.fetchone() is None
+
+
+def add_unfinished(cursor: sqlite3.Cursor, queue: str, count: int = 1):
+    """Count unfinished jobs that bypass the limit (scheduled runs, callbacks, DLQ retries)"""
+    if count:
+        cursor.execute("""
+            UPDATE queue_limits
+            SET unfinished = unfinished + ?
+            WHERE queue = ?
+        """, (count, queue))
+
+
+def release_slots(cursor: sqlite3.Cursor, queue: str, count: int = 1):
+    """Free the slots of jobs that completed or died"""
+    if count:
+        cursor.execute("""
+            UPDATE queue_limits
+            SET unfinished = MAX(unfinished - ?, 0)
+            WHERE queue = ?
+        """, (count, queue))
+
+
+def release_slots_by_job(cursor: sqlite3.Cursor, job_ids: List[str]):
+    """Free the slots of several finished jobs (e.g. a dependency cascade)"""
+    if not job_ids:
+        return
+    cursor.execute(f"""
+        SELECT queue, COUNT(*) FROM jobs
+        WHERE id IN ({', '.join('?' for _ in job_ids)})
+        GROUP BY queue
+    """, job_ids)
+    for queue, count in cursor.fetchall():
+        release_slots(cursor, queue, count)
+
+
+def reserve_group_slots(cursor: sqlite3.Cursor, queues: List[str]) -> Optional[str]:
+    """
+    Reserve room for a batch of new jobs, queue by queue
+
+    Returns:
+        The first queue without room, or None if every queue had room
+    """
+    for queue, count in Counter(queues).items():
+        if not reserve_slots(cursor, queue, count):
+            return queue
+    return None
+
+
+def record_backpressure_event(queue: str, event: str, count: int = 1):
+    """Count a backpressure event on a limited queue"""
+    if event not in BACKPRESSURE_EVENTS:
+        raise ValueError(f"Invalid backpressure event '{event}' (expected one of: {', '.join(BACKPRESSURE_EVENTS)})")
+    with get_db('limits') as conn:
+        conn.execute(f"""
+            UPDATE queue_limits
+            SET {event} = {event} + ?
+            WHERE queue = ?
+        """, (count, queue))
+
+
+def set_queue_limit(queue: str, max_pending: int) -> int:
+    """
+    Set (or change) a queue's max_pending limit
+
+    Counts the queue's unfinished jobs once, under the write lock, to seed
+    the counter that enqueue keeps up to date from then on.
+
+    Returns:
+        Current number of unfinished jobs in the queue
+    """
+    if max_pending < 0:
+        raise ValueError("max_pending must not be negative")
+
+    with get_db('limits') as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(f"""
+            SELECT COUNT(*) FROM jobs
+            WHERE queue = ? AND state IN ({', '.join('?' for _ in ACTIVE_STATES)})
+        """, (queue, *ACTIVE_STATES))
+        unfinished = cursor.fetchone()[0]
+
+        cursor.execute("""
+            INSERT INTO queue_limits (queue, max_pending, unfinished)
+            VALUES (?, ?, ?)
+            ON CONFLICT(queue) DO UPDATE SET
+                max_pending = excluded.max_pending,
+                unfinished = excluded.unfinished
+        """, (queue, max_pending, unfinished))
+        return unfinished
+
+
+def remove_queue_limit(queue: str) -> bool:
+    """
+    Remove a queue's limit and its counters
+
+    Returns:
+        False if the queue had no limit
+    """
+    with get_db('limits') as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM queue_limits WHERE queue = ?", (queue,))
+        return cursor.rowcount > 0
+
+
+def get_queue_limits(cursor: sqlite3.Cursor) -> List[Dict]:
+    """Get every limited queue with its counters"""
+    cursor.execute(f"""
+        SELECT {LIMIT_SELECT_COLUMNS}
+        FROM queue_limits
+        ORDER BY queue
+    """)
+    return [dict(zip(LIMIT_COLUMNS, row)) for row in cursor.fetchall()]
+
+
+def merge_queue_limits(per_shard: List[List[Dict]]) -> List[Dict]:
+    """Add up the limits and counters each shard keeps for the same queue"""
+    merged: Dict[str, Dict] = {}
+    for limits in per_shard:
+        for limit in limits:
+            total = merged.setdefault(limit['queue'], {column: 0 for column in LIMIT_COLUMNS})
+            total['queue'] = limit['queue']
+            for column in LIMIT_COLUMNS[1:]:
+                total[column] += limit[column]
+    return [merged[queue] for queue in sorted(merged)]
+
+
+def get_spill_path() -> str:
+    """Get the overflow file (QUEUECTL_SPILL_PATH, default: database path + '.spill.jsonl')"""
+    return os.environ.get("QUEUECTL_SPILL_PATH") or get_db_path() + SPILL_SUFFIX
+
+
+def spill_job(job_data: dict, path: Optional[str] = None) -> str:
+    """
+    Append a job to the overflow file
+
+    Each job is one JSON line written with a single append, so several
+    producers can share the file.
+
+    Returns:
+        Path of the overflow file
+    """
+    path = path or get_spill_path()
+    line = json.dumps(job_data, separators=(',', ':')) + "\n"
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(line)
+    return path
+
+
+def enqueue_with_backpressure(backend, job_data: dict, on_full: str = 'reject',
+                              timeout: Optional[float] = None,
+                              spill_path: Optional[str] = None):
+    """
+    Enqueue a job, applying a producer policy when its queue is full
+
+    Args:
+        backend: Storage backend to enqueue into
+        job_data: Job fields as accepted by enqueue_job
+        on_full: One of FULL_POLICIES
+        timeout: Longest wait for the 'block' policy (None waits forever)
+        spill_path: Overflow file for the 'spill' policy (default: get_spill_path())
+
+    Each outcome is counted on the queue's limit row (see BACKPRESSURE_EVENTS).
+    A blocked producer retries after each commit by another connection;
+    refused attempts roll back without writing, so they do not wake it.
+
+    Returns:
+        The enqueued Job, or None if it was spilled
+
+    Raises:
+        QueueFullError: If the queue is full ('reject', or 'block' after the timeout)
+    """
+    if on_full not in FULL_POLICIES:
+        raise ValueError(f"Invalid on_full policy '{on_full}' (expected one of: {', '.join(FULL_POLICIES)})")
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    waited = False
+    while True:
+        try:
+            return backend.enqueue(job_data)
+        except QueueFullError as e:
+            if on_full == 'reject':
+                backend.record_backpressure(e.queue, 'refused')
+                raise
+            if on_full == 'spill':
+                spill_job(job_data, spill_path)
+                backend.record_backpressure(e.queue, 'spilled')
+                return None
+
+            if not waited:
+                backend.record_backpressure(e.queue, 'blocked')
+                waited = True
+            remaining = BLOCK_WAIT_SLICE if deadline is None else deadline - time.monotonic()
+            if remaining <= 0:
+                backend.record_backpressure(e.queue, 'refused')
+                raise QueueFullError(f"{e} (gave up after {timeout:g}s)", e.queue)
+            # Finished jobs commit, which wakes the wait; retry after any change
+            backend.wait_for_work(min(remaining, BLOCK_WAIT_SLICE))
+
+
+def drain_spill(backend, path: Optional[str] = None) -> Tuple[int, int, int]:
+    """
+    Enqueue the jobs waiting in an overflow file
+
+    The file is renamed before it is read, so producers spilling meanwhile
+    start a new one. Jobs that still do not fit (and every job after the
+    first of them, to keep their order) are appended back. Jobs that are
+    rejected for another reason (already enqueued, invalid) or deduplicated
+    onto an existing job are dropped.
+
+    Returns:
+        Tuple of (enqueued, skipped, still waiting)
+    """
+    path = path or get_spill_path()
+    if not os.path.exists(path):
+        return 0, 0, 0
+
+    draining = path + ".draining"
+    if not os.path.exists(draining):
+        os.replace(path, draining)
+
+    enqueued = skipped = 0
+    leftover = []
+    with open(draining, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            if leftover:
+                leftover.append(line)
+                continue
+            try:
+                if backend.enqueue(json.loads(line)).deduplicated:
+                    skipped += 1
+                else:
+                    enqueued += 1
+            except QueueFullError:
+                leftover.append(line)
+            except ValueError:
+                skipped += 1
+
+    if leftover:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.writelines(leftover)
+    os.remove(draining)
+    return enqueued, skipped, len(leftover)
@@ -0,0 +1,297 @@
+"""
+SQLite lock-contention tracing (QUEUECTL_TRACE_LOCKS) and its report
+"""
+import glob
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from queuectl.db import DB_PATH, BUSY_TIMEOUT_MS, get_db_path
+
+
+TRACE_SUFFIX = ".trace"
+
+SQLITE_BUSY = 5
+SQLITE_BUSY_SNAPSHOT = 517
+
+# Sleeps between lock attempts, in seconds (the schedule of SQLite's own busy handler)
+RETRY_DELAYS = (0.001, 0.002, 0.005, 0.010, 0.015, 0.020, 0.025, 0.025, 0.025, 0.050, 0.050, 0.100)
+
+# Statements that take the writer lock; a plain (deferred) BEGIN only takes it at the first write
+_WRITE_STATEMENT = re.compile(
+    r"\s*(?:BEGIN\s+(?:IMMEDIATE|EXCLUSIVE)|INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER"
+    r"|WITH\b.*\b(?:INSERT|UPDATE|DELETE|REPLACE)\b)\b",
+    re.IGNORECASE | re.DOTALL,
+)
+
+# Frames skipped when attributing a transaction to the code that opened it
+_PLUMBING = (os.path.normcase(__file__), os.path.normcase(sys.modules['queuectl.db'].__file__))
+
+
+def get_trace_dir() -> str:
+    """
+    Get the directory trace files go to (QUEUECTL_TRACE_DIR, default: database path + '.trace')
+
+    Shards trace into the main database's directory, so one report covers them all.
+    """
+    return os.environ.get("QUEUECTL_TRACE_DIR") or os.environ.get("QUEUECTL_DB_PATH", DB_PATH) + TRACE_SUFFIX
+
+
+def is_busy(error: sqlite3.OperationalError) -> bool:
+    """
+    True for lock errors that waiting can resolve
+
+    SQLITE_BUSY_SNAPSHOT (the transaction's read snapshot went stale) is
+    returned at once by SQLite's own busy handler too, so it is not retried.
+    """
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is None:
+        return 'database is locked' in str(error)
+    return code & 0xff == SQLITE_BUSY and code != SQLITE_BUSY_SNAPSHOT
+
+
+def _caller() -> str:
+    """module:function of the first frame outside the connection layer"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.normcase(frame.f_code.co_filename)
+        if filename not in _PLUMBING and not filename.endswith('contextlib.py'):
+            module = frame.f_globals.get('__name__', '?')
+            return f"{module}:{frame.f_code.co_name}"
+        frame = frame.f_back
+    return '?'
+
+
+class TraceWriter:
+    """Appends one JSON line per transaction to this process's trace file"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.directory = None
+        self.file = None
+
+    def write(self, record: dict):
+        line = json.dumps(record, separators=(',', ':')) + "\n"
+        directory = get_trace_dir()
+        with self.lock:
+            # Reopen after a fork, so every process writes its own file, or when the directory changes
+            if self.pid != os.getpid() or self.directory != directory:
+                if self.file is not None and self.pid == os.getpid():
+                    self.file.close()
+                os.makedirs(directory, exist_ok=True)
+                self.pid = os.getpid()
+                self.directory = directory
+                self.file = open(os.path.join(directory, f"trace-{self.pid}.ndjson"), 'a',
+                                 encoding='utf-8', buffering=1)
+            self.file.write(line)
+
+
+_writer = TraceWriter()
+
+
+class TracedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        return self.connection._run(sqlite3.Cursor.execute, self, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        # Parameters are materialised so a retry can replay them
+        return self.connection._run(sqlite3.Cursor.executemany, self, sql, list(seq_of_parameters))
+
+
+class TracedConnection(sqlite3.Connection):
+    """
+    Connection that records lock waits and writer-lock hold time per transaction
+
+    The connection runs with busy_timeout=0 and does the waiting itself,
+    retrying busy statements on SQLite's busy-handler schedule for up to
+    BUSY_TIMEOUT_MS, so every wait and retry is measured. The writer lock
+    counts as held from BEGIN IMMEDIATE/EXCLUSIVE or the transaction's
+    first write statement until commit or rollback; a deferred BEGIN
+    followed only by reads holds no writer lock.
+
+    Each finished transaction becomes one trace record:
+        label:    statement type given to get_db (claim, result, enqueue, config, ...)
+        path:     module:function that opened the connection
+        wait:     seconds spent waiting for locks
+        retries:  lock attempts that found the database busy
+        hold:     seconds the writer lock was held (null for read-only transactions)
+        timeout:  true if a statement gave up after BUSY_TIMEOUT_MS
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.label = 'other'
+        self.path = _caller()
+        self.database = get_db_path()
+        self._reset()
+
+    def _reset(self):
+        self.started = None
+        self.lock_acquired = None
+        self.wait = 0.0
+        self.retries = 0
+        self.timed_out = False
+
+    def _run(self, func, *args):
+        if self.started is None:
+            self.started = time.perf_counter()
+        waiting_since = None
+        attempt = 0
+        while True:
+            try:
+                result = func(*args)
+                break
+            except sqlite3.OperationalError as e:
+                if not is_busy(e):
+                    raise
+                now = time.perf_counter()
+                if waiting_since is None:
+                    waiting_since = now
+                waited = now - waiting_since
+                budget = BUSY_TIMEOUT_MS / 1000 - waited
+                if budget <= 0:
+                    self.wait += waited
+                    self.timed_out = True
+                    raise
+                self.retries += 1
+                time.sleep(min(RETRY_DELAYS[min(attempt, len(RETRY_DELAYS) - 1)], budget))
+                attempt += 1
+
+        now = time.perf_counter()
+        if waiting_since is not None:
+            self.wait += now - waiting_since
+        # args is (cursor, sql, parameters) for statements, empty for commit
+        if (self.lock_acquired is None and self.in_transaction and len(args) > 1
+                and _WRITE_STATEMENT.match(args[1])):
+            self.lock_acquired = now
+        return result
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        try:
+            self._run(super().commit)
+        finally:
+            self._record('commit')
+
+    def rollback(self):
+        try:
+            super().rollback()
+        finally:
+            self._record('rollback')
+
+    def close(self):
+        if self.in_transaction:
+            self._record('close')
+        super().close()
+
+    def _record(self, outcome: str):
+        if self.started is None:
+            return
+        now = time.perf_counter()
+        _writer.write({
+            't': round(time.time(), 6),
+            'pid': os.getpid(),
+            'cmd': ' '.join(sys.argv[1:3]) or sys.argv[0],
+            'db': os.path.basename(self.database),
+            'label': self.label,
+            'path': self.path,
+            'outcome': outcome,
+            'wait': round(self.wait, 6),
+            'retries': self.retries,
+            'hold': None if self.lock_acquired is None else round(now - self.lock_acquired, 6),
+            'duration': round(now - self.started, 6),
+            'timeout': self.timed_out,
+        })
+        self._reset()
+
+
+def read_traces(directory: Optional[str] = None, since: Optional[float] = None) -> List[Dict]:
+    """
+    Read every trace record in a directory
+
+    Args:
+        directory: Trace directory (default: get_trace_dir())
+        since: Only records at or after this Unix timestamp
+    """
+    records = []
+    for path in sorted(glob.glob(os.path.join(directory or get_trace_dir(), "trace-*.ndjson"))):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # line cut short by a crash
+                if since is None or record['t'] >= since:
+                    records.append(record)
+    return records
+
+
+def clear_traces(directory: Optional[str] = None) -> int:
+    """Delete the trace files in a directory, returning how many were removed"""
+    paths = glob.glob(os.path.join(directory or get_trace_dir(), "trace-*.ndjson"))
+    for path in paths:
+        os.remove(path)
+    return len(paths)
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize_contention(records: Iterable[Dict], key: Tuple[str, ...]) -> List[Dict]:
+    """
+    Group trace records and total their waits and writer-lock holds
+
+    Args:
+        records: Trace records (see TracedConnection)
+        key: Record fields to group by, e.g. ('label',) or ('pid', 'cmd')
+
+    Returns:
+        One row per group, longest total hold first
+    """
+    groups: Dict[tuple, Dict] = {}
+    for record in records:
+        group = groups.setdefault(tuple(record[field] for field in key), {
+            **{field: record[field] for field in key},
+            'transactions': 0, 'writes': 0, 'waits': [], 'holds': [],
+            'retries': 0, 'timeouts': 0,
+        })
+        group['transactions'] += 1
+        group['retries'] += record['retries']
+        group['timeouts'] += bool(record['timeout'])
+        if record['wait'] > 0:
+            group['waits'].append(record['wait'])
+        if record['hold'] is not None:
+            group['writes'] += 1
+            group['holds'].append(record['hold'])
+
+    rows = []
+    for group in groups.values():
+        waits, holds = group.pop('waits'), group.pop('holds')
+        group.update({
+            'waited': len(waits),
+            'wait_total': sum(waits),
+            'wait_max': max(waits, default=0.0),
+            'hold_total': sum(holds),
+            'hold_p95': _percentile(holds, 0.95),
+            'hold_max': max(holds, default=0.0),
+        })
+        rows.append(group)
+    rows.sort(key=lambda row: row['hold_total'], reverse=True)
+    return rows
@@ -0,0 +1,478 @@
+"""
+Prometheus metrics: per-worker counters and histograms plus queue depth
+"""
+import bisect
+import fcntl
+import glob
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from queuectl.db import get_db_path, get_read_db, use_db_path
+from queuectl.models import JOB_STATES, get_unix_timestamp
+from queuectl.recycle import get_rss_bytes
+
+
+METRICS_SUFFIX = ".metrics"
+
+# Counters of stopped workers, folded together so their snapshot files can go
+RETIRED_FILE = "retired.json"
+LOCK_FILE = "snapshots.lock"
+
+# Characters of a worker ID replaced in its snapshot file name
+_UNSAFE_NAME = re.compile(r'[^\w.-]')
+
+# Latency histogram bucket bounds in seconds (a job can run for up to 5 minutes)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+# Phases timed by every worker: claiming, running the command, recording the result
+PHASES = ('claim', 'execute', 'result_write')
+
+# How often a worker writes its snapshot (it always writes one on shutdown)
+FLUSH_INTERVAL = 5.0
+
+# Workers whose snapshot is older than this are left out of per-worker series
+STALE_AFTER = 60.0
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def get_metrics_dir() -> str:
+    """Get the directory workers write snapshots to (QUEUECTL_METRICS_DIR, default: database path + '.metrics')"""
+    return os.environ.get("QUEUECTL_METRICS_DIR") or get_db_path() + METRICS_SUFFIX
+
+
+def parse_http_address(address: str) -> Tuple[str, int]:
+    """Parse a 'host:port' or ':port' listen address"""
+    host, _, port = address.rpartition(':')
+    try:
+        return host or '127.0.0.1', int(port)
+    except ValueError:
+        raise ValueError(f"Invalid listen address '{address}' (expected host:port)")
+
+
+def is_busy_error(error: Exception) -> bool:
+    """True for SQLite errors raised when a lock wait outlasted busy_timeout"""
+    return isinstance(error, sqlite3.OperationalError) and (
+        'locked' in str(error) or 'busy' in str(error)
+    )
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def merge(self, other: 'Histogram'):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.sum += other.sum
+
+    def to_dict(self) -> dict:
+        return {"counts": self.counts, "sum": self.sum}
+
+    @staticmethod
+    def from_dict(data: dict) -> 'Histogram':
+        histogram = Histogram()
+        histogram.counts = list(data['counts'])
+        histogram.sum = data['sum']
+        return histogram
+
+
+class WorkerMetrics:
+    """
+    Counters and histograms of one worker process
+
+    Only the worker's own loop touches them, so recording is a few plain
+    integer and float updates with no locks or I/O. Every FLUSH_INTERVAL
+    the worker replaces its snapshot file (write to a temp file, then
+    rename), which exporters read and add up. Snapshots are keyed by
+    worker ID; once the worker has stopped, its final snapshot is folded
+    into RETIRED_FILE (see retire_snapshots).
+
+    Args:
+        worker_id: Label for the per-worker series
+        directory: Snapshot directory (default: get_metrics_dir())
+    """
+
+    def __init__(self, worker_id: str, directory: Optional[str] = None):
+        self.worker_id = worker_id
+        self.directory = directory or get_metrics_dir()
+        self.path = os.path.join(self.directory, f"worker-{_UNSAFE_NAME.sub('_', worker_id)}.json")
+        self.started_at = time.time()
+
+        self.histograms = {phase: Histogram() for phase in PHASES}
+        self.jobs = {"completed": 0, "failed": 0, "cached": 0}
+        self.busy_errors = 0
+        # Set by the worker: time from spawn until ready to claim, why it recycled, whether it exited
+        self.startup_seconds: Optional[float] = None
+        self.recycled: Optional[str] = None
+        self.stopped = False
+
+        self._last_flush = time.monotonic()
+        self._last_flush_jobs = 0
+        self.jobs_per_second = 0.0
+        os.makedirs(self.directory, exist_ok=True)
+        # Report the worker right away rather than after the first interval
+        self.flush()
+
+    def observe(self, phase: str, seconds: float):
+        self.histograms[phase].observe(seconds)
+
+    def count_job(self, outcome: str):
+        self.jobs[outcome] += 1
+
+    def count_busy(self):
+        self.busy_errors += 1
+
+    def maybe_flush(self):
+        """Write the snapshot if FLUSH_INTERVAL has passed"""
+        if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Write the snapshot now, with the job rate since the previous write"""
+        now = time.monotonic()
+        processed = sum(self.jobs.values())
+        elapsed = now - self._last_flush
+        if elapsed > 0:
+            self.jobs_per_second = (processed - self._last_flush_jobs) / elapsed
+        self._last_flush = now
+        self._last_flush_jobs = processed
+
+        snapshot = {
+            "worker_id": self.worker_id,
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "updated_at": time.time(),
+            "jobs": self.jobs,
+            "jobs_per_second": round(self.jobs_per_second, 3),
+            "busy_errors": self.busy_errors,
+            "startup_seconds": self.startup_seconds,
+            "recycled": self.recycled,
+            "stopped": self.stopped,
+            "rss_bytes": get_rss_bytes(),
+            "histograms": {phase: histogram.to_dict() for phase, histogram in self.histograms.items()},
+        }
+        _write_json(self.path, snapshot)
+        if self.stopped:
+            retire_snapshots(self.directory)
+
+
+def _write_json(path: str, data: dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Optional[dict]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Removed by a fold, or not written yet
+        return None
+
+
+@contextmanager
+def _snapshot_lock(directory: str, operation: int):
+    """Hold LOCK_FILE, so no reader sees a snapshot both in its file and in RETIRED_FILE"""
+    with open(os.path.join(directory, LOCK_FILE), 'a') as f:
+        fcntl.flock(f, operation)
+        yield
+
+
+def _empty_totals() -> dict:
+    """A RETIRED_FILE record with nothing folded into it"""
+    return {
+        "retired": True,
+        "stopped": True,
+        "updated_at": 0.0,
+        "workers": 0,
+        "jobs": {},
+        "busy_errors": 0,
+        "histograms": {phase: Histogram().to_dict() for phase in PHASES},
+        "recycles": {},
+        "starts": 0,
+        "startup_seconds": 0.0,
+    }
+
+
+def _add_snapshot(totals: dict, snapshot: dict):
+    """Add a worker snapshot, or another totals record, to a totals record"""
+    for outcome, count in snapshot['jobs'].items():
+        totals['jobs'][outcome] = totals['jobs'].get(outcome, 0) + count
+    totals['busy_errors'] += snapshot['busy_errors']
+    for phase in PHASES:
+        histogram = Histogram.from_dict(totals['histograms'][phase])
+        histogram.merge(Histogram.from_dict(snapshot['histograms'][phase]))
+        totals['histograms'][phase] = histogram.to_dict()
+
+    if snapshot.get('retired'):
+        workers, recycles = snapshot['workers'], snapshot['recycles']
+        starts, startup_seconds = snapshot['starts'], snapshot['startup_seconds']
+    else:
+        workers, recycles = 1, {snapshot['recycled']: 1} if snapshot.get('recycled') else {}
+        started = snapshot.get('startup_seconds') is not None
+        starts, startup_seconds = int(started), snapshot['startup_seconds'] if started else 0.0
+    totals['workers'] += workers
+    for reason, count in recycles.items():
+        totals['recycles'][reason] = totals['recycles'].get(reason, 0) + count
+    totals['starts'] += starts
+    totals['startup_seconds'] += startup_seconds
+    totals['updated_at'] = max(totals['updated_at'], snapshot['updated_at'])
+
+
+def retire_snapshots(directory: Optional[str] = None) -> int:
+    """
+    Fold the snapshots of stopped workers into RETIRED_FILE and remove them
+
+    Keeps one file per live worker, while the counter totals of every
+    worker that ever ran are kept.
+
+    Returns:
+        Number of snapshots folded
+    """
+    directory = directory or get_metrics_dir()
+    retired_path = os.path.join(directory, RETIRED_FILE)
+    with _snapshot_lock(directory, fcntl.LOCK_EX):
+        totals = _read_json(retired_path) or _empty_totals()
+        folded = []
+        for path in glob.glob(os.path.join(directory, "worker-*.json")):
+            snapshot = _read_json(path)
+            if snapshot is not None and snapshot.get('stopped'):
+                _add_snapshot(totals, snapshot)
+                folded.append(path)
+        if folded:
+            _write_json(retired_path, totals)
+            for path in folded:
+                os.remove(path)
+    return len(folded)
+
+
+def read_snapshots(directory: Optional[str] = None) -> List[dict]:
+    """Read every worker snapshot in the metrics directory, plus the retired totals"""
+    directory = directory or get_metrics_dir()
+    if not os.path.isdir(directory):
+        return []
+    with _snapshot_lock(directory, fcntl.LOCK_SH):
+        paths = sorted(glob.glob(os.path.join(directory, "worker-*.json")))
+        paths.append(os.path.join(directory, RETIRED_FILE))
+        return [snapshot for snapshot in map(_read_json, paths) if snapshot is not None]
+
+
+def _age_seconds(created_at: str, now: datetime) -> float:
+    created = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    return max(0.0, (now - created).total_seconds())
+
+
+def collect_queue_metrics(paths: List[str]) -> Tuple[Dict[Tuple[str, str], int], Dict[str, float]]:
+    """
+    Read job counts and the oldest due pending job per queue
+
+    Uses read-only snapshot connections, so scrapes never block workers.
+
+    Args:
+        paths: Database files to add up (every shard)
+
+    Returns:
+        Tuple of ({(queue, state): count}, {queue: oldest pending age in seconds})
+    """
+    depth: Dict[Tuple[str, str], int] = {}
+    oldest: Dict[str, str] = {}
+    for path in paths:
+        with use_db_path(path), get_read_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT queue, state, COUNT(*) FROM jobs GROUP BY queue, state")
+            for queue, state, count in cursor.fetchall():
+                depth[(queue, state)] = depth.get((queue, state), 0) + count
+
+            cursor.execute("""
+                SELECT queue, MIN(created_at) FROM jobs
+                WHERE state = 'pending' AND run_after <= ?
+                GROUP BY queue
+            """, (get_unix_timestamp(),))
+            for queue, created_at in cursor.fetchall():
+                if queue not in oldest or created_at < oldest[queue]:
+                    oldest[queue] = created_at
+
+    now = datetime.now(timezone.utc)
+    return depth, {queue: _age_seconds(created_at, now) for queue, created_at in oldest.items()}
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_bound(bound: float) -> str:
+    return f"{bound:g}"
+
+
+def render_metrics(snapshots: List[dict], paths: Optional[List[str]] = None) -> str:
+    """
+    Render the Prometheus text exposition format
+
+    Args:
+        snapshots: Worker snapshots (see read_snapshots)
+        paths: Database files for queue depth (None skips the queue metrics,
+               e.g. for workers attached to a broker)
+    """
+    lines = []
+
+    def metric(name: str, kind: str, help_text: str):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    if paths is not None:
+        depth, oldest = collect_queue_metrics(paths)
+        metric("queuectl_jobs", "gauge", "Jobs by queue and state")
+        queues = sorted({queue for queue, _ in depth} | {'default'})
+        for queue in queues:
+            for state in JOB_STATES:
+                lines.append(f"queuectl_jobs{_labels(queue=queue, state=state)} {depth.get((queue, state), 0)}")
+
+        metric("queuectl_oldest_pending_age_seconds", "gauge",
+               "Age of the oldest due pending job by queue (0 when none is waiting)")
+        for queue in queues:
+            lines.append(f"queuectl_oldest_pending_age_seconds{_labels(queue=queue)} {oldest.get(queue, 0.0):.3f}")
+
+    now = time.time()
+    live = [snapshot for snapshot in snapshots
+            if now - snapshot['updated_at'] <= STALE_AFTER and not snapshot.get('stopped')]
+
+    metric("queuectl_workers", "gauge", "Workers that reported metrics recently")
+    lines.append(f"queuectl_workers {len(live)}")
+
+    # Totals include exited workers (RETIRED_FILE) so the counters never go backwards
+    totals = _empty_totals()
+    for snapshot in snapshots:
+        _add_snapshot(totals, snapshot)
+    metric("queuectl_jobs_processed_total", "counter", "Jobs processed by workers, by outcome")
+    for outcome in sorted(totals['jobs']):
+        lines.append(f"queuectl_jobs_processed_total{_labels(outcome=outcome)} {totals['jobs'][outcome]}")
+
+    metric("queuectl_sqlite_busy_total", "counter", "SQLite lock waits that outlasted busy_timeout in workers")
+    lines.append(f"queuectl_sqlite_busy_total {totals['busy_errors']}")
+
+    for phase in PHASES:
+        histogram = Histogram.from_dict(totals['histograms'][phase])
+        name = f"queuectl_{phase}_seconds"
+        metric(name, "histogram", f"Worker {phase.replace('_', ' ')} latency")
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(le=_format_bound(bound))} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(le='+Inf')} {histogram.count}")
+        lines.append(f"{name}_sum {histogram.sum:.6f}")
+        lines.append(f"{name}_count {histogram.count}")
+
+    # Recycling: how often workers are replaced and what a replacement costs
+    metric("queuectl_worker_recycles_total", "counter", "Workers that exited to be replaced, by limit reached")
+    for reason in sorted(totals['recycles']):
+        lines.append(f"queuectl_worker_recycles_total{_labels(reason=reason)} {totals['recycles'][reason]}")
+
+    metric("queuectl_worker_starts_total", "counter", "Worker processes started by a supervisor")
+    lines.append(f"queuectl_worker_starts_total {totals['starts']}")
+    metric("queuectl_worker_startup_seconds_total", "counter",
+           "Time from spawning a worker process until it is ready to claim, summed over starts")
+    lines.append(f"queuectl_worker_startup_seconds_total {totals['startup_seconds']:.6f}")
+
+    metric("queuectl_worker_rss_bytes", "gauge", "Resident memory per live worker at its last snapshot")
+    for snapshot in live:
+        if snapshot.get('rss_bytes') is not None:
+            lines.append(f"queuectl_worker_rss_bytes{_labels(worker=snapshot['worker_id'])} {snapshot['rss_bytes']}")
+
+    metric("queuectl_worker_jobs_processed_total", "counter", "Jobs processed per live worker, by outcome")
+    for snapshot in live:
+        for outcome, count in sorted(snapshot['jobs'].items()):
+            lines.append(f"queuectl_worker_jobs_processed_total"
+                         f"{_labels(worker=snapshot['worker_id'], outcome=outcome)} {count}")
+
+    metric("queuectl_worker_jobs_per_second", "gauge", "Jobs per second per live worker over its last snapshot interval")
+    for snapshot in live:
+        lines.append(f"queuectl_worker_jobs_per_second{_labels(worker=snapshot['worker_id'])} "
+                     f"{snapshot['jobs_per_second']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path: str, text: str):
+    """Replace a node_exporter textfile-collector file atomically"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class MetricsServer:
+    """
+    Minimal HTTP server answering GET /metrics
+
+    Each scrape reads the worker snapshots and runs the depth queries, so
+    nothing is computed between scrapes.
+
+    Args:
+        render: Callable returning the exposition text
+        address: (host, port) to listen on
+    """
+
+    def __init__(self, render, address: Tuple[str, int]):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                try:
+                    body = render().encode('utf-8')
+                except Exception as e:
+                    self.send_error(500, str(e))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(address, Handler)
+        self.address = self.httpd.server_address
+
+    def start_in_thread(self) -> threading.Thread:
+        thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
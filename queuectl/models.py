@@ -1,9 +1,35 @@
 """
 Job dataclass and helper conversions
 """
+import json
+import time
 from dataclasses import dataclass, asdict
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Dict, List
+
+
+# Column order used by every SELECT that is turned into a Job
+JOB_COLUMNS = (
+    "id", "command", "state", "attempts", "max_retries",
+    "created_at", "updated_at", "locked_by", "locked_at",
+    "last_error", "run_after", "dedup_key", "cache_key", "env",
+    "queue", "retry_policy", "last_delay", "deps_remaining", "dep_failure",
+    "group_id", "exit_code", "requires", "tenant", "throttle_key",
+    "batch", "batch_item", "payload_hash", "payload_via",
+)
+JOB_SELECT_COLUMNS = ", ".join(JOB_COLUMNS)
+
+# Columns stored as JSON text
+JSON_COLUMNS = ("env", "retry_policy")
+
+# States that still have work ahead of them
+ACTIVE_STATES = ("pending", "processing", "blocked")
+
+# States a job never leaves on its own (only a DLQ retry revives dead jobs)
+FINISHED_STATES = ("completed", "dead")
+
+# Every job state, in lifecycle order
+JOB_STATES = ("blocked", "pending", "processing", "completed", "failed", "dead")
 
 
 @dataclass
@@ -19,11 +45,32 @@ class Job:
     locked_by: Optional[str] = None
     locked_at: Optional[str] = None
     last_error: Optional[str] = None
-    run_after: int = 0  # Unix timestamp for delayed/scheduled jobs
+    run_after: float = 0  # Unix timestamp (millisecond resolution) for delayed/scheduled jobs
+    dedup_key: Optional[str] = None  # Unique among pending/processing jobs
+    cache_key: Optional[str] = None  # Opt-in result memoization key
+    env: Optional[Dict[str, str]] = None  # Extra environment variables for the command
+    queue: str = 'default'
+    retry_policy: Optional[dict] = None  # Overrides the queue/global retry policy
+    last_delay: Optional[float] = None  # Delay used before the latest retry
+    deps_remaining: int = 0  # Unfinished dependencies (state is 'blocked' while > 0)
+    dep_failure: Optional[str] = None  # cascade, ignore or block when a dependency dies
+    group_id: Optional[str] = None  # Fan-out group this job counts towards
+    exit_code: Optional[int] = None  # Exit code of the latest run (None if it did not run to completion)
+    requires: Optional[List[str]] = None  # Tags a worker must advertise to claim the job
+    tenant: str = 'default'  # Who the job belongs to, for fair claims across tenants
+    throttle_key: Optional[str] = None  # Rate limit / concurrency cap the job counts against
+    batch: Optional[str] = None  # Batch type whose jobs may run together as one process
+    batch_item: Optional[str] = None  # The job's item in a batch command (default: its ID)
+    payload_hash: Optional[str] = None  # SHA-256 of the job's payload (stored in the payloads table)
+    payload_via: Optional[str] = None  # How the payload reaches the command ('stdin' or 'file')
+    deduplicated: bool = False  # Set on the existing job enqueue returned instead of adding one (not stored)
 
     def to_dict(self) -> dict:
         """Convert job to dictionary"""
-        return asdict(self)
+        data = asdict(self)
+        if not self.deduplicated:
+            del data['deduplicated']
+        return data
 
     @staticmethod
     def from_dict(data: dict) -> 'Job':
@@ -34,23 +81,27 @@ class Job:
     def from_db_row(row: tuple) -> 'Job':
         """
         Create Job from SQLite row tuple
-        Expected order: id, command, state, attempts, max_retries, 
-                       created_at, updated_at, locked_by, locked_at, 
-                       last_error, run_after
+        Expected order: JOB_COLUMNS
         """
-        return Job(
-            id=row[0],
-            command=row[1],
-            state=row[2],
-            attempts=row[3],
-            max_retries=row[4],
-            created_at=row[5],
-            updated_at=row[6],
-            locked_by=row[7],
-            locked_at=row[8],
-            last_error=row[9],
-            run_after=row[10]
-        )
+        data = dict(zip(JOB_COLUMNS, row))
+        for column in JSON_COLUMNS:
+            if data[column] is not None:
+                data[column] = json.loads(data[column])
+        # Stored as the sorted tags joined by commas, '' for none
+        data['requires'] = data['requires'].split(',') if data['requires'] else None
+        return Job(**data)
+
+    def to_db_row(self) -> tuple:
+        """Convert job to SQLite row tuple in JOB_COLUMNS order"""
+        values = []
+        for column in JOB_COLUMNS:
+            value = getattr(self, column)
+            if column in JSON_COLUMNS and value is not None:
+                value = json.dumps(value, sort_keys=True)
+            elif column == 'requires':
+                value = ','.join(value or ())
+            values.append(value)
+        return tuple(values)
 
 
 def get_utc_now() -> str:
@@ -58,6 +109,6 @@ def get_utc_now() -> str:
     return datetime.utcnow().isoformat() + 'Z'
 
 
-def get_unix_timestamp() -> int:
-    """Get current Unix timestamp"""
-    return int(datetime.utcnow().timestamp())
+def get_unix_timestamp() -> float:
+    """Get current Unix timestamp with millisecond resolution"""
+    return round(time.time(), 3)
@@ -0,0 +1,115 @@
+"""
+Job payloads: compressed, content-addressed input stored outside the jobs table
+"""
+import hashlib
+import json
+import sqlite3
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+from queuectl.db import get_db
+
+
+# How a payload reaches the command
+#   stdin: piped to the command's standard input
+#   file:  written to a temporary file named by QUEUECTL_PAYLOAD_FILE
+PAYLOAD_VIAS = ('stdin', 'file')
+PAYLOAD_FILE_ENV_VAR = 'QUEUECTL_PAYLOAD_FILE'
+
+# Largest payload accepted (leaves room under the broker's line limit)
+MAX_PAYLOAD_BYTES = 8 * 1024 * 1024
+
+# Smaller payloads are stored as they are; compressing them rarely pays off
+COMPRESS_MIN_BYTES = 256
+COMPRESS_LEVEL = 6
+
+
+@dataclass
+class Payload:
+    """A payload's UTF-8 bytes and their SHA-256 (its key in the payloads table)"""
+    digest: str
+    data: bytes
+
+
+def encode_payload(value: Any) -> Optional[Payload]:
+    """
+    Turn an enqueued 'payload' into bytes: strings as they are, anything else as compact JSON
+
+    Raises:
+        ValueError: If the payload is not JSON-serializable or is too large
+    """
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        try:
+            value = json.dumps(value, sort_keys=True, separators=(',', ':'))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"'payload' must be a string or JSON value ({e})")
+    data = value.encode('utf-8')
+    if len(data) > MAX_PAYLOAD_BYTES:
+        raise ValueError(f"'payload' is {len(data)} bytes (at most {MAX_PAYLOAD_BYTES} allowed)")
+    return Payload(hashlib.sha256(data).hexdigest(), data)
+
+
+def store_payload(cursor: sqlite3.Cursor, payload: Payload):
+    """
+    Store a payload once per distinct content (inside the enqueue transaction)
+
+    Jobs only keep the hash, so the jobs table stays narrow whatever the
+    payload size, and identical payloads share one compressed row.
+    """
+    cursor.execute("SELECT 1 FROM payloads WHERE hash = ?", (payload.digest,))
+    if cursor.fetchone() is not None:
+        return
+
+    codec, stored = 'raw', payload.data
+    if len(payload.data) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(payload.data, COMPRESS_LEVEL)
+        if len(compressed) < len(payload.data):
+            codec, stored = 'zlib', compressed
+    cursor.execute("""
+        INSERT INTO payloads (hash, codec, size, data)
+        VALUES (?, ?, ?, ?)
+    """, (payload.digest, codec, len(payload.data), stored))
+
+
+def load_payload(cursor: sqlite3.Cursor, digest: str) -> Optional[str]:
+    """Get a stored payload as text, or None if it is missing"""
+    cursor.execute("SELECT codec, data FROM payloads WHERE hash = ?", (digest,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    codec, data = row
+    return (zlib.decompress(data) if codec == 'zlib' else bytes(data)).decode('utf-8')
+
+
+def collect_garbage() -> Tuple[int, int]:
+    """
+    Delete payloads no job refers to any more (e.g. after 'queuectl dlq purge')
+
+    Each payload is checked with one probe of idx_jobs_payload. Enqueue
+    stores a payload and its job in one transaction, so a payload is never
+    seen unreferenced while its job is being added.
+
+    Returns:
+        Tuple of (payloads deleted, stored bytes freed)
+    """
+    condition = "NOT EXISTS (SELECT 1 FROM jobs WHERE jobs.payload_hash = payloads.hash)"
+    with get_db('payloads') as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(f"SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM payloads WHERE {condition}")
+        count, freed = cursor.fetchone()
+        cursor.execute(f"DELETE FROM payloads WHERE {condition}")
+        return count, freed
+
+
+def get_payload_stats(cursor: sqlite3.Cursor) -> Dict[str, int]:
+    """Count stored payloads with their original and stored sizes"""
+    cursor.execute("""
+        SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0),
+               COALESCE(SUM(codec = 'zlib'), 0)
+        FROM payloads
+    """)
+    count, size, stored, compressed = cursor.fetchone()
+    return {"payloads": count, "size": size, "stored": stored, "compressed": compressed}
@@ -0,0 +1,150 @@
+"""
+Opt-in per-phase profiling of the worker loop (worker start --profile)
+"""
+import cProfile
+import io
+import os
+import pstats
+import time
+from typing import Dict, Optional
+from queuectl.db import get_db_path
+
+
+PROFILE_SUFFIX = ".profile"
+
+# Phases of worker_loop, in loop order (claim, execute and result_write are
+# also the phases of the queuectl_<phase>_seconds metrics)
+#   claim:        backend.claim (including empty claims)
+#   cache_lookup: result-cache check for jobs with a cache_key
+#   execute:      running the command
+#   result_write: recording the outcome (complete / fail)
+#   idle:         waiting for work
+#   error:        the pause after an error in the loop
+PROFILE_PHASES = ('claim', 'cache_lookup', 'execute', 'result_write', 'idle', 'error')
+
+# Functions listed in the summary of a cProfile window
+TOP_FUNCTIONS = 15
+
+
+def get_profile_dir() -> str:
+    """Get the directory profile summaries go to (QUEUECTL_PROFILE_DIR, default: database path + '.profile')"""
+    return os.environ.get("QUEUECTL_PROFILE_DIR") or get_db_path() + PROFILE_SUFFIX
+
+
+class PhaseStats:
+    """Running count, total and extremes of one phase's durations"""
+    __slots__ = ('count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+
+class WorkerProfiler:
+    """
+    High-resolution timings of each worker_loop phase
+
+    The loop calls record() with perf_counter deltas; nothing else runs
+    per job. Optionally a cProfile window covers the first cpu_seconds
+    of the worker, and its stats are saved as a .pstats file for
+    snakeviz/pstats.
+
+    Args:
+        worker_id: Worker the summary belongs to
+        cpu_seconds: Length of the cProfile window (0 disables it)
+        directory: Where summaries and .pstats files are written (default: get_profile_dir())
+    """
+
+    def __init__(self, worker_id: str, cpu_seconds: float = 0, directory: Optional[str] = None):
+        self.worker_id = worker_id
+        self.directory = directory or get_profile_dir()
+        self.phases: Dict[str, PhaseStats] = {phase: PhaseStats() for phase in PROFILE_PHASES}
+        self.started = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.cpu: Optional[cProfile.Profile] = None
+        self.cpu_until = 0.0
+        self.cpu_path = os.path.join(self.directory, f"worker-{os.getpid()}.pstats")
+        if cpu_seconds > 0:
+            self.cpu = cProfile.Profile()
+            self.cpu_until = self.started + cpu_seconds
+            self.cpu.enable()
+
+    def record(self, phase: str, seconds: float):
+        self.phases[phase].add(seconds)
+
+    def tick(self):
+        """Close the cProfile window once it has run its course (checked once per loop iteration)"""
+        if self.cpu is not None and time.perf_counter() >= self.cpu_until:
+            self._stop_cpu()
+
+    def _stop_cpu(self):
+        self.cpu.disable()
+        self.cpu.dump_stats(self.cpu_path)
+        self._cpu_stats = self._format_cpu(self.cpu)
+        self.cpu = None
+
+    @staticmethod
+    def _format_cpu(profile: cProfile.Profile) -> str:
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        return out.getvalue()
+
+    def summary(self) -> str:
+        """Per-phase table plus the top functions of the cProfile window"""
+        wall = time.perf_counter() - self.started
+        accounted = sum(stats.total for stats in self.phases.values())
+        lines = [
+            f"Profile of {self.worker_id} (PID {os.getpid()}) over {wall:.1f}s",
+            f"{'Phase':<14} {'Calls':>8} {'Total s':>10} {'% wall':>7} {'Mean ms':>9} {'Min ms':>9} {'Max ms':>9}",
+        ]
+        for phase, stats in self.phases.items():
+            if stats.count == 0:
+                lines.append(f"{phase:<14} {0:>8}")
+                continue
+            lines.append(
+                f"{phase:<14} {stats.count:>8} {stats.total:>10.3f} {100 * stats.total / wall:>6.1f}% "
+                f"{1000 * stats.total / stats.count:>9.3f} {1000 * stats.min:>9.3f} {1000 * stats.max:>9.3f}"
+            )
+        # Loop overhead (printing, flushes) plus the phase in progress, if any
+        lines.append(f"{'other':<14} {'':>8} {wall - accounted:>10.3f} {100 * (wall - accounted) / wall:>6.1f}%")
+
+        if self.cpu is not None:
+            # Window still open: report what it has so far without closing it
+            self.cpu.disable()
+            cpu_stats = self._format_cpu(self.cpu)
+            self.cpu.enable()
+            lines += ["", "cProfile window (in progress):", cpu_stats]
+        elif getattr(self, '_cpu_stats', None):
+            lines += ["", f"cProfile window (saved to {self.cpu_path}):", self._cpu_stats]
+        return "\n".join(lines)
+
+    def dump(self, reason: str) -> str:
+        """
+        Print the summary and write it to the profile directory
+
+        Returns:
+            Path of the summary file
+        """
+        text = self.summary()
+        path = os.path.join(self.directory, f"worker-{os.getpid()}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        print(f"[Worker {self.worker_id}] Profile ({reason}), written to {path}\n{text}")
+        return path
+
+    def close(self):
+        """Finish an open cProfile window and dump the final summary"""
+        if self.cpu is not None:
+            self._stop_cpu()
+        self.dump("shutdown")
@@ -2,95 +2,376 @@
 Queue operations: enqueue, list, status, DLQ retry
 """
 import json
-from typing import List, Optional, Dict
-from datetime import datetime
-from queuectl.db import get_db
-from queuectl.models import Job, get_utc_now, get_unix_timestamp
-from queuectl.config import get_config_int
+import re
+import sqlite3
+from typing import Callable, List, Optional, Dict, Tuple, TextIO
+from datetime import datetime, timedelta, timezone
+from queuectl.db import get_db, get_read_db
+from queuectl.models import (
+    Job, JOB_COLUMNS, JOB_SELECT_COLUMNS, ACTIVE_STATES, get_utc_now, get_unix_timestamp
+)
+from queuectl.config import get_config, get_config_int
+from queuectl.cache import compute_cache_key, get_cache_stats
+from queuectl.retry import parse_policy
+from queuectl.dag import DEP_FAILURE_POLICIES, check_dependencies, insert_edges, delete_edges
+from queuectl.groups import create_group_row, add_group_members, record_group_revival, record_group_removal
+from queuectl.workers import LIVE_WORKER_STATES, get_workers
+from queuectl.tags import parse_tags, register_requirements
+from queuectl.tenants import DEFAULT_TENANT
+from queuectl.payloads import PAYLOAD_VIAS, Payload, encode_payload, store_payload, load_payload
+from queuectl.limits import (
+    QueueFullError, reserve_slots, reserve_group_slots, add_unfinished, get_queue_limits
+)
 
 
-def enqueue_job(job_data: dict) -> Job:
+# What enqueue does when an unfinished job already holds the same dedup_key
+DEDUP_POLICIES = ('reject', 'return_existing', 'coalesce')
+
+
+class DuplicateJobError(ValueError):
+    """Raised when an enqueued job collides with an existing one"""
+
+    def __init__(self, message: str, existing: Optional[Job] = None):
+        super().__init__(message)
+        self.existing = existing
+
+
+def _find_active_duplicate(cursor: sqlite3.Cursor, dedup_key: str) -> Optional[Job]:
+    """Find the unfinished job holding a dedup key"""
+    placeholders = ', '.join('?' for _ in ACTIVE_STATES)
+    cursor.execute(f"""
+        SELECT {JOB_SELECT_COLUMNS}
+        FROM jobs
+        WHERE dedup_key = ? AND state IN ({placeholders})
+    """, (dedup_key, *ACTIVE_STATES))
+    row = cursor.fetchone()
+    return Job.from_db_row(row) if row else None
+
+
+def build_job(job_data: dict, default_max_retries: int, payload: Optional[Payload] = None) -> Job:
     """
-    Enqueue a new job
+    Validate the per-job fields shared by enqueue_job, create_group and
+    the in-process storage backends
     
     Args:
-        job_data: Dictionary with at least 'id' and 'command' fields
-                 Optional: 'max_retries', 'run_at' (ISO string)
+        job_data: Job fields as given to enqueue_job
+        default_max_retries: max_retries for jobs that do not set one
+        payload: The encoded 'payload' field (see queuectl.payloads.encode_payload)
     
-    Returns:
-        Created Job object
+    Raises:
+        ValueError: If the job is invalid
     """
     if 'id' not in job_data or 'command' not in job_data:
         raise ValueError("Job must contain 'id' and 'command' fields")
     
-    job_id = job_data['id']
     command = job_data['command']
-    max_retries = job_data.get('max_retries', get_config_int('max_retries', 3))
+    
+    env = job_data.get('env')
+    if env is not None:
+        if not isinstance(env, dict):
+            raise ValueError("'env' must be an object of variable names to values")
+        env = {str(key): str(value) for key, value in env.items()}
+    
+    payload_hash = payload.digest if payload is not None else None
+    payload_via = job_data.get('payload_via')
+    if payload_via is not None and (payload is None or payload_via not in PAYLOAD_VIAS):
+        raise ValueError(f"'payload_via' needs a 'payload' and must be one of: {', '.join(PAYLOAD_VIAS)}")
+    
+    cache_key = job_data.get('cache_key')
+    if cache_key is None and job_data.get('cache'):
+        cache_key = compute_cache_key(command, env, payload_hash)
+    
+    queue = job_data.get('queue') or 'default'
+    if not isinstance(queue, str):
+        raise ValueError("'queue' must be a string")
+    
+    retry_policy = job_data.get('retry_policy')
+    if retry_policy is not None:
+        retry_policy = parse_policy(retry_policy).to_dict()
+    
+    dep_failure = job_data.get('on_dep_failure')
+    if dep_failure is not None and dep_failure not in DEP_FAILURE_POLICIES:
+        raise ValueError(
+            f"Invalid on_dep_failure '{dep_failure}' (expected one of: {', '.join(DEP_FAILURE_POLICIES)})"
+        )
+    
+    requires = parse_tags(job_data.get('requires'))
+    
+    tenant = job_data.get('tenant') or DEFAULT_TENANT
+    if not isinstance(tenant, str):
+        raise ValueError("'tenant' must be a string")
+    
+    throttle_key = job_data.get('throttle_key')
+    if throttle_key is not None and not isinstance(throttle_key, str):
+        raise ValueError("'throttle_key' must be a string")
+    
+    batch = job_data.get('batch')
+    batch_item = job_data.get('batch_item')
+    if batch is not None and not isinstance(batch, str):
+        raise ValueError("'batch' must be a string")
+    if batch_item is not None and (batch is None or not isinstance(batch_item, str)):
+        raise ValueError("'batch_item' must be a string and needs 'batch'")
+    if batch is not None and payload is not None:
+        raise ValueError("'payload' cannot be combined with 'batch' (a batch command gets one input)")
     
     run_after = 0
     if 'run_at' in job_data:
         try:
             run_at_dt = datetime.fromisoformat(job_data['run_at'].replace('Z', '+00:00'))
-            run_after = int(run_at_dt.timestamp())
+            run_after = round(run_at_dt.timestamp(), 3)
         except (ValueError, AttributeError):
             run_after = 0
+    if batch is not None and not run_after:
+        # Batch linger times count from when a job became due
+        run_after = get_unix_timestamp()
     
     created_at = get_utc_now()
     
-    job = Job(
-        id=job_id,
+    return Job(
+        id=job_data['id'],
         command=command,
         state='pending',
         attempts=0,
-        max_retries=max_retries,
+        max_retries=job_data.get('max_retries', default_max_retries),
         created_at=created_at,
         updated_at=created_at,
-        run_after=run_after
+        run_after=run_after,
+        dedup_key=job_data.get('dedup_key'),
+        cache_key=cache_key,
+        env=env,
+        queue=queue,
+        retry_policy=retry_policy,
+        dep_failure=dep_failure,
+        group_id=job_data.get('group_id'),
+        requires=requires,
+        tenant=tenant,
+        throttle_key=throttle_key,
+        batch=batch,
+        batch_item=batch_item if batch_item is not None else (job_data['id'] if batch is not None else None),
+        payload_hash=payload_hash,
+        payload_via=payload_via
     )
+
+
+def enqueue_job(job_data: dict) -> Job:
+    """
+    Enqueue a new job
+    
+    Args:
+        job_data: Dictionary with at least 'id' and 'command' fields
+                 Optional: 'max_retries', 'run_at' (ISO string),
+                 'dedup_key', 'dedup_policy' (reject, return_existing, coalesce),
+                 'env' (dict), 'cache_key' or 'cache': true (hash of command + env),
+                 'queue', 'retry_policy' (dict or policy type name),
+                 'depends_on' (list of job IDs), 'on_dep_failure' (cascade, ignore, block),
+                 'group_id' (existing group the job counts towards),
+                 'requires' (tags a worker must advertise with --tags to claim it),
+                 'tenant' (who the job belongs to, for claim_strategy 'fair'),
+                 'throttle_key' (throttle the job counts against, besides its queue's),
+                 'batch' (batch type the job may run with) and 'batch_item',
+                 'payload' (string or JSON value stored out of row, passed to the
+                 command on stdin) and 'payload_via' (stdin or file)
+    
+    Returns:
+        Created Job object, or the existing job (with deduplicated set) when
+        the dedup_key matched an unfinished job
+    
+    Raises:
+        ValueError: If the job is invalid or its group does not exist
+        DuplicateJobError: If the ID already exists, or the dedup_key is taken
+                           and the policy is 'reject'
+        QueueFullError: If the job's queue has reached its max_pending limit
+    """
+    payload = encode_payload(job_data.get('payload'))
+    job = build_job(job_data, get_config_int('max_retries', 3), payload)
+    dedup_key = job.dedup_key
+    
+    dedup_policy = None
+    if dedup_key is not None:
+        dedup_policy = job_data.get('dedup_policy') or get_config('dedup_policy', 'reject')
+        if dedup_policy not in DEDUP_POLICIES:
+            raise ValueError(
+                f"Invalid dedup_policy '{dedup_policy}' (expected one of: {', '.join(DEDUP_POLICIES)})"
+            )
     
-    with get_db() as conn:
+    depends_on = job_data.get('depends_on') or []
+    if not isinstance(depends_on, list) or not all(isinstance(parent, str) for parent in depends_on):
+        raise ValueError("'depends_on' must be a list of job IDs")
+    depends_on = list(dict.fromkeys(depends_on))
+    
+    if depends_on and job.dep_failure is None:
+        dep_failure_policy = get_config('dep_failure_policy', 'cascade')
+    else:
+        dep_failure_policy = job.dep_failure
+    
+    with get_db('enqueue') as conn:
         cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO jobs (id, command, state, attempts, max_retries, 
-                            created_at, updated_at, locked_by, locked_at, 
-                            last_error, run_after)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            job.id, job.command, job.state, job.attempts, job.max_retries,
-            job.created_at, job.updated_at, job.locked_by, job.locked_at,
-            job.last_error, job.run_after
-        ))
+        
+        resolved = []
+        if depends_on:
+            # Take the write lock before reading parent states so none can finish unseen
+            cursor.execute("BEGIN IMMEDIATE")
+            completed, dead = check_dependencies(cursor, job.id, depends_on)
+            
+            resolved = completed + (dead if dep_failure_policy == 'ignore' else [])
+            job.deps_remaining = len(depends_on) - len(resolved)
+            
+            if dead and dep_failure_policy == 'cascade':
+                job.state = 'dead'
+                job.last_error = f"Dependency {dead[0]} failed"
+            elif job.deps_remaining > 0:
+                job.state = 'blocked'
+        
+        try:
+            cursor.execute(f"""
+                INSERT INTO jobs ({JOB_SELECT_COLUMNS})
+                VALUES ({', '.join('?' for _ in JOB_COLUMNS)})
+            """, job.to_db_row())
+        except sqlite3.IntegrityError:
+            existing = _find_active_duplicate(cursor, dedup_key) if dedup_key is not None else None
+            if existing is None:
+                raise DuplicateJobError(f"Job {job.id} already exists")
+            
+            if dedup_policy == 'reject':
+                raise DuplicateJobError(
+                    f"Job with dedup_key '{dedup_key}' already queued: {existing.id}", existing
+                )
+            
+            if dedup_policy == 'coalesce' and existing.state == 'pending':
+                cursor.execute("""
+                    UPDATE jobs
+                    SET run_after = ?,
+                        updated_at = ?
+                    WHERE id = ? AND state = 'pending'
+                """, (job.run_after, job.created_at, existing.id))
+                existing.run_after = job.run_after
+                existing.updated_at = job.created_at
+            
+            existing.deduplicated = True
+            return existing
+        
+        if job.state != 'dead' and not reserve_slots(cursor, job.queue):
+            raise QueueFullError(f"Queue '{job.queue}' is full (max_pending reached)", job.queue)
+        
+        if depends_on:
+            insert_edges(cursor, job.id, depends_on, resolved)
+        
+        register_requirements(cursor, [job.requires])
+        
+        if payload is not None:
+            store_payload(cursor, payload)
+        
+        if job.group_id is not None:
+            add_group_members(cursor, job.group_id, [job.state])
     
     return job
 
 
-def list_jobs(state: Optional[str] = None) -> List[Job]:
+def create_group(group_data: dict) -> Tuple[str, int]:
+    """
+    Create a job group and enqueue all of its members in one transaction
+    
+    Args:
+        group_data: Dictionary with 'id' and 'jobs' (list of job objects as
+                   accepted by enqueue_job, without 'depends_on' or 'dedup_key')
+                   Optional: 'callback' (job object enqueued once every
+                   member has completed or died)
+    
+    Returns:
+        Tuple of (group ID, number of member jobs)
+    
+    Raises:
+        ValueError: If the group or one of its jobs is invalid, or the group exists
+        DuplicateJobError: If a member or callback job ID already exists
+        QueueFullError: If the members do not fit under their queue's max_pending limit
+    """
+    group_id = group_data.get('id')
+    if not isinstance(group_id, str) or not group_id:
+        raise ValueError("Group must contain an 'id' field")
+    
+    members = group_data.get('jobs')
+    if not isinstance(members, list) or not members:
+        raise ValueError("Group must contain a non-empty 'jobs' list")
+    
+    default_max_retries = get_config_int('max_retries', 3)
+    jobs = []
+    payloads = []
+    for member in members:
+        if not isinstance(member, dict):
+            raise ValueError("Group jobs must be objects")
+        if member.get('depends_on') or member.get('dedup_key') is not None:
+            raise ValueError("Group jobs cannot use 'depends_on' or 'dedup_key'")
+        payload = encode_payload(member.get('payload'))
+        job = build_job(member, default_max_retries, payload)
+        job.group_id = group_id
+        jobs.append(job)
+        if payload is not None:
+            payloads.append(payload)
+    
+    callback = group_data.get('callback')
+    if callback is not None:
+        if not isinstance(callback, dict):
+            raise ValueError("Group callback must be a job object")
+        if callback.get('depends_on') or any(callback.get(field) is not None
+                                             for field in ('dedup_key', 'payload', 'group_id')):
+            raise ValueError("Group callbacks cannot use 'depends_on', 'dedup_key', 'payload' or 'group_id'")
+        callback = build_job({**callback, 'id': callback.get('id') or f"{group_id}-callback"},
+                             default_max_retries)
+        if any(job.id == callback.id for job in jobs):
+            raise DuplicateJobError(f"Group {group_id} has a callback with a member's job ID ({callback.id})")
+    
+    with get_db('enqueue') as conn:
+        cursor = conn.cursor()
+        create_group_row(cursor, group_id, callback)
+        if callback is not None:
+            cursor.execute("SELECT 1 FROM jobs WHERE id = ?", (callback.id,))
+            if cursor.fetchone():
+                raise DuplicateJobError(f"Group {group_id} has a callback whose job ID already exists ({callback.id})")
+        
+        try:
+            cursor.executemany(f"""
+                INSERT INTO jobs ({JOB_SELECT_COLUMNS})
+                VALUES ({', '.join('?' for _ in JOB_COLUMNS)})
+            """, [job.to_db_row() for job in jobs])
+        except sqlite3.IntegrityError as e:
+            raise DuplicateJobError(f"Group {group_id} has a job whose ID already exists ({e})")
+        
+        full_queue = reserve_group_slots(cursor, [job.queue for job in jobs])
+        if full_queue is not None:
+            raise QueueFullError(f"Queue '{full_queue}' has no room for group {group_id}", full_queue)
+        
+        add_group_members(cursor, group_id, [job.state for job in jobs])
+        register_requirements(cursor, [job.requires for job in jobs])
+        for payload in payloads:
+            store_payload(cursor, payload)
+    
+    return group_id, len(jobs)
+
+
+def list_jobs(state: Optional[str] = None, replica: bool = False) -> List[Job]:
     """
     List jobs, optionally filtered by state
     
     Args:
-        state: Optional state filter (pending, processing, completed, failed, dead)
+        state: Optional state filter (blocked, pending, processing, completed, failed, dead)
+        replica: Read from the replica file instead of the live database
     
     Returns:
         List of Job objects
     """
-    with get_db() as conn:
+    with get_read_db(replica) as conn:
         cursor = conn.cursor()
         
         if state:
-            cursor.execute("""
-                SELECT id, command, state, attempts, max_retries, 
-                       created_at, updated_at, locked_by, locked_at, 
-                       last_error, run_after
+            cursor.execute(f"""
+                SELECT {JOB_SELECT_COLUMNS}
                 FROM jobs
                 WHERE state = ?
                 ORDER BY created_at DESC
             """, (state,))
         else:
-            cursor.execute("""
-                SELECT id, command, state, attempts, max_retries, 
-                       created_at, updated_at, locked_by, locked_at, 
-                       last_error, run_after
+            cursor.execute(f"""
+                SELECT {JOB_SELECT_COLUMNS}
                 FROM jobs
                 ORDER BY created_at DESC
             """)
@@ -101,12 +382,10 @@ def list_jobs(state: Optional[str] = None) -> List[Job]:
 
 def get_job(job_id: str) -> Optional[Job]:
     """Get a single job by ID"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, command, state, attempts, max_retries, 
-                   created_at, updated_at, locked_by, locked_at, 
-                   last_error, run_after
+        cursor.execute(f"""
+            SELECT {JOB_SELECT_COLUMNS}
             FROM jobs
             WHERE id = ?
         """, (job_id,))
@@ -115,14 +394,50 @@ def get_job(job_id: str) -> Optional[Job]:
         return Job.from_db_row(row) if row else None
 
 
-def get_status() -> Dict:
+def get_payload(payload_hash: str) -> Optional[str]:
+    """Get a job payload by its hash (None if it is missing)"""
+    with get_read_db() as conn:
+        return load_payload(conn.cursor(), payload_hash)
+
+
+# IDs per query in get_jobs (below SQLite's bound-parameter limit)
+GET_JOBS_CHUNK_SIZE = 500
+
+
+def get_jobs(job_ids: List[str]) -> Dict[str, Job]:
+    """
+    Get several jobs by ID from one read snapshot
+    
+    Returns:
+        Dictionary of job ID -> Job for the IDs that exist
+    """
+    jobs = {}
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        for start in range(0, len(job_ids), GET_JOBS_CHUNK_SIZE):
+            chunk = job_ids[start:start + GET_JOBS_CHUNK_SIZE]
+            cursor.execute(f"""
+                SELECT {JOB_SELECT_COLUMNS}
+                FROM jobs
+                WHERE id IN ({', '.join('?' for _ in chunk)})
+            """, chunk)
+            for row in cursor.fetchall():
+                job = Job.from_db_row(row)
+                jobs[job.id] = job
+    return jobs
+
+
+def get_status(replica: bool = False) -> Dict:
     """
     Get queue status with job counts per state and active workers
     
+    Args:
+        replica: Read from the replica file instead of the live database
+    
     Returns:
         Dictionary with status information
     """
-    with get_db() as conn:
+    with get_read_db(replica) as conn:
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -135,20 +450,61 @@ def get_status() -> Dict:
         for row in cursor.fetchall():
             state_counts[row[0]] = row[1]
         
-        cursor.execute("SELECT value FROM config WHERE key = 'worker_pids'")
-        row = cursor.fetchone()
-        worker_pids = row[0] if row and row[0] else ""
+        workers = get_workers(cursor)
         
         return {
             "state_counts": state_counts,
-            "worker_pids": [pid.strip() for pid in worker_pids.split(',') if pid.strip()],
-            "total_jobs": sum(state_counts.values())
+            "workers": workers,
+            "worker_pids": [str(worker['pid']) for worker in workers
+                            if worker['status'] in LIVE_WORKER_STATES],
+            "total_jobs": sum(state_counts.values()),
+            "cache": get_cache_stats(cursor),
+            "queue_limits": get_queue_limits(cursor)
         }
 
 
-def list_dlq() -> List[Job]:
+def release_job(job_id: str, locked_by: str) -> bool:
+    """
+    Put a claimed job back to pending without counting an attempt
+    
+    Only applies while the job is still processing under the same worker,
+    so a release can never undo another worker's claim.
+    
+    Returns:
+        True if the job was released
+    """
+    with get_db('release') as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE jobs
+            SET state = 'pending',
+                locked_by = NULL,
+                locked_at = NULL,
+                updated_at = ?
+            WHERE id = ? AND state = 'processing' AND locked_by = ?
+        """, (get_utc_now(), job_id, locked_by))
+        return cursor.rowcount > 0
+
+
+def list_dlq(replica: bool = False) -> List[Job]:
     """List jobs in the dead letter queue (state='dead')"""
-    return list_jobs(state='dead')
+    return list_jobs(state='dead', replica=replica)
+
+
+# Columns reset when a dead job goes back to pending (or blocked, if a
+# dependency it was cascaded from is still unfinished)
+DLQ_RETRY_SET = """
+    SET state = CASE WHEN deps_remaining > 0 THEN 'blocked' ELSE 'pending' END,
+        attempts = 0,
+        updated_at = ?,
+        locked_by = NULL,
+        locked_at = NULL,
+        run_after = 0,
+        last_delay = NULL
+"""
+
+# Rows touched per transaction by bulk DLQ operations
+DLQ_CHUNK_SIZE = 500
 
 
 def retry_dlq_job(job_id: str) -> Job:
@@ -163,36 +519,257 @@ def retry_dlq_job(job_id: str) -> Job:
     
     Raises:
         ValueError: If job not found or not in dead state
+        DuplicateJobError: If an unfinished job already holds its dedup_key
     """
-    with get_db() as conn:
+    with get_db('dlq') as conn:
         cursor = conn.cursor()
         
-        cursor.execute("SELECT state FROM jobs WHERE id = ?", (job_id,))
-        row = cursor.fetchone()
-        
-        if not row:
-            raise ValueError(f"Job {job_id} not found")
+        try:
+            cursor.execute(f"""
+                UPDATE jobs
+                {DLQ_RETRY_SET}
+                WHERE id = ? AND state = 'dead'
+            """, (get_utc_now(), job_id))
+        except sqlite3.IntegrityError:
+            raise DuplicateJobError(
+                f"Job {job_id} cannot be retried: another job with its dedup_key is already queued"
+            )
         
-        if row[0] != 'dead':
+        if cursor.rowcount == 0:
+            cursor.execute("SELECT state FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            if not row:
+                raise ValueError(f"Job {job_id} not found")
             raise ValueError(f"Job {job_id} is not in dead state (current: {row[0]})")
         
-        updated_at = get_utc_now()
-        cursor.execute("""
-            UPDATE jobs
-            SET state = 'pending',
-                attempts = 0,
-                updated_at = ?,
-                locked_by = NULL,
-                locked_at = NULL,
-                run_after = 0
+        cursor.execute(f"""
+            SELECT {JOB_SELECT_COLUMNS}
+            FROM jobs
             WHERE id = ?
-        """, (updated_at, job_id))
+        """, (job_id,))
+        job = Job.from_db_row(cursor.fetchone())
+        
+        if job.group_id is not None:
+            record_group_revival(cursor, job.group_id)
+        add_unfinished(cursor, job.queue)
+        
+        return job
+
+
+def parse_since(value: str) -> str:
+    """
+    Convert a --since value into an updated_at lower bound
     
-    job = get_job(job_id)
-    if not job:
-        raise ValueError(f"Failed to retrieve job {job_id} after retry")
+    Args:
+        value: ISO timestamp, or a relative age like '30m', '2h', '1d'
     
-    return job
+    Returns:
+        UTC timestamp in the same format as get_utc_now()
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smhd])\s*', value)
+    if match:
+        seconds = float(match.group(1)) * {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+        since_dt = datetime.now(timezone.utc) - timedelta(seconds=seconds)
+    else:
+        try:
+            since_dt = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError(f"Invalid --since value '{value}' (expected ISO timestamp or age like 30m, 2h, 1d)")
+        if since_dt.tzinfo is None:
+            since_dt = since_dt.replace(tzinfo=timezone.utc)
+    
+    return since_dt.astimezone(timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
+
+
+def _dlq_filter(error_match: Optional[str] = None, since: Optional[str] = None,
+                command_prefix: Optional[str] = None) -> Tuple[str, list]:
+    """Build the WHERE clause selecting dead jobs by filter"""
+    clauses = ["state = 'dead'"]
+    params = []
+    
+    if error_match:
+        clauses.append("instr(last_error, ?) > 0")
+        params.append(error_match)
+    if since:
+        clauses.append("updated_at >= ?")
+        params.append(parse_since(since))
+    if command_prefix:
+        clauses.append("substr(command, 1, ?) = ?")
+        params.extend([len(command_prefix), command_prefix])
+    
+    return " AND ".join(clauses), params
+
+
+def count_dlq_jobs(**filters) -> int:
+    """Count dead jobs matching the filters (dry run for bulk operations)"""
+    where, params = _dlq_filter(**filters)
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM jobs WHERE {where}", params)
+        return cursor.fetchone()[0]
+
+
+def _for_each_dlq_chunk(statement: str, statement_params: list, chunk_size: int,
+                        after_chunk: Optional[Callable[[sqlite3.Cursor, List[int]], None]] = None,
+                        before_chunk: Optional[Callable[[sqlite3.Cursor, List[int]], None]] = None,
+                        **filters) -> Tuple[int, int]:
+    """
+    Apply a set-based statement to matching dead jobs, one chunk per transaction
+    
+    Walks the matches in rowid order, so rows the statement leaves in
+    place (e.g. UPDATE OR IGNORE conflicts) are not revisited. before_chunk
+    and after_chunk run in the same transaction with the chunk's rowids,
+    which holds the write lock from the first read, so the jobs they see
+    are the ones the statement changes.
+    
+    Returns:
+        Tuple of (rows matched, rows changed)
+    """
+    where, params = _dlq_filter(**filters)
+    matched = changed = 0
+    last_rowid = 0
+    
+    while True:
+        with get_db('dlq') as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(f"""
+                SELECT rowid FROM jobs
+                WHERE {where} AND rowid > ?
+                ORDER BY rowid
+                LIMIT ?
+            """, (*params, last_rowid, chunk_size))
+            rowids = [row[0] for row in cursor.fetchall()]
+            
+            if not rowids:
+                break
+            
+            if before_chunk is not None:
+                before_chunk(cursor, rowids)
+            
+            placeholders = ', '.join('?' for _ in rowids)
+            cursor.execute(f"{statement} WHERE rowid IN ({placeholders}) AND state = 'dead'",
+                           (*statement_params, *rowids))
+            
+            matched += len(rowids)
+            changed += cursor.rowcount
+            last_rowid = rowids[-1]
+            
+            if after_chunk is not None:
+                after_chunk(cursor, rowids)
+        
+        if len(rowids) < chunk_size:
+            break
+    
+    return matched, changed
+
+
+def retry_dlq_jobs(chunk_size: int = DLQ_CHUNK_SIZE, **filters) -> Tuple[int, int]:
+    """
+    Move all dead jobs matching the filters back to pending
+    
+    Args:
+        chunk_size: Rows per transaction
+        **filters: error_match, since, command_prefix (none = whole DLQ)
+    
+    Returns:
+        Tuple of (retried, skipped); jobs are skipped when an unfinished job
+        already holds their dedup_key
+    """
+    matched, retried = _for_each_dlq_chunk(
+        f"UPDATE OR IGNORE jobs {DLQ_RETRY_SET}", [get_utc_now()], chunk_size,
+        after_chunk=_revive_counters, **filters
+    )
+    return retried, matched - retried
+
+
+def _revive_counters(cursor: sqlite3.Cursor, rowids: List[int]):
+    """Move group and queue counters of jobs a bulk retry brought back from dead to pending"""
+    placeholders = ', '.join('?' for _ in rowids)
+    cursor.execute(f"""
+        SELECT group_id, COUNT(*) FROM jobs
+        WHERE rowid IN ({placeholders})
+          AND state IN ('pending', 'blocked') AND group_id IS NOT NULL
+        GROUP BY group_id
+    """, rowids)
+    for group_id, count in cursor.fetchall():
+        record_group_revival(cursor, group_id, count)
+    
+    cursor.execute(f"""
+        SELECT queue, COUNT(*) FROM jobs
+        WHERE rowid IN ({placeholders}) AND state IN ('pending', 'blocked')
+        GROUP BY queue
+    """, rowids)
+    for queue, count in cursor.fetchall():
+        add_unfinished(cursor, queue, count)
+
+
+def purge_dlq_jobs(chunk_size: int = DLQ_CHUNK_SIZE, **filters) -> int:
+    """
+    Delete all dead jobs matching the filters
+    
+    Args:
+        chunk_size: Rows per transaction
+        **filters: error_match, since, command_prefix (none = whole DLQ)
+    
+    Returns:
+        Number of deleted jobs
+    """
+    _, deleted = _for_each_dlq_chunk("DELETE FROM jobs", [], chunk_size,
+                                     before_chunk=_forget_purged, **filters)
+    return deleted
+
+
+def _forget_purged(cursor: sqlite3.Cursor, rowids: List[int]):
+    """Take dead jobs a bulk purge is about to delete out of their groups and dependency edges"""
+    placeholders = ', '.join('?' for _ in rowids)
+    cursor.execute(f"""
+        SELECT id, group_id FROM jobs
+        WHERE rowid IN ({placeholders}) AND state = 'dead'
+    """, rowids)
+    rows = cursor.fetchall()
+    
+    groups: Dict[str, int] = {}
+    for _, group_id in rows:
+        if group_id is not None:
+            groups[group_id] = groups.get(group_id, 0) + 1
+    for group_id, count in groups.items():
+        record_group_removal(cursor, group_id, count)
+    
+    delete_edges(cursor, [job_id for job_id, _ in rows])
+
+
+def export_dlq_jobs(out: TextIO, **filters) -> int:
+    """
+    Stream dead jobs matching the filters as NDJSON
+    
+    Rows are read from one snapshot and written as they are fetched, so
+    memory use does not grow with the size of the DLQ.
+    
+    Args:
+        out: Text stream to write to
+        **filters: error_match, since, command_prefix (none = whole DLQ)
+    
+    Returns:
+        Number of exported jobs
+    """
+    where, params = _dlq_filter(**filters)
+    count = 0
+    
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT {JOB_SELECT_COLUMNS}
+            FROM jobs
+            WHERE {where}
+            ORDER BY rowid
+        """, params)
+        
+        for row in cursor:
+            out.write(json.dumps(Job.from_db_row(row).to_dict()) + "\n")
+            count += 1
+    
+    return count
 
 
 def update_job_state(job_id: str, state: str, **kwargs):
@@ -206,7 +783,7 @@ def update_job_state(job_id: str, state: str, **kwargs):
     """
     updated_at = get_utc_now()
     
-    with get_db() as conn:
+    with get_db('update') as conn:
         cursor = conn.cursor()
         
         fields = ["state = ?", "updated_at = ?"]
@@ -0,0 +1,107 @@
+"""
+Worker recycling: replace workers after a job count, memory size or age
+"""
+import os
+import random
+import re
+import sys
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+
+# Exit code of a worker process that stopped to be replaced ('worker start' respawns it)
+RECYCLE_EXIT_CODE = 86
+
+# Workers recycle by age somewhere in the last tenth of max_age, so a pool
+# started together does not restart all at once
+AGE_JITTER = 0.1
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def get_rss_bytes() -> int:
+    """
+    Resident set size of this process
+
+    Reads /proc/self/statm where it exists (Linux); elsewhere falls back to
+    the peak RSS from getrusage, which never shrinks (0 where neither exists).
+    """
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        if resource is None:
+            return 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def parse_duration(value: str) -> float:
+    """
+    Parse a duration: plain seconds or an age like '90s', '30m', '6h', '1d'
+
+    Raises:
+        ValueError: If the value is not a positive duration
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*', value)
+    if not match or float(match.group(1)) <= 0:
+        raise ValueError(f"Invalid duration '{value}' (expected seconds or an age like 30m, 6h, 1d)")
+    return float(match.group(1)) * {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+
+
+@dataclass
+class RecycleLimits:
+    """
+    When a worker should finish its current job and exit to be replaced
+
+    Args:
+        max_jobs: Jobs to process before recycling
+        max_rss_mb: Resident memory (MiB) above which the worker recycles
+        max_age: Seconds a worker may run (jittered by AGE_JITTER)
+    """
+    max_jobs: Optional[int] = None
+    max_rss_mb: Optional[float] = None
+    max_age: Optional[float] = None
+
+    def __bool__(self) -> bool:
+        return any(limit is not None for limit in (self.max_jobs, self.max_rss_mb, self.max_age))
+
+    def start(self) -> 'RecycleCheck':
+        """Begin tracking the limits for a worker starting now"""
+        return RecycleCheck(self)
+
+
+class RecycleCheck:
+    """A running worker's progress towards its RecycleLimits"""
+
+    def __init__(self, limits: RecycleLimits):
+        self.limits = limits
+        self.deadline = None
+        if limits.max_age is not None:
+            self.deadline = time.monotonic() + limits.max_age * (1 - random.uniform(0, AGE_JITTER))
+        self.max_rss = None if limits.max_rss_mb is None else limits.max_rss_mb * 1024 * 1024
+
+    def reason(self, jobs_processed: int) -> Optional[str]:
+        """
+        Check the limits between jobs
+
+        Returns:
+            'jobs', 'rss' or 'age' for the limit that was reached, or None
+        """
+        if self.limits.max_jobs is not None and jobs_processed >= self.limits.max_jobs:
+            return 'jobs'
+        if self.max_rss is not None and get_rss_bytes() > self.max_rss:
+            return 'rss'
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return 'age'
+        return None
@@ -0,0 +1,296 @@
+"""
+Retry policies: backoff delay and exit-code classification
+"""
+import json
+import math
+import random
+import sqlite3
+from collections import Counter
+from typing import Dict, Optional, Tuple, Union
+
+
+# Outcomes of RetryPolicy.classify()
+RETRY = 'retry'          # retry and count the attempt
+RETRY_FREE = 'free'      # retry without counting an attempt
+DEAD = 'dead'            # move straight to the DLQ
+
+# Cap on growing delays when neither the policy nor config 'retry_max_delay' sets one
+DEFAULT_MAX_DELAY = 3600.0
+
+
+def _number(name: str, value) -> float:
+    """Coerce a policy parameter to a finite float (ValueError otherwise)"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Retry policy {name} must be a number, got {value!r}")
+    if not math.isfinite(number):
+        raise ValueError(f"Retry policy {name} must be finite")
+    return number
+
+
+class RetryPolicy:
+    """
+    Base retry policy
+
+    Args:
+        max_delay: Upper bound on any delay in seconds (None: config
+                   'retry_max_delay' once resolved, else default_max_delay)
+        jitter: Fraction (0-1) of each delay that is randomized away
+        dead_exit_codes: Exit codes that skip retries and go to the DLQ
+        free_exit_codes: Exit codes that retry without counting an attempt
+    """
+    name = ''
+    # Cap applied when max_delay is None (None only for delays that cannot grow)
+    default_max_delay: Optional[float] = DEFAULT_MAX_DELAY
+
+    def __init__(self, max_delay: Optional[float] = None, jitter: float = 0.0,
+                 dead_exit_codes=(), free_exit_codes=()):
+        jitter = _number('jitter', jitter)
+        if jitter < 0 or jitter > 1:
+            raise ValueError("Retry policy jitter must be between 0 and 1")
+        if max_delay is not None:
+            max_delay = _number('max_delay', max_delay)
+            if max_delay < 0:
+                raise ValueError("Retry policy max_delay must not be negative")
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.dead_exit_codes = [int(code) for code in dead_exit_codes]
+        self.free_exit_codes = [int(code) for code in free_exit_codes]
+
+    def base_delay(self, attempt: int, previous_delay: Optional[float]) -> float:
+        """Delay before applying cap and jitter"""
+        raise NotImplementedError
+
+    def delay(self, attempt: int, previous_delay: Optional[float] = None) -> float:
+        """
+        Get the delay before the next try
+
+        Args:
+            attempt: Number of counted attempts so far (1 after the first failure)
+            previous_delay: Delay used before the previous retry, if any
+
+        Returns:
+            Delay in seconds
+        """
+        delay = self.base_delay(attempt, previous_delay)
+        cap = self.max_delay if self.max_delay is not None else self.default_max_delay
+        if cap is not None:
+            delay = min(delay, cap)
+        if self.jitter:
+            delay *= random.uniform(1 - self.jitter, 1)
+        return max(0.0, delay)
+
+    def classify(self, exit_code: Optional[int]) -> str:
+        """Classify a failure by exit code: RETRY, RETRY_FREE or DEAD"""
+        if exit_code in self.dead_exit_codes:
+            return DEAD
+        if exit_code in self.free_exit_codes:
+            return RETRY_FREE
+        return RETRY
+
+    def params(self) -> dict:
+        """Policy-specific parameters"""
+        return {}
+
+    def to_dict(self) -> dict:
+        """Convert policy to its JSON specification"""
+        spec = {"type": self.name, **self.params()}
+        if self.max_delay is not None:
+            spec["max_delay"] = self.max_delay
+        if self.jitter:
+            spec["jitter"] = self.jitter
+        if self.dead_exit_codes:
+            spec["dead_exit_codes"] = self.dead_exit_codes
+        if self.free_exit_codes:
+            spec["free_exit_codes"] = self.free_exit_codes
+        return spec
+
+
+class ExponentialBackoff(RetryPolicy):
+    """delay = base ** attempt"""
+    name = 'exponential'
+
+    def __init__(self, base: float = 2.0, **kwargs):
+        super().__init__(**kwargs)
+        self.base = _number('base', base)
+
+    def base_delay(self, attempt: int, previous_delay: Optional[float]) -> float:
+        try:
+            return self.base ** attempt
+        except OverflowError:
+            return float('inf')
+
+    def params(self) -> dict:
+        return {"base": self.base}
+
+
+class DecorrelatedJitter(RetryPolicy):
+    """delay = random between base and 3x the previous delay (capped)"""
+    name = 'decorrelated_jitter'
+
+    def __init__(self, base: float = 1.0, **kwargs):
+        kwargs.setdefault('max_delay', 300.0)
+        super().__init__(**kwargs)
+        self.base = _number('base', base)
+
+    def base_delay(self, attempt: int, previous_delay: Optional[float]) -> float:
+        previous = previous_delay if previous_delay else self.base
+        return random.uniform(self.base, max(self.base, previous * 3))
+
+    def params(self) -> dict:
+        return {"base": self.base}
+
+
+class LinearBackoff(RetryPolicy):
+    """delay = step * attempt"""
+    name = 'linear'
+
+    def __init__(self, step: float = 5.0, **kwargs):
+        super().__init__(**kwargs)
+        self.step = _number('step', step)
+
+    def base_delay(self, attempt: int, previous_delay: Optional[float]) -> float:
+        return self.step * attempt
+
+    def params(self) -> dict:
+        return {"step": self.step}
+
+
+class FixedDelay(RetryPolicy):
+    """delay = constant"""
+    name = 'fixed'
+    default_max_delay = None
+
+    def __init__(self, delay: float = 10.0, **kwargs):
+        super().__init__(**kwargs)
+        self.fixed_delay = _number('delay', delay)
+
+    def base_delay(self, attempt: int, previous_delay: Optional[float]) -> float:
+        return self.fixed_delay
+
+    def params(self) -> dict:
+        return {"delay": self.fixed_delay}
+
+
+POLICY_TYPES = {
+    policy.name: policy
+    for policy in (ExponentialBackoff, DecorrelatedJitter, LinearBackoff, FixedDelay)
+}
+
+
+def parse_policy(spec: Union[str, dict]) -> RetryPolicy:
+    """
+    Build a retry policy from its specification
+
+    Args:
+        spec: Dict like {"type": "exponential", "base": 2, "max_delay": 300},
+              its JSON text, or a bare type name
+
+    Raises:
+        ValueError: If the specification is invalid
+    """
+    if isinstance(spec, str):
+        text = spec.strip()
+        if text.startswith('{'):
+            try:
+                spec = json.loads(text)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid retry policy JSON: {e}")
+        else:
+            spec = {"type": text}
+
+    if not isinstance(spec, dict):
+        raise ValueError("Retry policy must be an object or a policy type name")
+
+    params = dict(spec)
+    policy_type = params.pop('type', 'exponential')
+    if policy_type not in POLICY_TYPES:
+        raise ValueError(f"Unknown retry policy type '{policy_type}' (expected one of: {', '.join(POLICY_TYPES)})")
+
+    try:
+        return POLICY_TYPES[policy_type](**params)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid parameters for retry policy '{policy_type}': {e}")
+
+
+def resolve_policy(cursor: sqlite3.Cursor, job_policy: Optional[str], queue: str,
+                   backoff_base: float) -> RetryPolicy:
+    """
+    Pick the retry policy for a job
+
+    Order: the job's own policy, config 'retry_policy.<queue>', config
+    'retry_policy', then exponential backoff with backoff_base. Growing
+    delays without their own max_delay are capped at config
+    'retry_max_delay'.
+    """
+    policy = parse_policy(job_policy) if job_policy else None
+    for key in (f"retry_policy.{queue}", "retry_policy"):
+        if policy is not None:
+            break
+        cursor.execute("SELECT value FROM config WHERE key = ?", (key,))
+        row = cursor.fetchone()
+        if row and row[0]:
+            policy = parse_policy(row[0])
+    if policy is None:
+        policy = ExponentialBackoff(base=backoff_base)
+
+    if policy.max_delay is None and policy.default_max_delay is not None:
+        cursor.execute("SELECT value FROM config WHERE key = 'retry_max_delay'")
+        row = cursor.fetchone()
+        try:
+            policy.max_delay = _number('max_delay', row[0]) if row and row[0] else None
+        except ValueError:
+            pass  # A bad config value falls back to default_max_delay
+    return policy
+
+
+def plan_retry(policy: RetryPolicy, attempts: int, max_retries: int,
+               last_delay: Optional[float], exit_code: Optional[int]) -> Tuple[Optional[float], int]:
+    """
+    Decide what happens to a failed job
+
+    Args:
+        policy: Retry policy of the job
+        attempts: Counted attempts before this failure
+        max_retries: Maximum counted attempts
+        last_delay: Delay used before the previous retry, if any
+        exit_code: Command exit code, if it ran to completion
+
+    Returns:
+        Tuple of (delay before the retry, or None if the job is dead,
+        counted attempts after this failure)
+    """
+    outcome = policy.classify(exit_code)
+    new_attempts = attempts if outcome == RETRY_FREE else attempts + 1
+
+    if outcome == DEAD or new_attempts >= max_retries:
+        return None, new_attempts
+    return policy.delay(max(new_attempts, 1), last_delay), new_attempts
+
+
+def simulate_retry_load(policy: RetryPolicy, jobs: int, attempts: int,
+                        bucket_seconds: float = 1.0) -> Dict[float, int]:
+    """
+    Simulate retries of jobs that all fail at t=0 and keep failing
+
+    Args:
+        policy: Retry policy to simulate
+        jobs: Number of jobs failing at once
+        attempts: Number of retries per job
+        bucket_seconds: Histogram bucket width
+
+    Returns:
+        Mapping of bucket start time (seconds) to number of retries due in it
+    """
+    buckets = Counter()
+
+    for _ in range(jobs):
+        now = 0.0
+        previous_delay = None
+        for attempt in range(1, attempts + 1):
+            previous_delay = policy.delay(attempt, previous_delay)
+            now += previous_delay
+            buckets[int(now // bucket_seconds) * bucket_seconds] += 1
+
+    return dict(sorted(buckets.items()))
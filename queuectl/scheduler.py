@@ -0,0 +1,346 @@
+"""
+Recurring job schedules: cron expressions and fixed intervals
+"""
+import heapq
+import sqlite3
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from queuectl.db import get_db, get_read_db, increment_counter, ChangeWatcher
+from queuectl.models import Job, JOB_COLUMNS, JOB_SELECT_COLUMNS, get_utc_now
+from queuectl.config import get_config_int
+from queuectl.cron import CronExpression
+from queuectl.limits import add_unfinished
+
+
+# What to do with fire times missed while no scheduler was running
+#   all:    enqueue every missed fire (up to MAX_CATCHUP_FIRES)
+#   latest: enqueue only the most recent missed fire
+#   skip:   enqueue only fires that are less than schedule_misfire_grace seconds late
+CATCHUP_POLICIES = ('all', 'latest', 'skip')
+MAX_CATCHUP_FIRES = 1000
+
+# How often the scheduler re-reads the schedules table even if it saw no change
+RELOAD_INTERVAL = 30.0
+
+# Counter bumped whenever a schedule is added or removed, so schedulers reload
+VERSION_COUNTER = 'schedules_version'
+
+SCHEDULE_COLUMNS = (
+    "id", "command", "cron", "interval_seconds", "max_retries",
+    "catchup", "next_run", "last_run", "enabled", "created_at",
+)
+SCHEDULE_SELECT_COLUMNS = ", ".join(SCHEDULE_COLUMNS)
+
+
+@dataclass
+class Schedule:
+    """Represents a recurring job definition"""
+    id: str
+    command: str
+    cron: Optional[str] = None
+    interval_seconds: Optional[float] = None
+    max_retries: int = 3
+    catchup: str = 'latest'
+    next_run: float = 0.0  # Unix timestamp of the next fire
+    last_run: Optional[float] = None
+    enabled: int = 1
+    created_at: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        """Convert schedule to dictionary"""
+        return asdict(self)
+
+    @staticmethod
+    def from_db_row(row: tuple) -> 'Schedule':
+        """Create Schedule from SQLite row tuple in SCHEDULE_COLUMNS order"""
+        return Schedule(**dict(zip(SCHEDULE_COLUMNS, row)))
+
+    def fire_times(self, now: float) -> Tuple[List[float], float]:
+        """
+        Get the fire times due at `now` and the following next_run
+
+        Returns:
+            Tuple of (due fire times, oldest first and capped at
+            MAX_CATCHUP_FIRES, next fire time after now)
+        """
+        fires = deque(maxlen=MAX_CATCHUP_FIRES)
+
+        if self.interval_seconds:
+            missed = int((now - self.next_run) // self.interval_seconds)
+            first = max(0, missed + 1 - MAX_CATCHUP_FIRES)
+            fires.extend(self.next_run + k * self.interval_seconds for k in range(first, missed + 1))
+            return list(fires), self.next_run + (missed + 1) * self.interval_seconds
+
+        cron = CronExpression(self.cron)
+        fire_at = self.next_run
+        while fire_at <= now:
+            fires.append(fire_at)
+            fire_at = cron.next_after(fire_at)
+        return list(fires), fire_at
+
+
+def _schedule_job_id(schedule_id: str, fire_at: float) -> str:
+    """Deterministic job ID for one fire, so a fire can only materialize once"""
+    stamp = datetime.fromtimestamp(fire_at, tz=timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    return f"{schedule_id}@{stamp}"
+
+
+def _parse_start_at(value: str) -> float:
+    """Parse an ISO timestamp into a Unix timestamp"""
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except (ValueError, AttributeError):
+        raise ValueError(f"Invalid start_at timestamp: {value}")
+
+
+def add_schedule(data: dict) -> Schedule:
+    """
+    Create a recurring schedule
+
+    Args:
+        data: Dictionary with 'id', 'command' and exactly one of 'cron'
+              (5-field expression, UTC) or 'interval' (seconds)
+              Optional: 'max_retries', 'catchup' (all, latest, skip),
+              'start_at' (ISO string, first fire time)
+
+    Returns:
+        Created Schedule object
+
+    Raises:
+        ValueError: If the schedule is invalid or the ID already exists
+    """
+    if 'id' not in data or 'command' not in data:
+        raise ValueError("Schedule must contain 'id' and 'command' fields")
+
+    cron = data.get('cron')
+    interval = data.get('interval')
+    if (cron is None) == (interval is None):
+        raise ValueError("Schedule must contain exactly one of 'cron' or 'interval'")
+
+    if interval is not None:
+        try:
+            interval = float(interval)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid interval: {interval}")
+        if interval < 1:
+            raise ValueError("Schedule interval must be at least 1 second")
+
+    catchup = data.get('catchup', 'latest')
+    if catchup not in CATCHUP_POLICIES:
+        raise ValueError(f"Invalid catchup policy '{catchup}' (expected one of: {', '.join(CATCHUP_POLICIES)})")
+
+    now = time.time()
+    if 'start_at' in data:
+        next_run = _parse_start_at(data['start_at'])
+    elif cron is not None:
+        next_run = CronExpression(cron).next_after(now)
+    else:
+        next_run = now + interval
+
+    schedule = Schedule(
+        id=data['id'],
+        command=data['command'],
+        cron=cron,
+        interval_seconds=interval,
+        max_retries=data.get('max_retries', get_config_int('max_retries', 3)),
+        catchup=catchup,
+        next_run=next_run,
+        created_at=get_utc_now()
+    )
+
+    with get_db('schedule') as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"""
+                INSERT INTO schedules ({SCHEDULE_SELECT_COLUMNS})
+                VALUES ({', '.join('?' for _ in SCHEDULE_COLUMNS)})
+            """, tuple(getattr(schedule, column) for column in SCHEDULE_COLUMNS))
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Schedule {schedule.id} already exists")
+        increment_counter(cursor, VERSION_COUNTER)
+
+    return schedule
+
+
+def list_schedules() -> List[Schedule]:
+    """List all schedules ordered by next fire time"""
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT {SCHEDULE_SELECT_COLUMNS}
+            FROM schedules
+            ORDER BY next_run
+        """)
+        return [Schedule.from_db_row(row) for row in cursor.fetchall()]
+
+
+def remove_schedule(schedule_id: str) -> bool:
+    """Delete a schedule; returns False if it did not exist"""
+    with get_db('schedule') as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM schedules WHERE id = ?", (schedule_id,))
+        if cursor.rowcount == 0:
+            return False
+        increment_counter(cursor, VERSION_COUNTER)
+        return True
+
+
+def fire_due_schedules(schedule_ids: List[str], now: Optional[float] = None) -> List[Tuple[float, str]]:
+    """
+    Materialize job rows for due schedules in one transaction
+
+    Each schedule is advanced with a compare-and-swap on next_run, and job
+    IDs are derived from the fire time, so concurrent schedulers (one per
+    'worker start') can never fire the same occurrence twice.
+
+    Args:
+        schedule_ids: IDs of schedules believed to be due
+        now: Current Unix timestamp (default: time.time())
+
+    Returns:
+        List of (next_run, schedule_id) for schedules that are still enabled
+    """
+    now = time.time() if now is None else now
+    upcoming = []
+    job_rows = []
+
+    with get_db('schedule') as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT value FROM config WHERE key = 'schedule_misfire_grace'")
+        row = cursor.fetchone()
+        grace = float(row[0]) if row and row[0] else 60.0
+
+        for schedule_id in schedule_ids:
+            cursor.execute(f"""
+                SELECT {SCHEDULE_SELECT_COLUMNS}
+                FROM schedules
+                WHERE id = ? AND enabled = 1
+            """, (schedule_id,))
+            row = cursor.fetchone()
+            if not row:
+                continue
+
+            schedule = Schedule.from_db_row(row)
+            if schedule.next_run > now:
+                # Another scheduler already fired it
+                upcoming.append((schedule.next_run, schedule.id))
+                continue
+
+            fires, next_run = schedule.fire_times(now)
+
+            cursor.execute("""
+                UPDATE schedules
+                SET next_run = ?,
+                    last_run = ?
+                WHERE id = ? AND next_run = ?
+            """, (next_run, fires[-1], schedule.id, schedule.next_run))
+
+            if cursor.rowcount == 0:
+                continue
+
+            upcoming.append((next_run, schedule.id))
+
+            if schedule.catchup == 'latest':
+                fires = fires[-1:]
+            elif schedule.catchup == 'skip':
+                fires = [fire_at for fire_at in fires if fire_at >= now - grace]
+
+            created_at = get_utc_now()
+            for fire_at in fires:
+                job_rows.append(Job(
+                    id=_schedule_job_id(schedule.id, fire_at),
+                    command=schedule.command,
+                    state='pending',
+                    max_retries=schedule.max_retries,
+                    created_at=created_at,
+                    updated_at=created_at,
+                    run_after=round(fire_at, 3)
+                ).to_db_row())
+
+        if job_rows:
+            cursor.executemany(f"""
+                INSERT OR IGNORE INTO jobs ({JOB_SELECT_COLUMNS})
+                VALUES ({', '.join('?' for _ in JOB_COLUMNS)})
+            """, job_rows)
+            # Scheduled runs are not refused, but they count towards the limit
+            add_unfinished(cursor, 'default', cursor.rowcount)
+
+    return upcoming
+
+
+def _read_version(cursor: sqlite3.Cursor) -> int:
+    cursor.execute("SELECT value FROM counters WHERE name = ?", (VERSION_COUNTER,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def _schedules_version() -> int:
+    with get_read_db() as conn:
+        return _read_version(conn.cursor())
+
+
+def _load_heap() -> Tuple[List[Tuple[float, str]], int]:
+    """Load (next_run, id) for every enabled schedule as a min-heap, with the schedules version"""
+    with get_read_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT next_run, id FROM schedules WHERE enabled = 1")
+        heap = [(row[0], row[1]) for row in cursor.fetchall()]
+        version = _read_version(cursor)
+    heapq.heapify(heap)
+    return heap, version
+
+
+def run_scheduler(stop_event: threading.Event, batch_size: int = 100):
+    """
+    Scheduler loop: sleep until the next fire time, then materialize jobs
+
+    Keeps a min-heap of next fire times. While sleeping it watches the
+    database for commits (see ChangeWatcher); after one, it re-reads the
+    schedules version counter and reloads the heap if a schedule was added
+    or removed. The heap is also reloaded every RELOAD_INTERVAL seconds.
+
+    Args:
+        stop_event: Set to stop the loop
+        batch_size: Maximum number of schedules fired per transaction
+    """
+    heap: List[Tuple[float, str]] = []
+    version = None
+    next_reload = 0.0
+    watcher = None
+
+    while not stop_event.is_set():
+        try:
+            if watcher is None:
+                watcher = ChangeWatcher()
+
+            now = time.time()
+            if now >= next_reload:
+                heap, version = _load_heap()
+                next_reload = now + RELOAD_INTERVAL
+
+            due = []
+            while heap and heap[0][0] <= now and len(due) < batch_size:
+                due.append(heapq.heappop(heap)[1])
+
+            if due:
+                for entry in fire_due_schedules(due, now):
+                    heapq.heappush(heap, entry)
+                continue
+
+            wake_at = min(heap[0][0], next_reload) if heap else next_reload
+            while watcher.wait(max(0.0, wake_at - time.time()), stop_event):
+                if _schedules_version() != version:
+                    next_reload = 0.0
+                    break
+
+        except Exception as e:
+            print(f"[Scheduler] Error in scheduler loop: {e}")
+            stop_event.wait(1)
+
+    if watcher is not None:
+        watcher.close()
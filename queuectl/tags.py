@@ -0,0 +1,70 @@
+"""
+Capability tags: jobs list the tags they 'requires', workers advertise theirs with --tags
+"""
+import re
+import sqlite3
+from typing import Iterable, List, Optional, Union
+
+
+TAG_PATTERN = re.compile(r'^[A-Za-z0-9_.:/-]+$')
+
+
+def parse_tags(value: Union[None, str, Iterable[str]], field: str = 'requires') -> Optional[List[str]]:
+    """
+    Normalize tags given as a list or a comma-separated string
+
+    Returns:
+        Sorted, unique tags, or None for no tags
+
+    Raises:
+        ValueError: If a tag is not a string of letters, digits and _ . : / -
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    elif not isinstance(value, (list, tuple, set, frozenset)):
+        raise ValueError(f"'{field}' must be a list of tags")
+
+    tags = set()
+    for tag in value:
+        if not isinstance(tag, str):
+            raise ValueError(f"'{field}' must be a list of tags")
+        tag = tag.strip()
+        if not tag:
+            continue
+        if not TAG_PATTERN.match(tag):
+            raise ValueError(f"Invalid tag '{tag}' in '{field}' (letters, digits and _ . : / - only)")
+        tags.add(tag)
+    return sorted(tags) or None
+
+
+def requirement_key(requires: Optional[List[str]]) -> str:
+    """Stored form of a job's requires: its sorted tags joined by commas ('' for none)"""
+    return ','.join(requires or ())
+
+
+def satisfies(tags: Optional[Iterable[str]], requires: Optional[List[str]]) -> bool:
+    """True if a worker with these tags may run a job with these requirements"""
+    return not requires or set(requires).issubset(tags or ())
+
+
+def register_requirements(cursor: sqlite3.Cursor, jobs_requires: Iterable[Optional[List[str]]]):
+    """Record the distinct requirement sets of enqueued jobs (inside the enqueue transaction)"""
+    keys = {requirement_key(requires) for requires in jobs_requires if requires}
+    cursor.executemany("INSERT OR IGNORE INTO job_requirements (requires) VALUES (?)",
+                       [(key,) for key in keys])
+
+
+def eligible_requirements(cursor: sqlite3.Cursor, tags: Optional[Iterable[str]]) -> List[str]:
+    """
+    Requirement keys a worker with these tags can run, for an indexed IN lookup
+
+    The job_requirements table holds one row per distinct requirement set
+    ever enqueued, so it stays tiny however many jobs there are. Untagged
+    workers only run jobs without requirements and skip the read.
+    """
+    if not tags:
+        return ['']
+    cursor.execute("SELECT requires FROM job_requirements")
+    return [''] + [key for (key,) in cursor.fetchall() if satisfies(tags, key.split(','))]
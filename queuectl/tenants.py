@@ -0,0 +1,145 @@
+"""
+Fair scheduling across tenants: weighted deficit round-robin claims
+"""
+import sqlite3
+from typing import Dict, List, Optional
+from queuectl.db import get_db
+
+
+DEFAULT_TENANT = 'default'
+
+# How workers pick the next job (config key 'claim_strategy')
+#   fifo: oldest due job first, whoever enqueued it
+#   fair: rotate among tenants with pending work, weight jobs per turn each
+CLAIM_STRATEGIES = ('fifo', 'fair')
+
+TENANT_COLUMNS = ("tenant", "weight", "active", "deficit", "pending")
+
+
+def pick_fair_job(cursor: sqlite3.Cursor, eligible: List[str], now: float,
+                  exclude: str = "", exclude_params: Optional[list] = None) -> Optional[str]:
+    """
+    Pick the next job by weighted deficit round-robin over active tenants
+
+    active_tenants holds every tenant with pending jobs (kept by triggers
+    on jobs), in turn order. The tenant at the head gets its weight added
+    to its deficit when its turn starts, and is served one job per claim
+    while the deficit lasts; then it moves to the back, carrying the
+    fraction left over. A tenant found with no pending jobs at all leaves
+    the table; one with only delayed jobs, or jobs this worker's tags
+    cannot run (or that are throttled), moves to the back with its
+    deficit reset.
+
+    Each step reads one row of active_tenants and probes one tenant's
+    range of idx_jobs_pending_tenant, so a claim costs the same however
+    many tenants there are, unless tenants at the head have nothing this
+    worker can run (each is visited at most once).
+
+    The caller must hold the write lock (BEGIN IMMEDIATE), since the
+    rotation is shared by every worker.
+
+    Args:
+        eligible: Requirement keys the worker's tags satisfy (see queuectl.tags)
+        now: Unix timestamp jobs must be due by
+        exclude: Extra SQL condition (starting with AND) for jobs that must not be
+                 picked, e.g. throttled ones (see queuectl.throttles.ClaimThrottles)
+        exclude_params: Parameters of exclude
+
+    Returns:
+        ID of the job to claim, or None
+    """
+    visited = set()
+    while True:
+        cursor.execute("""
+            SELECT a.tenant, a.deficit, COALESCE(t.weight, 1)
+            FROM active_tenants a LEFT JOIN tenants t ON t.tenant = a.tenant
+            ORDER BY a.turn
+            LIMIT 1
+        """)
+        row = cursor.fetchone()
+        if row is None or row[0] in visited:
+            return None
+        tenant, deficit, weight = row
+        visited.add(tenant)
+
+        cursor.execute(f"""
+            SELECT id FROM jobs INDEXED BY idx_jobs_pending_tenant
+            WHERE state = 'pending' AND tenant = ? AND requires IN ({', '.join('?' for _ in eligible)})
+              AND run_after <= ? {exclude}
+            ORDER BY created_at
+            LIMIT 1
+        """, (tenant, *eligible, now, *(exclude_params or ())))
+        job = cursor.fetchone()
+
+        if job is not None:
+            if deficit < 1:
+                deficit += weight
+            deficit -= 1
+            if deficit >= 1:
+                cursor.execute("UPDATE active_tenants SET deficit = ? WHERE tenant = ?", (deficit, tenant))
+            else:
+                _move_to_back(cursor, tenant, deficit)
+            return job[0]
+
+        cursor.execute("""
+            SELECT 1 FROM jobs INDEXED BY idx_jobs_pending_tenant
+            WHERE state = 'pending' AND tenant = ?
+            LIMIT 1
+        """, (tenant,))
+        if cursor.fetchone() is None:
+            cursor.execute("DELETE FROM active_tenants WHERE tenant = ?", (tenant,))
+        else:
+            _move_to_back(cursor, tenant, 0.0)
+
+
+def _move_to_back(cursor: sqlite3.Cursor, tenant: str, deficit: float):
+    cursor.execute("""
+        UPDATE active_tenants
+        SET deficit = ?, turn = (SELECT MAX(turn) + 1 FROM active_tenants)
+        WHERE tenant = ?
+    """, (deficit, tenant))
+
+
+def set_tenant_weight(tenant: str, weight: float):
+    """
+    Set a tenant's share of fair claims (jobs per turn; tenants default to 1)
+
+    Raises:
+        ValueError: If the weight is below 1
+    """
+    if weight < 1:
+        raise ValueError("Tenant weight must be at least 1 (weights are relative; give other tenants more)")
+    with get_db('config') as conn:
+        conn.execute("""
+            INSERT INTO tenants (tenant, weight) VALUES (?, ?)
+            ON CONFLICT(tenant) DO UPDATE SET weight = excluded.weight
+        """, (tenant, weight))
+
+
+def get_tenants(cursor: sqlite3.Cursor) -> List[Dict]:
+    """
+    Get tenants that have a weight or pending jobs, in turn order
+
+    Counts pending jobs per tenant from idx_jobs_pending_tenant, so the
+    cost grows with the backlog; meant for inspection, not workers.
+    """
+    cursor.execute("""
+        SELECT tenant, COUNT(*) FROM jobs INDEXED BY idx_jobs_pending_tenant
+        WHERE state = 'pending'
+        GROUP BY tenant
+    """)
+    pending = dict(cursor.fetchall())
+
+    cursor.execute("SELECT tenant, deficit FROM active_tenants ORDER BY turn")
+    active = cursor.fetchall()
+    cursor.execute("SELECT tenant, weight FROM tenants ORDER BY tenant")
+    weights = dict(cursor.fetchall())
+
+    order = [tenant for tenant, _ in active]
+    order += [tenant for tenant in sorted(set(weights) | set(pending)) if tenant not in order]
+    deficits = dict(active)
+    return [
+        dict(zip(TENANT_COLUMNS, (tenant, weights.get(tenant, 1.0), tenant in deficits,
+                                  deficits.get(tenant, 0.0), pending.get(tenant, 0))))
+        for tenant in order
+    ]
@@ -0,0 +1,185 @@
+"""
+Rate limits and concurrency caps per queue or per throttle key, enforced at claim time
+"""
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+from queuectl.db import get_db
+
+
+# What a throttle applies to: jobs in a queue, or jobs with a 'throttle_key'
+THROTTLE_SCOPES = ('queue', 'key')
+
+THROTTLE_COLUMNS = ("scope", "name", "rate", "burst", "max_in_flight", "tokens", "refilled_at")
+THROTTLE_SELECT_COLUMNS = ", ".join(THROTTLE_COLUMNS)
+
+
+def _job_column(scope: str) -> str:
+    return 'queue' if scope == 'queue' else 'throttle_key'
+
+
+def set_throttle(scope: str, name: str, rate: Optional[float] = None, burst: Optional[float] = None,
+                 max_in_flight: Optional[int] = None):
+    """
+    Limit how fast and how many jobs of a queue or throttle key are claimed
+
+    Args:
+        scope: 'queue' or 'key'
+        name: Queue name or throttle key
+        rate: Claims per second (token bucket refill rate), None for no rate limit
+        burst: Bucket size, i.e. claims allowed at once after a quiet spell (default: max(1, rate))
+        max_in_flight: Most jobs processing at once, None for no cap
+
+    Raises:
+        ValueError: If the scope or a limit is invalid, or neither limit is given
+    """
+    if scope not in THROTTLE_SCOPES:
+        raise ValueError(f"Invalid throttle scope '{scope}' (expected one of: {', '.join(THROTTLE_SCOPES)})")
+    if rate is None and max_in_flight is None:
+        raise ValueError("A throttle needs a rate, a max_in_flight, or both")
+    if rate is not None and rate <= 0:
+        raise ValueError("rate must be positive")
+    if max_in_flight is not None and max_in_flight < 1:
+        raise ValueError("max_in_flight must be at least 1")
+    if burst is None:
+        burst = max(1.0, rate) if rate is not None else None
+    elif rate is None or burst < 1:
+        raise ValueError("burst needs a rate and must be at least 1")
+
+    with get_db('limits') as conn:
+        # A new or changed bucket starts full
+        conn.execute(f"""
+            INSERT OR REPLACE INTO throttles ({THROTTLE_SELECT_COLUMNS})
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (scope, name, rate, burst, max_in_flight, burst, time.time()))
+
+
+def remove_throttle(scope: str, name: str) -> bool:
+    """Remove a throttle, returning False if there was none"""
+    with get_db('limits') as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM throttles WHERE scope = ? AND name = ?", (scope, name))
+        return cursor.rowcount > 0
+
+
+def has_throttles(cursor: sqlite3.Cursor) -> bool:
+    cursor.execute("SELECT 1 FROM throttles LIMIT 1")
+    return cursor.fetchone() is not None
+
+
+def _refilled(throttle: Dict, now: float) -> Optional[float]:
+    """Tokens in a throttle's bucket at now (None without a rate limit)"""
+    if throttle['rate'] is None:
+        return None
+    return min(throttle['burst'], throttle['tokens'] + max(0.0, now - throttle['refilled_at']) * throttle['rate'])
+
+
+def _in_flight(cursor: sqlite3.Cursor) -> Dict[Tuple[str, str], int]:
+    """
+    Processing jobs per (scope, name), counted from idx_jobs_processing
+
+    Counting the processing rows, instead of keeping counters, means a
+    job stuck in processing after a crash is released from the cap
+    together with the job.
+    """
+    counts = {}
+    for scope in THROTTLE_SCOPES:
+        column = _job_column(scope)
+        cursor.execute(f"""
+            SELECT {column}, COUNT(*) FROM jobs INDEXED BY idx_jobs_processing
+            WHERE state = 'processing' AND {column} IS NOT NULL
+            GROUP BY {column}
+        """)
+        for name, count in cursor.fetchall():
+            counts[(scope, name)] = count
+    return counts
+
+
+def get_throttles(cursor: sqlite3.Cursor, now: Optional[float] = None) -> List[Dict]:
+    """Get every throttle with its current 'tokens' and 'in_flight' job count"""
+    now = now or time.time()
+    cursor.execute(f"SELECT {THROTTLE_SELECT_COLUMNS} FROM throttles ORDER BY scope DESC, name")
+    throttles = [dict(zip(THROTTLE_COLUMNS, row)) for row in cursor.fetchall()]
+    if not throttles:
+        return []
+
+    in_flight = _in_flight(cursor)
+    for throttle in throttles:
+        throttle['tokens'] = _refilled(throttle, now)
+        throttle['in_flight'] = in_flight.get((throttle['scope'], throttle['name']), 0)
+    return throttles
+
+
+class ClaimThrottles:
+    """
+    Throttle state read inside a claim transaction (under the write lock)
+
+    A throttle blocks its queue or key while its bucket holds less than
+    one token or max_in_flight of its jobs are processing. The claim
+    query leaves blocked queues and keys out, so a throttled worker takes
+    other eligible work instead of waiting.
+    """
+
+    def __init__(self, cursor: sqlite3.Cursor, now: float):
+        self.now = now
+        self.throttles = {(throttle['scope'], throttle['name']): throttle
+                          for throttle in get_throttles(cursor, now)}
+        self.blocked: Dict[str, List[str]] = {scope: [] for scope in THROTTLE_SCOPES}
+        for (scope, name), throttle in self.throttles.items():
+            if ((throttle['tokens'] is not None and throttle['tokens'] < 1)
+                    or (throttle['max_in_flight'] is not None and throttle['in_flight'] >= throttle['max_in_flight'])):
+                self.blocked[scope].append(name)
+
+    def clause(self) -> Tuple[str, list]:
+        """SQL condition (with a leading AND) and parameters excluding blocked jobs"""
+        sql, params = "", []
+        for scope, names in self.blocked.items():
+            if names:
+                column = _job_column(scope)
+                sql += f" AND ({column} IS NULL OR {column} NOT IN ({', '.join('?' for _ in names)}))"
+                params += names
+        return sql, params
+
+    def allowance(self, queue: str, throttle_key: Optional[str]) -> Optional[int]:
+        """Jobs of this queue and key that may still be claimed now (None if unlimited)"""
+        limits = []
+        for key in (('queue', queue), ('key', throttle_key)):
+            throttle = self.throttles.get(key)
+            if throttle is None:
+                continue
+            if throttle['tokens'] is not None:
+                limits.append(int(throttle['tokens']))
+            if throttle['max_in_flight'] is not None:
+                limits.append(throttle['max_in_flight'] - throttle['in_flight'])
+        return max(0, min(limits)) if limits else None
+
+    def take(self, cursor: sqlite3.Cursor, queue: str, throttle_key: Optional[str], count: int = 1):
+        """Spend tokens from the buckets of the claimed jobs' queue and key"""
+        for key in (('queue', queue), ('key', throttle_key)):
+            throttle = self.throttles.get(key)
+            if throttle is None:
+                continue
+            throttle['in_flight'] += count
+            if throttle['tokens'] is None:
+                continue
+            throttle['tokens'] -= count
+            cursor.execute("""
+                UPDATE throttles SET tokens = ?, refilled_at = ?
+                WHERE scope = ? AND name = ?
+            """, (throttle['tokens'], self.now, *key))
+
+
+def next_token_at(cursor: sqlite3.Cursor, now: float) -> Optional[float]:
+    """
+    Earliest future time an empty bucket has a token again
+
+    Refills are not database changes, so idle workers use this to wake up
+    for rate-limited jobs.
+    """
+    cursor.execute("""
+        SELECT tokens, refilled_at, rate FROM throttles
+        WHERE rate IS NOT NULL AND tokens < 1
+    """)
+    times = [refilled_at + (1 - tokens) / rate for tokens, refilled_at, rate in cursor.fetchall()]
+    times = [t for t in times if t > now]
+    return min(times) if times else None
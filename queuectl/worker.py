@@ -5,219 +5,398 @@ import os
 import sys
 import time
 import signal
+import socket
 import subprocess
+import tempfile
+import threading
 import uuid
-from typing import Optional
-from queuectl.db import get_db, init_db
-from queuectl.models import Job, get_utc_now, get_unix_timestamp
-from queuectl.config import get_config_int, get_config_float
+from typing import Dict, List, Optional
+from queuectl.db import init_db
+from queuectl.models import Job
+from queuectl.batches import Batch, ITEMS_ENV_VAR, parse_batch_results
+from queuectl.payloads import PAYLOAD_FILE_ENV_VAR
+from queuectl.config import get_config_float
+from queuectl.scheduler import run_scheduler
+from queuectl.backends import Backend, get_storage_backend
+from queuectl.broker import RemoteBackend
+from queuectl.metrics import WorkerMetrics, is_busy_error
+from queuectl.profiling import WorkerProfiler
+from queuectl.workers import HEARTBEAT_INTERVAL, WorkerRegistration
+from queuectl.recycle import RECYCLE_EXIT_CODE, RecycleLimits
 
 
 should_stop = False
+stop_event = threading.Event()
+
+
+def request_stop():
+    """Make the worker loop exit after the current job"""
+    global should_stop
+    should_stop = True
+    stop_event.set()
 
 
 def signal_handler(signum, frame):
     """Handle shutdown signals"""
-    global should_stop
     print(f"\n[Worker {os.getpid()}] Received signal {signum}, initiating graceful shutdown...")
-    should_stop = True
+    request_stop()
 
 
-def setup_signal_handlers():
-    """Setup signal handlers for graceful shutdown"""
+def setup_signal_handlers(profiler: Optional[WorkerProfiler] = None):
+    """Setup signal handlers for graceful shutdown (and SIGUSR1 profile dumps when profiling)"""
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
+    if profiler is not None and hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: profiler.dump("SIGUSR1"))
 
 
-def claim_job(worker_id: str) -> Optional[Job]:
+def execute_job(job: Job, payload: Optional[str] = None) -> tuple[bool, str, Optional[int]]:
     """
-    Atomically claim a pending job
+    Execute a job command
     
     Args:
-        worker_id: Unique worker identifier
+        job: Job to execute
+        payload: The job's payload, piped to the command's stdin, or with
+                 payload_via 'file' written to a temporary file named by
+                 QUEUECTL_PAYLOAD_FILE (removed after the run)
     
     Returns:
-        Claimed Job object or None if no jobs available
+        Tuple of (success, output/error message, exit code or None if the
+        command did not run to completion)
     """
-    current_ts = get_unix_timestamp()
-    
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id FROM jobs 
-            WHERE state = 'pending' AND run_after <= ?
-            ORDER BY created_at
-            LIMIT 1
-        """, (current_ts,))
-        
-        row = cursor.fetchone()
-        if not row:
-            return None
-        
-        job_id = row[0]
-        locked_at = get_utc_now()
-        
-        cursor.execute("""
-            UPDATE jobs
-            SET state = 'processing',
-                locked_by = ?,
-                locked_at = ?,
-                updated_at = ?
-            WHERE id = ? AND state = 'pending'
-        """, (worker_id, locked_at, locked_at, job_id))
-        
-        if cursor.rowcount == 0:
-            return None
+    env = {**os.environ, **job.env} if job.env else None
+    stdin_input = None
+    payload_file = None
+    try:
+        if payload is not None and job.payload_via == 'file':
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', prefix='queuectl-payload-',
+                                             delete=False) as f:
+                f.write(payload)
+                payload_file = f.name
+            env = {**(env or os.environ), PAYLOAD_FILE_ENV_VAR: payload_file}
+        elif payload is not None:
+            stdin_input = payload
         
-        cursor.execute("""
-            SELECT id, command, state, attempts, max_retries, 
-                   created_at, updated_at, locked_by, locked_at, 
-                   last_error, run_after
-            FROM jobs
-            WHERE id = ?
-        """, (job_id,))
+        result = subprocess.run(
+            job.command,
+            shell=True,
+            capture_output=True,
+            text=True,
+            timeout=300,
+            env=env,
+            input=stdin_input
+        )
         
-        row = cursor.fetchone()
-        return Job.from_db_row(row) if row else None
+        success = result.returncode == 0
+        output = result.stdout if success else result.stderr
+        return success, output or f"Exit code: {result.returncode}", result.returncode
+    
+    except subprocess.TimeoutExpired:
+        return False, "Job execution timeout (5 minutes)", None
+    
+    except Exception as e:
+        return False, f"Execution error: {str(e)}", None
+    
+    finally:
+        if payload_file is not None:
+            try:
+                os.unlink(payload_file)
+            except OSError:
+                pass
 
 
-def execute_job(job: Job) -> tuple[bool, str]:
+def execute_batch(batch: Batch) -> Dict[str, tuple[bool, str, Optional[int]]]:
     """
-    Execute a job command
+    Execute a batch command and map its per-item result lines back to the items
     
     Args:
-        job: Job to execute
+        batch: Claimed batch; runs with the environment its jobs share
     
     Returns:
-        Tuple of (success, output/error message)
+        Item -> (success, output/error message, exit code or None), see
+        queuectl.batches.parse_batch_results
     """
+    items = batch.items()
+    env = {**os.environ, **(batch.jobs[0].env or {}), ITEMS_ENV_VAR: '\n'.join(items)}
     try:
         result = subprocess.run(
-            job.command,
+            batch.command,
             shell=True,
             capture_output=True,
             text=True,
-            timeout=300
+            timeout=300,
+            env=env
         )
-        
-        success = result.returncode == 0
-        output = result.stdout if success else result.stderr
-        return success, output or f"Exit code: {result.returncode}"
+        return parse_batch_results(result.stdout, items, result.returncode, result.stderr)
     
     except subprocess.TimeoutExpired:
-        return False, "Job execution timeout (5 minutes)"
+        return {item: (False, "Batch execution timeout (5 minutes)", None) for item in items}
     
     except Exception as e:
-        return False, f"Execution error: {str(e)}"
+        return {item: (False, f"Execution error: {str(e)}", None) for item in items}
+
+
+def record_result(backend: Backend, worker_id: str, job: Job, success: bool, output: str,
+                  exit_code: Optional[int], backoff_base: float,
+                  metrics: Optional[WorkerMetrics] = None,
+                  registration: Optional[WorkerRegistration] = None):
+    """Store the outcome of a job's run and count it"""
+    if success:
+        backend.complete(job, output)
+        print(f"[Worker {worker_id}] Job {job.id} completed successfully")
+    else:
+        backend.fail(job, output, backoff_base, exit_code)
+        print(f"[Worker {worker_id}] Job {job.id} failed (attempt {job.attempts + 1}/{job.max_retries}): {output[:100]}")
+    
+    if metrics is not None:
+        metrics.count_job('completed' if success else 'failed')
+    if registration is not None:
+        if success:
+            registration.jobs_done += 1
+        else:
+            registration.jobs_failed += 1
 
 
-def handle_job_result(job: Job, success: bool, output: str, backoff_base: float):
+def wait_for_work(backend: Backend, max_wait: float):
     """
-    Update job state based on execution result
+    Idle until the next delayed job is due, new work arrives or max_wait passes
     
     Args:
-        job: Job that was executed
-        success: Whether execution succeeded
-        output: Output or error message
-        backoff_base: Exponential backoff base for retry delay
+        backend: Storage backend, which provides the wake-up signal for new work
+        max_wait: Upper bound on the sleep in seconds
     """
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        if success:
-            cursor.execute("""
-                UPDATE jobs
-                SET state = 'completed',
-                    updated_at = ?,
-                    locked_by = NULL,
-                    locked_at = NULL
-                WHERE id = ?
-            """, (get_utc_now(), job.id))
-        
-        else:
-            new_attempts = job.attempts + 1
-            
-            if new_attempts < job.max_retries:
-                backoff_seconds = int(backoff_base ** new_attempts)
-                run_after = get_unix_timestamp() + backoff_seconds
-                
-                cursor.execute("""
-                    UPDATE jobs
-                    SET state = 'pending',
-                        attempts = ?,
-                        run_after = ?,
-                        updated_at = ?,
-                        last_error = ?,
-                        locked_by = NULL,
-                        locked_at = NULL
-                    WHERE id = ?
-                """, (new_attempts, run_after, get_utc_now(), output[:1000], job.id))
-            
-            else:
-                cursor.execute("""
-                    UPDATE jobs
-                    SET state = 'dead',
-                        attempts = ?,
-                        updated_at = ?,
-                        last_error = ?,
-                        locked_by = NULL,
-                        locked_at = NULL
-                    WHERE id = ?
-                """, (new_attempts, get_utc_now(), output[:1000], job.id))
-
-
-def worker_loop(worker_id: str, backoff_base: float):
+    timeout = max_wait
+    next_run_after = backend.next_run_after()
+    if next_run_after is not None:
+        timeout = min(timeout, max(0.0, next_run_after - time.time()))
+    backend.wait_for_work(timeout, stop_event)
+
+
+def run_heartbeat(backend: Backend, registration: WorkerRegistration, done: threading.Event):
+    """
+    Publish the worker's registry entry every HEARTBEAT_INTERVAL seconds until done is set
+    
+    Runs in its own thread, so long jobs keep the worker alive in the
+    registry; stops the worker when 'queuectl worker stop' asks it to.
+    """
+    while not done.wait(HEARTBEAT_INTERVAL):
+        try:
+            if backend.worker_heartbeat(registration.to_dict()) and not should_stop:
+                print(f"[Worker {registration.worker_id}] Stop requested, finishing current job...")
+                request_stop()
+        except Exception as e:
+            print(f"[Worker {registration.worker_id}] Heartbeat failed: {e}")
+
+
+def worker_loop(worker_id: str, backoff_base: float, backend: Backend,
+                idle_max_wait: float = 5.0, metrics: Optional[WorkerMetrics] = None,
+                profiler: Optional[WorkerProfiler] = None,
+                registration: Optional[WorkerRegistration] = None,
+                recycle: Optional[RecycleLimits] = None,
+                tags: Optional[List[str]] = None) -> Optional[str]:
     """
     Main worker loop - claim and execute jobs
     
     Args:
         worker_id: Unique worker identifier
         backoff_base: Exponential backoff base for retries
+        backend: Storage backend to claim jobs from
+        idle_max_wait: Longest idle sleep between checks for work
+        metrics: Records phase latencies and job counts when given
+        profiler: Records the time spent in every phase, idle included, when given
+        registration: Registry entry kept current (and published) while the loop runs
+        recycle: Limits after which the loop stops between jobs, to be replaced
+        tags: Capability tags; only jobs whose 'requires' tags are all among them are claimed
+    
+    Returns:
+        The recycle limit that was reached ('jobs', 'rss' or 'age'), or None
+        if the worker was asked to stop
     """
     global should_stop
     
-    print(f"[Worker {worker_id}] Started (PID: {os.getpid()})")
+    print(f"[Worker {worker_id}] Started (PID: {os.getpid()}, backend: {backend.name}"
+          + (f", tags: {','.join(tags)})" if tags else ")"))
+    
+    recycle_check = recycle.start() if recycle else None
+    recycled = None
+    processed = 0
+    
+    heartbeat_done = threading.Event()
+    if registration is not None:
+        backend.register_worker(registration.to_dict())
+        threading.Thread(target=run_heartbeat, args=(backend, registration, heartbeat_done),
+                         daemon=True).start()
     
     while not should_stop:
         try:
-            job = claim_job(worker_id)
+            started = time.perf_counter()
+            job = backend.claim(worker_id, tags)
+            claimed = time.perf_counter()
+            if profiler is not None:
+                profiler.record('claim', claimed - started)
+            if metrics is not None and job:
+                metrics.observe('claim', claimed - started)
+            
+            cached = False
+            if job and job.cache_key:
+                cached = backend.complete_from_cache(job)
+                if profiler is not None:
+                    profiler.record('cache_lookup', time.perf_counter() - claimed)
+            
+            batch = None
+            if job and job.batch and not cached:
+                batch = backend.gather_batch(job)
             
             if job:
-                print(f"[Worker {worker_id}] Processing job {job.id}: {job.command}")
-                success, output = execute_job(job)
-                handle_job_result(job, success, output, backoff_base)
-                
-                if success:
-                    print(f"[Worker {worker_id}] Job {job.id} completed successfully")
+                processed += len(batch.jobs) if batch else 1
+            
+            if cached:
+                print(f"[Worker {worker_id}] Job {job.id} completed from cache")
+                if metrics is not None:
+                    metrics.count_job('cached')
+                if registration is not None:
+                    registration.jobs_done += 1
+            
+            elif job:
+                if registration is not None:
+                    registration.current_job = job.id
+                started = time.perf_counter()
+                if batch is not None:
+                    print(f"[Worker {worker_id}] Processing batch of {len(batch.jobs)} '{job.batch}' jobs: "
+                          f"{batch.command[:100]}")
+                    results = execute_batch(batch)
+                    outcomes = [(member, *results[member.batch_item]) for member in batch.jobs]
                 else:
-                    print(f"[Worker {worker_id}] Job {job.id} failed (attempt {job.attempts + 1}/{job.max_retries}): {output[:100]}")
+                    print(f"[Worker {worker_id}] Processing job {job.id}: {job.command}")
+                    payload = backend.get_payload(job) if job.payload_hash else None
+                    if job.payload_hash and payload is None:
+                        outcomes = [(job, False, f"Payload {job.payload_hash[:12]} is missing", None)]
+                    else:
+                        outcomes = [(job, *execute_job(job, payload))]
+                finished = time.perf_counter()
+                
+                for member, success, output, exit_code in outcomes:
+                    record_result(backend, worker_id, member, success, output, exit_code, backoff_base,
+                                  metrics, registration)
+                
+                if metrics is not None:
+                    metrics.observe('execute', finished - started)
+                    metrics.observe('result_write', time.perf_counter() - finished)
+                if profiler is not None:
+                    profiler.record('execute', finished - started)
+                    profiler.record('result_write', time.perf_counter() - finished)
+                if registration is not None:
+                    registration.current_job = None
             else:
-                time.sleep(1)
+                started = time.perf_counter()
+                wait_for_work(backend, idle_max_wait)
+                if profiler is not None:
+                    profiler.record('idle', time.perf_counter() - started)
+            
+            if metrics is not None:
+                metrics.maybe_flush()
+            if profiler is not None:
+                profiler.tick()
+            if recycle_check is not None:
+                recycled = recycle_check.reason(processed)
+                if recycled is not None:
+                    print(f"[Worker {worker_id}] Reached its {recycled} limit after {processed} job(s), recycling")
+                    break
         
         except KeyboardInterrupt:
             print(f"\n[Worker {worker_id}] Interrupted, shutting down...")
             break
         
         except Exception as e:
+            if metrics is not None and is_busy_error(e):
+                metrics.count_busy()
             print(f"[Worker {worker_id}] Error in worker loop: {e}")
+            started = time.perf_counter()
             time.sleep(1)
+            if profiler is not None:
+                profiler.record('error', time.perf_counter() - started)
     
+    if registration is not None:
+        heartbeat_done.set()
+        registration.current_job = None
+        try:
+            backend.worker_heartbeat(registration.to_dict(), stopped=True)
+        except Exception as e:
+            print(f"[Worker {worker_id}] Could not record the stop in the registry: {e}")
+    if metrics is not None:
+        metrics.recycled = recycled
+        metrics.stopped = True
+        metrics.flush()
+    if profiler is not None:
+        profiler.close()
     print(f"[Worker {worker_id}] Stopped gracefully")
+    return recycled
 
 
-def start_worker(backoff_base: Optional[float] = None):
+def start_worker(backoff_base: Optional[float] = None, with_scheduler: bool = False,
+                 worker_index: int = 0, broker: Optional[str] = None,
+                 metrics_dir: Optional[str] = None, profile: Optional[float] = None,
+                 recycle: Optional[RecycleLimits] = None,
+                 spawned_at: Optional[float] = None,
+                 tags: Optional[List[str]] = None) -> Optional[str]:
     """
     Start a worker process
     
     Args:
         backoff_base: Exponential backoff base (from config if not specified)
+        with_scheduler: Also run the recurring-job scheduler in a background thread
+        worker_index: Position among the started workers (picks the home shard)
+        broker: Broker address; the worker then never touches a database file
+                and takes its config from the broker
+        metrics_dir: Write metrics snapshots to this directory (see queuectl.metrics)
+        profile: Profile the worker loop (see queuectl.profiling); the value is
+                 the length of the cProfile window in seconds (0 for phase timings only)
+        recycle: Stop to be replaced once a limit is reached (see queuectl.recycle)
+        spawned_at: When the supervisor started this process (Unix time), for
+                    the startup-cost metrics
+        tags: Capability tags the worker advertises (see queuectl.tags)
+    
+    Returns:
+        The recycle limit that stopped the worker, or None
     """
+    if broker is not None:
+        worker_id = f"worker-{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        metrics = WorkerMetrics(worker_id, metrics_dir) if metrics_dir else None
+        profiler = WorkerProfiler(worker_id, profile) if profile is not None else None
+        setup_signal_handlers(profiler)
+        with RemoteBackend(broker) as backend:
+            if backoff_base is None:
+                backoff_base = backend.backoff_base
+            if metrics is not None and spawned_at is not None:
+                metrics.startup_seconds = time.time() - spawned_at
+            return worker_loop(worker_id, backoff_base, backend, backend.idle_max_wait, metrics, profiler,
+                               WorkerRegistration(worker_id, backend.name, tags), recycle, tags)
+    
     init_db()
-    setup_signal_handlers()
     
     if backoff_base is None:
         backoff_base = get_config_float('backoff_base', 2.0)
     
+    if with_scheduler:
+        threading.Thread(target=run_scheduler, args=(stop_event,), daemon=True).start()
+    
     worker_id = f"worker-{os.getpid()}-{uuid.uuid4().hex[:8]}"
-    worker_loop(worker_id, backoff_base)
+    metrics = WorkerMetrics(worker_id, metrics_dir) if metrics_dir else None
+    profiler = WorkerProfiler(worker_id, profile) if profile is not None else None
+    setup_signal_handlers(profiler)
+    with get_storage_backend(home=worker_index) as backend:
+        if metrics is not None and spawned_at is not None:
+            metrics.startup_seconds = time.time() - spawned_at
+        return worker_loop(worker_id, backoff_base, backend, get_config_float('idle_max_wait', 5.0), metrics,
+                           profiler, WorkerRegistration(worker_id, backend.name, tags), recycle, tags)
+
+
+def run_worker_process(*args):
+    """
+    Process entry point of 'worker start' (same arguments as start_worker)
+    
+    Exits with RECYCLE_EXIT_CODE when a recycle limit stopped the worker,
+    which tells the supervisor to start a replacement.
+    """
+    if start_worker(*args) is not None:
+        sys.exit(RECYCLE_EXIT_CODE)
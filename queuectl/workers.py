@@ -0,0 +1,164 @@
+"""
+Worker registry: who is running where, kept current by worker heartbeats
+"""
+import os
+import socket
+import sqlite3
+import time
+from typing import Dict, List, Optional
+from queuectl.db import get_db
+
+
+# Seconds between a worker's registry updates
+HEARTBEAT_INTERVAL = 10.0
+
+# A worker that missed this many seconds of heartbeats is reported as lost
+LOST_AFTER = 3 * HEARTBEAT_INTERVAL
+
+# Stopped and lost workers are forgotten after a day
+FORGET_AFTER = 86400.0
+
+WORKER_COLUMNS = ("id", "host", "pid", "backend", "started_at", "heartbeat_at", "stopped_at",
+                  "stop_requested", "current_job", "jobs_done", "jobs_failed", "tags")
+WORKER_SELECT_COLUMNS = ", ".join(WORKER_COLUMNS)
+
+# Registry states of a worker (see worker_status)
+#   running:  heartbeating
+#   stopping: asked to stop by 'queuectl worker stop', still heartbeating
+#   stopped:  exited cleanly
+#   lost:     stopped heartbeating without a clean exit (killed, crashed, host down)
+WORKER_STATES = ('running', 'stopping', 'stopped', 'lost')
+LIVE_WORKER_STATES = ('running', 'stopping')
+
+
+class WorkerRegistration:
+    """
+    A worker's own registry entry
+
+    The worker loop only updates these attributes; a heartbeat thread
+    publishes them every HEARTBEAT_INTERVAL seconds, so the registry costs
+    the loop no database writes.
+    """
+
+    def __init__(self, worker_id: str, backend: str, tags: Optional[List[str]] = None):
+        self.worker_id = worker_id
+        self.host = socket.gethostname()
+        self.pid = os.getpid()
+        self.backend = backend
+        self.tags = tags or []
+        self.started_at = time.time()
+        self.current_job: Optional[str] = None
+        self.jobs_done = 0
+        self.jobs_failed = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.worker_id,
+            "host": self.host,
+            "pid": self.pid,
+            "backend": self.backend,
+            "tags": self.tags,
+            "started_at": self.started_at,
+            "current_job": self.current_job,
+            "jobs_done": self.jobs_done,
+            "jobs_failed": self.jobs_failed,
+        }
+
+
+def _insert_worker(cursor: sqlite3.Cursor, info: dict, now: float):
+    cursor.execute("""
+        INSERT OR REPLACE INTO workers
+            (id, host, pid, backend, started_at, heartbeat_at, current_job, jobs_done, jobs_failed, tags)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (info['id'], info['host'], info['pid'], info['backend'], info['started_at'], now,
+          info['current_job'], info['jobs_done'], info['jobs_failed'], ','.join(info.get('tags') or ())))
+
+
+def register_worker(info: dict):
+    """Add a starting worker to the registry, forgetting workers gone for FORGET_AFTER"""
+    now = time.time()
+    with get_db('workers') as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM workers WHERE heartbeat_at < ?", (now - FORGET_AFTER,))
+        _insert_worker(cursor, info, now)
+
+
+def heartbeat_worker(info: dict, stopped: bool = False) -> bool:
+    """
+    Publish a worker's current job and counters
+
+    Args:
+        info: WorkerRegistration.to_dict()
+        stopped: The worker is exiting cleanly
+
+    Returns:
+        True if 'queuectl worker stop' asked this worker to stop
+    """
+    now = time.time()
+    with get_db('workers') as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE workers
+            SET heartbeat_at = ?, current_job = ?, jobs_done = ?, jobs_failed = ?, stopped_at = ?
+            WHERE id = ?
+        """, (now, info['current_job'], info['jobs_done'], info['jobs_failed'],
+              now if stopped else None, info['id']))
+        if cursor.rowcount == 0:
+            # Forgotten (e.g. after a long outage): register again
+            if not stopped:
+                _insert_worker(cursor, info, now)
+            return False
+
+        cursor.execute("SELECT stop_requested FROM workers WHERE id = ?", (info['id'],))
+        row = cursor.fetchone()
+        return bool(row and row[0])
+
+
+def worker_status(worker: Dict, now: Optional[float] = None) -> str:
+    """Registry state of a worker row (one of WORKER_STATES)"""
+    if worker['stopped_at'] is not None:
+        return 'stopped'
+    if (now or time.time()) - worker['heartbeat_at'] > LOST_AFTER:
+        return 'lost'
+    return 'stopping' if worker['stop_requested'] else 'running'
+
+
+def get_workers(cursor: sqlite3.Cursor) -> List[Dict]:
+    """Get every registered worker, oldest first, with its 'status'"""
+    cursor.execute(f"""
+        SELECT {WORKER_SELECT_COLUMNS}
+        FROM workers
+        ORDER BY started_at
+    """)
+    now = time.time()
+    workers = []
+    for row in cursor.fetchall():
+        worker = dict(zip(WORKER_COLUMNS, row))
+        worker['stop_requested'] = bool(worker['stop_requested'])
+        worker['tags'] = worker['tags'].split(',') if worker['tags'] else []
+        worker['status'] = worker_status(worker, now)
+        workers.append(worker)
+    return workers
+
+
+def request_worker_stop(worker_ids: Optional[List[str]] = None) -> List[Dict]:
+    """
+    Ask live workers to stop after their current job
+
+    Workers see the request on their next heartbeat, wherever they run.
+
+    Args:
+        worker_ids: Workers to stop (default: every live worker)
+
+    Returns:
+        The live workers that were asked to stop
+    """
+    with get_db('workers') as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        targets = [worker for worker in get_workers(cursor)
+                   if worker['status'] in LIVE_WORKER_STATES
+                   and (worker_ids is None or worker['id'] in worker_ids)]
+        cursor.executemany("UPDATE workers SET stop_requested = 1 WHERE id = ?",
+                           [(worker['id'],) for worker in targets])
+        return targets
@@ -0,0 +1,70 @@
+"""
+Shared fixtures: storage backends in a fresh directory
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from queuectl.backends import SQLiteBackend, ShardedBackend, MemoryBackend, LogBackend
+from queuectl.broker import Broker, RemoteBackend
+
+
+class LocalBrokerBackend(RemoteBackend):
+    """RemoteBackend served by a broker thread on a free localhost port"""
+
+    def __init__(self, directory, batch_size=1):
+        self.path = os.path.join(directory, "queue.db")
+        self.broker = Broker(SQLiteBackend(path=self.path))
+        self.thread = self.broker.start_in_thread("127.0.0.1:0")
+        super().__init__(self.broker.address, batch_size=batch_size)
+
+    def close(self):
+        super().close()
+        self.broker.stop()
+        self.thread.join()
+
+
+def make_sqlite(directory):
+    return SQLiteBackend(path=os.path.join(directory, "queue.db"))
+
+
+def make_sharded(directory):
+    paths = [os.path.join(directory, f"queue.{index}.db") for index in range(3)]
+    return ShardedBackend(paths=paths, shard_by='id', home=0)
+
+
+def make_remote(directory):
+    return LocalBrokerBackend(directory)
+
+
+def make_memory(directory):
+    return MemoryBackend()
+
+
+def make_log(directory):
+    return LogBackend(os.path.join(directory, "log"))
+
+
+BACKENDS = {
+    "sqlite": make_sqlite,
+    "sharded": make_sharded,
+    "remote": make_remote,
+    "memory": make_memory,
+    "log": make_log,
+}
+
+
+@pytest.fixture
+def backend(request, tmp_path):
+    """
+    A backend in a fresh directory
+
+    SQLite unless a test names others with
+    @pytest.mark.parametrize("backend", ["sqlite", "remote"], indirect=True).
+    """
+    instance = BACKENDS[getattr(request, "param", "sqlite")](str(tmp_path))
+    yield instance
+    instance.close()
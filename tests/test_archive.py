@@ -0,0 +1,81 @@
+"""
+Queue archives: export, bulk import and the checks on import targets
+"""
+import io
+import os
+import sqlite3
+
+import pytest
+
+from queuectl.archive import export_archive, import_archive
+from queuectl.backends import ShardedBackend
+from queuectl.db import get_read_db, init_db, use_db_path
+from queuectl.throttles import remove_throttle, set_throttle
+
+
+def test_export_import_roundtrip(tmp_path):
+    directory = str(tmp_path)
+    source_paths = [os.path.join(directory, f"source.{index}.db") for index in range(2)]
+    source = ShardedBackend(paths=source_paths, home=0)
+    for index in range(20):
+        source.enqueue({"id": f"j{index}", "command": "true", "tenant": f"t{index % 3}",
+                        "payload": {"n": index} if index % 2 else None})
+    source.complete(source.claim("w1"))
+    with use_db_path(source_paths[1]):
+        set_throttle("queue", "api", rate=5)
+    archive = io.StringIO()
+    counts = export_archive(archive, source_paths)
+    assert counts["jobs"] == 20 and counts["payloads"] == 10, counts
+
+    target_paths = [os.path.join(directory, f"target.{index}.db") for index in range(2)]
+    archive.seek(0)
+    assert import_archive(archive, target_paths)["jobs"] == 20
+    target = ShardedBackend(paths=target_paths, home=0)
+    assert target.get_job("j0").state == 'completed'
+    assert target.stats()["state_counts"] == source.stats()["state_counts"]
+    job = target.get_job("j7")
+    assert target.get_payload(job) == '{"n":7}'
+    with use_db_path(target_paths[1]), get_read_db() as conn:
+        assert conn.execute("SELECT rate FROM throttles WHERE name = 'api'").fetchone() == (5,)
+        indexes = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index'").fetchone()[0]
+    with use_db_path(source_paths[1]), get_read_db() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index'").fetchone()[0] == indexes
+
+    # A target with jobs, or a truncated archive, is refused
+    for paths, text in ((target_paths, archive.getvalue()),
+                        ([os.path.join(directory, f"other.{index}.db") for index in range(2)],
+                         archive.getvalue().rsplit("\n", 2)[0] + "\n")):
+        with pytest.raises(ValueError):
+            import_archive(io.StringIO(text), paths)
+    assert not any(name.startswith("other") for name in os.listdir(directory))
+
+    # Tables other than jobs count too, but the config defaults of a new database do not
+    fresh_paths = [os.path.join(directory, f"fresh.{index}.db") for index in range(2)]
+    for path in fresh_paths:
+        with use_db_path(path):
+            init_db()
+    with use_db_path(fresh_paths[0]):
+        set_throttle("queue", "db", rate=1)
+    with pytest.raises(ValueError, match="throttles"):
+        import_archive(io.StringIO(archive.getvalue()), fresh_paths)
+    with use_db_path(fresh_paths[0]), get_read_db() as conn:
+        assert conn.execute("SELECT rate FROM throttles").fetchall() == [(1,)]
+    with use_db_path(fresh_paths[0]):
+        remove_throttle("queue", "db")
+
+    # A target another connection has open is refused and left as it was
+    holder = sqlite3.connect(fresh_paths[1])
+    holder.execute("SELECT 1 FROM jobs").fetchall()
+    with pytest.raises(ValueError, match="in use"):
+        import_archive(io.StringIO(archive.getvalue()), fresh_paths)
+    holder.close()
+    assert not any(name.endswith(".import") for name in os.listdir(directory))
+
+    assert import_archive(io.StringIO(archive.getvalue()), fresh_paths)["jobs"] == 20
+    assert not any(name.startswith("fresh") and name.endswith(("-wal", "-shm"))
+                   for name in os.listdir(directory))
+    fresh = ShardedBackend(paths=fresh_paths, home=0)
+    assert fresh.stats()["state_counts"] == source.stats()["state_counts"]
+    fresh.close()
+    source.close()
+    target.close()
@@ -0,0 +1,308 @@
+"""
+Conformance suite shared by every storage backend
+
+Run with pytest, or directly: python tests/test_backends.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from queuectl.backends import LogBackend
+from queuectl.queue import DuplicateJobError
+
+from conftest import BACKENDS
+
+
+NO_DELAY = {"type": "fixed", "delay": 0}
+
+FACTORIES = tuple(BACKENDS.values())
+
+
+def each_backend(test):
+    """Run a test body once per backend, each in a fresh directory"""
+    def run():
+        for factory in FACTORIES:
+            directory = tempfile.mkdtemp(prefix="queuectl-test-")
+            backend = factory(directory)
+            try:
+                test(backend)
+            except AssertionError as e:
+                raise AssertionError(f"[{backend.name}] {e}") from e
+            finally:
+                backend.close()
+                shutil.rmtree(directory, ignore_errors=True)
+    run.__name__ = test.__name__
+    return run
+
+
+def iso_in(seconds):
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat()
+
+
+@each_backend
+def test_enqueue_and_get(backend):
+    job = backend.enqueue({"id": "a", "command": "echo a", "max_retries": 5, "env": {"X": 1}})
+    assert job.state == 'pending'
+
+    stored = backend.get_job("a")
+    assert stored.command == "echo a"
+    assert stored.max_retries == 5
+    assert stored.env == {"X": "1"}
+    assert backend.get_job("missing") is None
+
+
+@each_backend
+def test_duplicate_id_rejected(backend):
+    backend.enqueue({"id": "a", "command": "true"})
+    try:
+        backend.enqueue({"id": "a", "command": "true"})
+    except DuplicateJobError:
+        pass
+    else:
+        raise AssertionError("duplicate ID was accepted")
+
+
+@each_backend
+def test_invalid_job_rejected(backend):
+    for job_data in ({"command": "true"}, {"id": "a", "command": "true", "env": "x"}):
+        try:
+            backend.enqueue(job_data)
+        except ValueError:
+            continue
+        raise AssertionError(f"invalid job accepted: {job_data}")
+
+
+@each_backend
+def test_claim_is_fifo(backend):
+    for job_id in ("a", "b", "c"):
+        backend.enqueue({"id": job_id, "command": "true"})
+
+    claimed = [backend.claim("w1").id for _ in range(3)]
+    if backend.name == 'sharded':
+        # FIFO holds per shard only
+        assert sorted(claimed) == ["a", "b", "c"], claimed
+    else:
+        assert claimed == ["a", "b", "c"], claimed
+    assert backend.claim("w1") is None
+
+    job = backend.get_job("a")
+    assert job.state == 'processing'
+    assert job.locked_by == "w1"
+
+
+@each_backend
+def test_claim_matches_required_tags(backend):
+    backend.enqueue({"id": "gpu", "command": "true", "requires": ["gpu"]})
+    backend.enqueue({"id": "any", "command": "true"})
+    backend.enqueue({"id": "both", "command": "true", "requires": "gpu, bigmem"})
+    assert backend.get_job("both").requires == ["bigmem", "gpu"]
+
+    assert backend.claim("w1").id == "any"
+    assert backend.claim("w1") is None
+    assert backend.claim("w2", ["gpu"]).id == "gpu"
+    assert backend.claim("w2", ["gpu"]) is None
+    assert backend.claim("w3", ["bigmem", "gpu", "ssd"]).id == "both"
+
+
+@each_backend
+def test_delayed_job_waits(backend):
+    backend.enqueue({"id": "later", "command": "true", "run_at": iso_in(0.3)})
+    assert backend.claim("w1") is None
+
+    next_run = backend.next_run_after()
+    assert next_run is not None and next_run > time.time()
+
+    time.sleep(0.35)
+    job = backend.claim("w1")
+    assert job is not None and job.id == "later"
+
+
+@each_backend
+def test_complete(backend):
+    backend.enqueue({"id": "a", "command": "true"})
+    backend.complete(backend.claim("w1"), "ok")
+
+    job = backend.get_job("a")
+    assert job.state == 'completed'
+    assert job.locked_by is None
+    assert job.exit_code == 0
+    assert backend.claim("w1") is None
+
+
+@each_backend
+def test_exit_code_recorded(backend):
+    backend.enqueue({"id": "a", "command": "false", "max_retries": 2, "retry_policy": NO_DELAY})
+    backend.fail(backend.claim("w1"), "boom", exit_code=7)
+    assert backend.get_job("a").exit_code == 7
+
+    backend.fail(backend.claim("w1"), "timeout")
+    job = backend.get_job("a")
+    assert job.state == 'dead'
+    assert job.exit_code is None
+
+
+@each_backend
+def test_get_jobs(backend):
+    for job_id in ("a", "b", "c"):
+        backend.enqueue({"id": job_id, "command": "true"})
+
+    jobs = backend.get_jobs(["c", "a", "missing"])
+    assert sorted(jobs) == ["a", "c"]
+    assert jobs["c"].id == "c"
+
+
+@each_backend
+def test_release(backend):
+    backend.enqueue({"id": "a", "command": "true"})
+    job = backend.claim("w1")
+
+    other = backend.get_job("a")
+    other.locked_by = "w2"
+    assert backend.release(other) is False
+
+    assert backend.release(job) is True
+    released = backend.get_job("a")
+    assert released.state == 'pending'
+    assert released.attempts == 0
+    assert backend.claim("w2").id == "a"
+
+
+@each_backend
+def test_fail_retries_then_dies(backend):
+    backend.enqueue({"id": "a", "command": "false", "max_retries": 2, "retry_policy": NO_DELAY})
+
+    assert backend.fail(backend.claim("w1"), "boom", exit_code=1) == 'pending'
+    job = backend.get_job("a")
+    assert job.attempts == 1
+    assert job.last_error == "boom"
+
+    assert backend.fail(backend.claim("w1"), "boom again", exit_code=1) == 'dead'
+    job = backend.get_job("a")
+    assert job.state == 'dead'
+    assert job.attempts == 2
+    assert backend.claim("w1") is None
+
+
+@each_backend
+def test_fail_backoff_delays_retry(backend):
+    backend.enqueue({"id": "a", "command": "false", "retry_policy": {"type": "fixed", "delay": 30}})
+    backend.fail(backend.claim("w1"), "boom", exit_code=1)
+
+    job = backend.get_job("a")
+    assert job.state == 'pending'
+    assert job.run_after > time.time() + 20
+    assert backend.claim("w1") is None
+
+
+@each_backend
+def test_exit_code_rules(backend):
+    policy = {"type": "fixed", "delay": 0, "dead_exit_codes": [2], "free_exit_codes": [75]}
+    backend.enqueue({"id": "a", "command": "false", "max_retries": 3, "retry_policy": policy})
+
+    assert backend.fail(backend.claim("w1"), "busy", exit_code=75) == 'pending'
+    assert backend.get_job("a").attempts == 0
+
+    assert backend.fail(backend.claim("w1"), "bad input", exit_code=2) == 'dead'
+
+
+@each_backend
+def test_dedup_policies(backend):
+    assert not backend.enqueue({"id": "a", "command": "true", "dedup_key": "k"}).deduplicated
+
+    try:
+        backend.enqueue({"id": "b", "command": "true", "dedup_key": "k"})
+    except DuplicateJobError as e:
+        assert e.existing.id == "a"
+    else:
+        raise AssertionError("dedup_key collision was accepted")
+
+    existing = backend.enqueue({"id": "c", "command": "true", "dedup_key": "k",
+                                "dedup_policy": "return_existing"})
+    assert existing.id == "a" and existing.deduplicated
+    assert backend.get_job("c") is None
+
+    # Resubmitting the same job is deduplicated too, not reported as a new one
+    again = backend.enqueue({"id": "a", "command": "true", "dedup_key": "k", "dedup_policy": "coalesce"})
+    assert again.id == "a" and again.deduplicated
+    assert not backend.get_job("a").deduplicated
+
+    backend.complete(backend.claim("w1"))
+    job = backend.enqueue({"id": "d", "command": "true", "dedup_key": "k"})
+    assert job.id == "d" and not job.deduplicated
+
+
+@each_backend
+def test_list_and_stats(backend):
+    for job_id in ("a", "b", "c"):
+        backend.enqueue({"id": job_id, "command": "true"})
+        time.sleep(0.002)
+    backend.complete(backend.claim("w1"))
+
+    assert [job.id for job in backend.list_jobs()] == ["c", "b", "a"]
+    assert [job.id for job in backend.list_jobs('completed')] == ["a"]
+
+    stats = backend.stats()
+    assert stats["total_jobs"] == 3
+    assert stats["state_counts"] == {"pending": 2, "completed": 1}, stats["state_counts"]
+
+
+@each_backend
+def test_wait_for_work_times_out(backend):
+    start = time.monotonic()
+    assert backend.wait_for_work(0.1) is False
+    assert time.monotonic() - start < 2
+
+
+def test_log_recovers_after_reopen():
+    directory = tempfile.mkdtemp(prefix="queuectl-test-")
+    try:
+        backend = LogBackend(directory, snapshot_every=5)
+        for job_id in ("a", "b", "c", "d"):
+            backend.enqueue({"id": job_id, "command": "true"})
+            time.sleep(0.002)
+        backend.complete(backend.claim("w1"))
+        backend.claim("w1")
+        # Simulate a crash: drop the file without the closing snapshot
+        backend._file.close()
+        backend._file = None
+
+        backend = LogBackend(directory, snapshot_every=5)
+        states = {job.id: job.state for job in backend.list_jobs()}
+        assert states == {"a": "completed", "b": "pending", "c": "pending", "d": "pending"}, states
+        assert [job.id for job in backend.list_jobs()] == ["d", "c", "b", "a"]
+        assert backend.claim("w2").id == "b"
+        backend.close()
+
+        segments = [name for name in os.listdir(directory) if name.startswith("segment-")]
+        assert len(segments) == 1, segments
+
+        backend = LogBackend(directory)
+        assert backend.get_job("b").state == 'pending'
+        assert backend.stats()["total_jobs"] == 4
+        backend.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    tests = [value for name, value in sorted(globals().items())
+             if name.startswith("test_") and callable(value)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"PASS {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"FAIL {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
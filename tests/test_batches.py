@@ -0,0 +1,43 @@
+"""
+Batchable jobs: gathering compatible jobs and mapping results to items
+"""
+import time
+
+import pytest
+
+from queuectl.batches import parse_batch_results, set_batch_type
+from queuectl.db import use_db_path
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "remote"], indirect=True)
+def test_batches_gather_compatible_jobs(backend):
+    with use_db_path(backend.path):
+        set_batch_type("items", "process-items {items}", max_size=3, linger=0.3)
+    for index in range(1, 5):
+        backend.enqueue({"id": f"b{index}", "command": "true", "batch": "items", "batch_item": str(index)})
+    backend.enqueue({"id": "b5", "command": "true", "batch": "items", "queue": "other"})
+    backend.enqueue({"id": "x", "command": "true"})
+
+    lead = backend.claim("w1")
+    batch = backend.gather_batch(lead)
+    assert [job.id for job in batch.jobs] == ["b1", "b2", "b3"], batch
+    assert batch.command == "process-items 1 2 3"
+    assert all(backend.get_job(job.id).state == 'processing' for job in batch.jobs)
+
+    # Two due jobs left: the batch type lingers for more, so other work goes first
+    assert backend.claim("w1").id == "x"
+    assert backend.claim("w1") is None
+    assert backend.next_run_after() - time.time() <= 0.3
+    time.sleep(0.3)
+    lead = backend.claim("w1")
+    assert lead.id == "b4"
+    assert backend.gather_batch(lead) is None  # b5 is in another queue
+
+
+def test_batch_results_map_to_items():
+    results = parse_batch_results('{"item": "1", "ok": true, "output": "done"}\nnoise\n'
+                                  '{"item": "2", "ok": false, "error": "bad", "exit_code": 3}\n',
+                                  ["1", "2", "3"], 1, "crashed")
+    assert results["1"] == (True, "done", 0)
+    assert results["2"] == (False, "bad", 3)
+    assert results["3"][0] is False and results["3"][2] == 1 and "crashed" in results["3"][1]
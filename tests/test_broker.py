@@ -0,0 +1,61 @@
+"""
+Broker and remote workers: leased batch claims and broker-only commands
+"""
+import os
+import socket
+import time
+
+from click.testing import CliRunner
+
+from queuectl.backends import SQLiteBackend
+from queuectl.cli import cli
+
+from conftest import LocalBrokerBackend
+
+
+def test_remote_batch_claim_releases_on_close(tmp_path):
+    backend = LocalBrokerBackend(str(tmp_path), batch_size=10)
+    try:
+        for job_id in ("a", "b", "c"):
+            backend.enqueue({"id": job_id, "command": "true"})
+            time.sleep(0.002)
+
+        # One round trip leases the whole batch to this client
+        assert backend.claim("w1").id == "a"
+        stats = backend.stats()
+        assert stats["state_counts"] == {"processing": 3}, stats["state_counts"]
+        assert stats["leases"] == 3
+        backend.complete(backend.claim("w1"))
+    finally:
+        backend.close()
+
+    with SQLiteBackend(path=backend.path) as sqlite:
+        states = {job.id: job.state for job in sqlite.list_jobs()}
+    # The buffered job is released by the client, the unfinished one by the broker
+    assert states == {"a": "pending", "b": "completed", "c": "pending"}, states
+
+
+def test_broker_commands_skip_the_database(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("QUEUECTL_DB_PATH", raising=False)
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        closed = f"127.0.0.1:{probe.getsockname()[1]}"
+    (tmp_path / "broker").mkdir()
+    broker = LocalBrokerBackend(str(tmp_path / "broker"))
+    try:
+        runner = CliRunner()
+        result = runner.invoke(cli, ["enqueue", "--broker", broker.address, '{"id": "a", "command": "true"}'])
+        assert result.exit_code == 0 and "Enqueued job: a" in result.output, result.output
+        assert broker.get_job("a").state == 'pending'
+        result = runner.invoke(cli, ["worker", "list", "--broker", broker.address])
+        assert result.exit_code == 0, result.output
+
+        for args in (["enqueue", "--broker", closed, '{"id": "b", "command": "true"}'],
+                     ["worker", "list", "--broker", closed], ["worker", "start", "--broker", closed]):
+            result = runner.invoke(cli, args)
+            assert result.exit_code == 1, (args, result.output)
+            assert f"Error: Cannot reach broker {closed}" in result.output, (args, result.output)
+    finally:
+        broker.close()
+    assert sorted(os.listdir(tmp_path)) == ["broker"]
@@ -0,0 +1,31 @@
+"""
+Result cache: hit/miss counters and least-recently-used eviction
+"""
+import time
+
+from queuectl.config import set_config
+from queuectl.db import get_read_db, use_db_path
+
+
+def test_result_cache_counts_and_evicts_lru(backend):
+    with use_db_path(backend.path):
+        set_config("cache_max_entries", "2")
+
+    def run(job_id, cache_key):
+        backend.enqueue({"id": job_id, "command": "true", "cache_key": cache_key})
+        job = backend.claim("w1")
+        if backend.complete_from_cache(job):
+            return True
+        backend.complete(job, f"output of {cache_key}")
+        time.sleep(0.002)
+        return False
+
+    assert [run("a1", "a"), run("b1", "b"), run("a2", "a")] == [False, False, True]
+    # c evicts b, the least recently used entry (a was just read)
+    assert [run("c1", "c"), run("a3", "a"), run("b2", "b")] == [False, True, False]
+
+    cache = backend.stats()["cache"]
+    assert cache == {"hits": 2, "misses": 4, "entries": 2}, cache
+    with use_db_path(backend.path), get_read_db() as conn:
+        keys = [row[0] for row in conn.execute("SELECT cache_key FROM result_cache ORDER BY cache_key")]
+    assert keys == ["a", "b"], keys
@@ -0,0 +1,42 @@
+"""
+Command-line behavior: read-only inspection and enqueue reporting
+"""
+import sqlite3
+import time
+
+from click.testing import CliRunner
+
+from queuectl.backends import SQLiteBackend
+from queuectl.cli import cli
+
+
+def test_read_commands_do_not_wait_for_writers(tmp_path):
+    path = str(tmp_path / "queue.db")
+    backend = SQLiteBackend(path=path)
+    backend.enqueue({"id": "a", "command": "true"})
+    backend.fail(backend.claim("w1"), "boom", exit_code=1)
+    backend.close()
+
+    writer = sqlite3.connect(path, isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        runner = CliRunner()
+        for args, expected in ((["status"], "Total jobs: 1"), (["list"], "a"), (["dlq", "list"], "No jobs")):
+            start = time.monotonic()
+            result = runner.invoke(cli, args, env={"QUEUECTL_DB_PATH": path})
+            assert result.exit_code == 0, (args, result.output, result.exception)
+            assert expected in result.output, (args, result.output)
+            assert time.monotonic() - start < 1, args
+    finally:
+        writer.execute("ROLLBACK")
+        writer.close()
+
+
+def test_enqueue_cli_reports_duplicates(tmp_path):
+    runner = CliRunner()
+    env = {"QUEUECTL_DB_PATH": str(tmp_path / "queue.db")}
+    job_json = '{"id": "a", "command": "true", "dedup_key": "k", "dedup_policy": "return_existing"}'
+    result = runner.invoke(cli, ["enqueue", job_json], env=env)
+    assert "Enqueued job: a" in result.output, result.output
+    result = runner.invoke(cli, ["enqueue", job_json], env=env)
+    assert result.exit_code == 0 and "Duplicate of queued job: a" in result.output, result.output
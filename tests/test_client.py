@@ -0,0 +1,40 @@
+"""
+Asyncio client: shared result watcher and wait()
+"""
+import asyncio
+
+from queuectl.backends import MemoryBackend
+from queuectl.client import AsyncClient
+
+
+def test_async_client_wait():
+    async def scenario():
+        async with AsyncClient(MemoryBackend()) as client:
+            await client.enqueue_many([{"id": "a", "command": "true"}, {"id": "b", "command": "false", "max_retries": 0}])
+            waits = [asyncio.ensure_future(client.wait(job_id, timeout=5)) for job_id in ("a", "b", "a")]
+            await asyncio.sleep(0.05)
+
+            backend = client.backend
+            backend.complete(backend.claim("w1"))
+            backend.fail(backend.claim("w1"), "boom", exit_code=2)
+            first, second, again = await asyncio.gather(*waits)
+            assert (first.state, first.exit_code) == ("completed", 0)
+            assert again.state == "completed"
+            assert (second.state, second.exit_code) == ("dead", 2)
+
+            try:
+                await client.wait("missing")
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("waiting for an unknown job should fail")
+
+            await client.enqueue({"id": "c", "command": "true"})
+            try:
+                await client.wait("c", timeout=0.1)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                raise AssertionError("wait should time out while the job is pending")
+
+    asyncio.run(scenario())
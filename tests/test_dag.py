@@ -0,0 +1,36 @@
+"""
+Job dependencies: unblocking, failure policies and DAG status
+"""
+from queuectl.dag import get_dag_status
+from queuectl.db import use_db_path
+
+
+def test_dependencies_unblock_and_cascade(backend):
+    backend.enqueue({"id": "r", "command": "false", "max_retries": 1})
+    for job_id, parents, policy in (("a", ["r"], None), ("b", ["r"], "ignore"), ("c", ["r"], "block"),
+                                    ("d", ["a"], None), ("e", ["b"], None)):
+        job = backend.enqueue({"id": job_id, "command": "true", "depends_on": parents, "on_dep_failure": policy})
+        assert job.state == 'blocked' and job.deps_remaining == 1
+    for job_data in ({"id": "x", "command": "true", "depends_on": ["missing"]},
+                     {"id": "x", "command": "true", "depends_on": ["x"]}):
+        try:
+            backend.enqueue(job_data)
+        except ValueError:
+            continue
+        raise AssertionError(f"invalid dependency accepted: {job_data}")
+
+    backend.fail(backend.claim("w1"), "boom", exit_code=1)
+    states = {job.id: job.state for job in backend.list_jobs()}
+    assert states == {"r": "dead", "a": "dead", "d": "dead", "b": "pending", "c": "blocked", "e": "blocked"}, states
+    assert backend.get_job("d").last_error == "Dependency a failed"
+
+    # A job added under a dead parent dies at once; completing b unblocks e
+    assert backend.enqueue({"id": "late", "command": "true", "depends_on": ["r"]}).state == 'dead'
+    backend.complete(backend.claim("w1"))
+    assert backend.get_job("e").state == 'pending'
+
+    with use_db_path(backend.path):
+        dag = get_dag_status("r")
+    depths = {node["id"]: node["depth"] for node in dag["nodes"]}
+    assert depths == {"r": 0, "a": 1, "b": 1, "c": 1, "late": 1, "d": 2, "e": 2}, depths
+    assert dag["state_counts"] == {"dead": 4, "completed": 1, "blocked": 1, "pending": 1}, dag["state_counts"]
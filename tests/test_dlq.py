@@ -0,0 +1,46 @@
+"""
+Bulk DLQ retry, purge and export
+"""
+import io
+import json
+
+from queuectl.db import get_read_db, use_db_path
+from queuectl.groups import get_group_status
+from queuectl.queue import count_dlq_jobs, create_group, export_dlq_jobs, purge_dlq_jobs, retry_dlq_jobs
+
+
+def test_bulk_dlq_in_chunks(backend):
+    with use_db_path(backend.path):
+        create_group({"id": "g", "jobs": [{"id": f"m{index}", "command": "false", "max_retries": 1}
+                                          for index in range(5)]})
+    backend.enqueue({"id": "p", "command": "false", "max_retries": 1})
+    backend.enqueue({"id": "c", "command": "true", "depends_on": ["p"], "on_dep_failure": "block"})
+    while True:
+        job = backend.claim("w1")
+        if job is None:
+            break
+        backend.fail(job, "transient" if job.id in ("m0", "m1") else "fatal", exit_code=1)
+
+    with use_db_path(backend.path):
+        assert count_dlq_jobs() == 6
+        out = io.StringIO()
+        assert export_dlq_jobs(out, error_match="fatal") == 4
+        assert sorted(json.loads(line)["id"] for line in out.getvalue().splitlines()) == ["m2", "m3", "m4", "p"]
+
+        assert retry_dlq_jobs(chunk_size=1, error_match="transient") == (2, 0)
+        group = get_group_status("g")
+        assert (group["total"], group["pending"], group["dead"]) == (5, 2, 3), group
+
+        # Purged members leave the group's counts, and their edges go with them
+        assert purge_dlq_jobs(chunk_size=2) == 4
+        group = get_group_status("g")
+        assert (group["total"], group["pending"], group["dead"]) == (2, 2, 0), group
+        with get_read_db() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM job_deps").fetchone()[0] == 0
+        assert count_dlq_jobs() == 0
+
+    backend.complete(backend.claim("w1"))
+    backend.complete(backend.claim("w1"))
+    with use_db_path(backend.path):
+        group = get_group_status("g")
+    assert group["finished"] and group["completed"] == 2, group
@@ -0,0 +1,63 @@
+"""
+Job groups: aggregate counters and the once-only completion callback
+"""
+import pytest
+
+from queuectl.db import get_read_db, use_db_path
+from queuectl.groups import get_group_status
+from queuectl.queue import create_group, retry_dlq_jobs
+
+
+def test_group_counters_and_callback(backend):
+    with use_db_path(backend.path):
+        assert create_group({"id": "g", "jobs": [{"id": "m1", "command": "true"}, {"id": "m2", "command": "true"}],
+                             "callback": {"command": "echo done"}}) == ("g", 2)
+        for group_data in ({"id": "g", "jobs": [{"id": "m9", "command": "true"}]}, {"id": "h", "jobs": []},
+                           {"id": "h", "jobs": [{"id": "h1", "command": "true"}], "callback": {"command": "x", "env": 1}},
+                           {"id": "h", "jobs": [{"id": "h1", "command": "true"}], "callback": {"id": "h1", "command": "x"}},
+                           {"id": "h", "jobs": [{"id": "h1", "command": "true"}], "callback": {"id": "m1", "command": "x"}}):
+            try:
+                create_group(group_data)
+            except ValueError:
+                continue
+            raise AssertionError(f"invalid group accepted: {group_data}")
+    backend.enqueue({"id": "m3", "command": "false", "max_retries": 1, "group_id": "g"})
+    try:
+        backend.enqueue({"id": "x", "command": "true", "group_id": "missing"})
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("job accepted into a missing group")
+
+    backend.complete(backend.claim("w1"))
+    backend.complete(backend.claim("w1"))
+    with use_db_path(backend.path):
+        group = get_group_status("g")
+    assert (group["total"], group["pending"], group["completed"], group["finished"]) == (3, 1, 2, False), group
+    assert backend.get_job("g-callback") is None
+
+    # The last member dying finishes the group and enqueues the callback once
+    backend.fail(backend.claim("w1"), "boom", exit_code=1)
+    with use_db_path(backend.path):
+        group = get_group_status("g")
+        assert (group["dead"], group["finished"], group["callback_enqueued"]) == (1, True, True), group
+        assert retry_dlq_jobs() == (1, 0)
+    assert backend.get_job("g-callback").command == "echo done"
+    backend.complete(backend.claim("w1"))
+    backend.fail(backend.claim("w1"), "boom again", exit_code=1)
+    with use_db_path(backend.path), get_read_db() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM jobs WHERE id LIKE 'g-callback%'").fetchone()[0] == 1
+
+
+def test_group_callback_collision_reported(backend):
+    with use_db_path(backend.path):
+        create_group({"id": "g", "jobs": [{"id": "m1", "command": "true"}],
+                      "callback": {"command": "echo done"}})
+    # A job enqueued under the callback's ID afterwards is not silently kept in its place
+    backend.enqueue({"id": "g-callback", "command": "true"})
+    job = backend.claim("w1")
+    with pytest.raises(ValueError, match="g-callback"):
+        backend.complete(job)
+    assert backend.get_job("m1").state == 'processing'
+    with use_db_path(backend.path):
+        assert get_group_status("g")["callback_enqueued"] is False
@@ -0,0 +1,42 @@
+"""
+Queue limits: block, reject and spill producer policies
+"""
+import time
+
+import pytest
+
+from queuectl.db import use_db_path
+from queuectl.limits import QueueFullError, drain_spill, enqueue_with_backpressure, set_queue_limit
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "remote"], indirect=True)
+def test_queue_limit_policies(backend):
+    spill_path = backend.path + ".spill.jsonl"
+    with use_db_path(backend.path):
+        assert set_queue_limit("default", 2) == 0
+    backend.enqueue({"id": "a", "command": "true"})
+    backend.enqueue({"id": "b", "command": "true"})
+    backend.enqueue({"id": "other", "command": "true", "queue": "other"})
+
+    with pytest.raises(QueueFullError) as refused:
+        enqueue_with_backpressure(backend, {"id": "c", "command": "true"})
+    assert refused.value.queue == "default"
+    assert backend.get_job("c") is None
+
+    start = time.monotonic()
+    with pytest.raises(QueueFullError):
+        enqueue_with_backpressure(backend, {"id": "c", "command": "true"}, 'block', timeout=0.2)
+    assert time.monotonic() - start < 2
+
+    assert enqueue_with_backpressure(backend, {"id": "c", "command": "true"}, 'spill',
+                                     spill_path=spill_path) is None
+    assert drain_spill(backend, spill_path) == (0, 0, 1)
+
+    # Finishing a job frees its slot
+    backend.complete(backend.claim("w1"))
+    assert drain_spill(backend, spill_path) == (1, 0, 0)
+    assert backend.get_job("c").state == 'pending'
+
+    limits = backend.stats()["queue_limits"]
+    assert limits == [{"queue": "default", "max_pending": 2, "unfinished": 2,
+                       "refused": 2, "blocked": 1, "spilled": 1}], limits
@@ -0,0 +1,62 @@
+"""
+Lock-contention tracing: per-statement waits and writer-lock holds
+"""
+import sqlite3
+import threading
+
+from queuectl.backends import SQLiteBackend
+from queuectl.db import get_db, init_db, use_db_path
+from queuectl.locktrace import read_traces, summarize_contention
+
+
+def test_lock_trace(tmp_path, monkeypatch):
+    path = str(tmp_path / "queue.db")
+    trace_dir = str(tmp_path / "trace")
+    monkeypatch.setenv("QUEUECTL_TRACE_LOCKS", "1")
+    monkeypatch.setenv("QUEUECTL_TRACE_DIR", trace_dir)
+
+    backend = SQLiteBackend(path=path)
+    backend.enqueue({"id": "a", "command": "true"})
+
+    # Another connection holds the writer lock; the claim has to wait for it
+    blocker = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    blocker.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.2, blocker.execute, ("COMMIT",)).start()
+    job = backend.claim("w1")
+    backend.complete(job)
+    backend.close()
+    blocker.close()
+
+    records = {record["label"]: record for record in read_traces(trace_dir)}
+    assert {"enqueue", "claim", "result"} <= set(records), set(records)
+    claim = records["claim"]
+    assert claim["path"] == "queuectl.backends.sqlite:claim_job", claim
+    assert claim["wait"] >= 0.1 and claim["retries"] > 0 and claim["hold"] is not None, claim
+
+    rows = summarize_contention(read_traces(trace_dir), ("label",))
+    assert rows[0]["hold_total"] >= rows[-1]["hold_total"]
+
+
+def test_lock_hold_starts_at_first_write(tmp_path, monkeypatch):
+    path = str(tmp_path / "queue.db")
+    trace_dir = str(tmp_path / "trace")
+    monkeypatch.setenv("QUEUECTL_TRACE_LOCKS", "1")
+    monkeypatch.setenv("QUEUECTL_TRACE_DIR", trace_dir)
+
+    with use_db_path(path):
+        init_db()
+        # A deferred BEGIN followed only by reads never takes the writer lock
+        with get_db('reads') as conn:
+            conn.execute("BEGIN")
+            conn.execute("SELECT COUNT(*) FROM jobs").fetchone()
+        with get_db('writes') as conn:
+            conn.execute("BEGIN")
+            conn.execute("SELECT COUNT(*) FROM jobs").fetchone()
+            conn.execute("UPDATE config SET value = value WHERE key = 'max_retries'")
+        with get_db('immediate') as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("SELECT COUNT(*) FROM jobs").fetchone()
+
+    records = {record["label"]: record for record in read_traces(trace_dir)}
+    assert records["reads"]["hold"] is None, records["reads"]
+    assert records["writes"]["hold"] is not None and records["immediate"]["hold"] is not None, records
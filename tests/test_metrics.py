@@ -0,0 +1,80 @@
+"""
+Prometheus metrics: worker snapshots, exposition format and /metrics
+"""
+import os
+import re
+import urllib.request
+
+from queuectl.metrics import PHASES, RETIRED_FILE, MetricsServer, WorkerMetrics, read_snapshots, render_metrics
+from queuectl.recycle import RecycleLimits
+from queuectl.worker import worker_loop
+
+
+# One line of the Prometheus text format: a comment or 'name{labels} value'
+EXPOSITION_LINE = re.compile(r'^(# (HELP|TYPE) \w+ .+|[a-z_]+(\{(\w+="[^"]*",?)+\})? -?[0-9.e+]+)$')
+
+
+def _values(text):
+    return {line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if not line.startswith("#")}
+
+
+def test_prometheus_metrics(backend):
+    backend.enqueue({"id": "ok", "command": "true"})
+    backend.enqueue({"id": "bad", "command": "false", "max_retries": 1})
+    backend.enqueue({"id": "later", "command": "true", "queue": "slow"})
+    metrics_dir = backend.path + ".metrics"
+    metrics = WorkerMetrics("w1", metrics_dir)
+    assert worker_loop("w1", 2.0, backend, metrics=metrics, recycle=RecycleLimits(max_jobs=2)) == "jobs"
+
+    text = render_metrics(read_snapshots(metrics_dir), [backend.path])
+    lines = text.splitlines()
+    assert all(EXPOSITION_LINE.match(line) for line in lines), [line for line in lines if not EXPOSITION_LINE.match(line)]
+    values = _values(text)
+    assert values['queuectl_jobs{queue="default",state="completed"}'] == 1
+    assert values['queuectl_jobs{queue="default",state="dead"}'] == 1
+    assert values['queuectl_jobs{queue="slow",state="pending"}'] == 1
+    assert values['queuectl_jobs_processed_total{outcome="failed"}'] == 1
+    assert values['queuectl_worker_recycles_total{reason="jobs"}'] == 1
+
+    for phase in PHASES:
+        name = f"queuectl_{phase}_seconds"
+        assert f"# TYPE {name} histogram" in lines
+        buckets = [value for key, value in values.items() if key.startswith(f"{name}_bucket")]
+        assert buckets == sorted(buckets) and buckets[-1] == values[f"{name}_count"] == 2, (phase, buckets)
+        assert values[f'{name}_bucket{{le="+Inf"}}'] == 2
+
+    server = MetricsServer(lambda: text, ("127.0.0.1", 0))
+    server.start_in_thread()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.address[1]}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert response.read().decode() == text
+    finally:
+        server.stop()
+
+
+def test_snapshots_keyed_by_worker_and_retired(tmp_path):
+    directory = str(tmp_path)
+    first = WorkerMetrics("w1", directory)
+    first.count_job("completed")
+    first.recycled, first.stopped = "jobs", True
+    first.flush()
+
+    # A second worker in the same process, as after PID reuse, keeps its own snapshot
+    second = WorkerMetrics("w2", directory)
+    second.count_job("completed")
+    second.count_job("failed")
+    second.flush()
+    assert "worker-w1.json" not in os.listdir(directory)
+    totals = _values(render_metrics(read_snapshots(directory)))
+    assert totals['queuectl_jobs_processed_total{outcome="completed"}'] == 2, totals
+    assert totals['queuectl_worker_recycles_total{reason="jobs"}'] == 1 and totals["queuectl_workers"] == 1
+
+    second.stopped = True
+    second.flush()
+    assert not any(name.startswith("worker-") for name in os.listdir(directory))
+    assert RETIRED_FILE in os.listdir(directory)
+    values = _values(render_metrics(read_snapshots(directory)))
+    assert values['queuectl_jobs_processed_total{outcome="completed"}'] == 2, values
+    assert values['queuectl_jobs_processed_total{outcome="failed"}'] == 1
+    assert values["queuectl_workers"] == 0 and values["queuectl_execute_seconds_count"] == 0
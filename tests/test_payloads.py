@@ -0,0 +1,43 @@
+"""
+Job payloads: deduplicated, compressed storage and delivery to commands
+"""
+import sqlite3
+
+import pytest
+
+from queuectl.db import get_read_db, use_db_path
+from queuectl.payloads import collect_garbage
+from queuectl.worker import execute_job
+
+
+PAYLOAD_ROWS = {"rows": list(range(2000))}
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "sharded", "remote", "memory"], indirect=True)
+def test_payloads_stored_once_and_delivered(backend):
+    backend.enqueue({"id": "a", "command": "wc -c", "payload": PAYLOAD_ROWS})
+    backend.enqueue({"id": "b", "command": "wc -c < $QUEUECTL_PAYLOAD_FILE", "payload": PAYLOAD_ROWS,
+                     "payload_via": "file"})
+    a, b = backend.claim("w1"), backend.claim("w1")
+    assert a.payload_hash == b.payload_hash, (a, b)
+    payload = backend.get_payload(a)
+    assert len(payload) > 8000 and payload.startswith('{"rows":[0,1,2')
+    for job in (a, b):
+        success, output, _ = execute_job(job, backend.get_payload(job))
+        assert success and int(output) == len(payload), (job.id, output)
+
+
+def test_payloads_compressed_and_collected(backend):
+    backend.enqueue({"id": "a", "command": "true", "payload": PAYLOAD_ROWS})
+    backend.enqueue({"id": "b", "command": "true", "payload": PAYLOAD_ROWS})
+    with use_db_path(backend.path), get_read_db() as conn:
+        count, size, stored = conn.execute("SELECT COUNT(*), SUM(size), SUM(LENGTH(data)) FROM payloads").fetchone()
+    assert count == 1 and stored < size / 2, (count, size, stored)
+
+    with use_db_path(backend.path):
+        assert collect_garbage() == (0, 0)
+        conn = sqlite3.connect(backend.path)
+        conn.execute("DELETE FROM jobs")
+        conn.commit()
+        conn.close()
+        assert collect_garbage() == (1, stored)
@@ -0,0 +1,35 @@
+"""
+Worker profiling: per-phase totals and the summary file
+"""
+import os
+import re
+from datetime import datetime, timedelta, timezone
+
+from queuectl.backends import MemoryBackend
+from queuectl.metrics import PHASES
+from queuectl.profiling import PROFILE_PHASES, WorkerProfiler
+from queuectl.recycle import RecycleLimits
+from queuectl.worker import worker_loop
+
+
+def test_profiler_phase_totals(tmp_path):
+    backend = MemoryBackend()
+    for job_id in ("a", "b"):
+        backend.enqueue({"id": job_id, "command": "sleep 0.05"})
+    later = datetime.now(timezone.utc) + timedelta(seconds=0.4)
+    backend.enqueue({"id": "later", "command": "true", "run_at": later.isoformat()})
+    profiler = WorkerProfiler("w1", directory=str(tmp_path))
+    worker_loop("w1", 2.0, backend, profiler=profiler, recycle=RecycleLimits(max_jobs=3))
+
+    phases = profiler.phases
+    assert (phases["execute"].count, phases["result_write"].count) == (3, 3)
+    assert phases["execute"].total >= 0.1 and phases["execute"].min < 0.05 <= phases["execute"].max
+    assert phases["idle"].count >= 1 and phases["idle"].total > 0.02
+    assert phases["claim"].count == 3 + phases["idle"].count
+    assert phases["error"].count == 0
+
+    # The worker metrics use the same phase names, so the two can be joined
+    assert set(PHASES) <= set(PROFILE_PHASES)
+    with open(os.path.join(tmp_path, f"worker-{os.getpid()}.txt")) as f:
+        summary = f.read()
+    assert all(re.search(rf"^{phase} ", summary, re.M) for phase in PROFILE_PHASES), summary
@@ -0,0 +1,16 @@
+"""
+Worker recycling: job-count limit and duration parsing
+"""
+from queuectl.backends import MemoryBackend
+from queuectl.recycle import RecycleLimits, parse_duration
+from queuectl.worker import worker_loop
+
+
+def test_worker_recycles_after_max_jobs():
+    backend = MemoryBackend()
+    for job_id in ("a", "b", "c"):
+        backend.enqueue({"id": job_id, "command": "true"})
+    assert worker_loop("w1", 2.0, backend, recycle=RecycleLimits(max_jobs=2)) == "jobs"
+    assert backend.stats()["state_counts"]["completed"] == 2
+    assert backend.stats()["state_counts"]["pending"] == 1
+    assert parse_duration("90") == 90 and parse_duration("6h") == 6 * 3600
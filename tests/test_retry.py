@@ -0,0 +1,74 @@
+"""
+Retry policies: delays, exit-code rules and resolution order
+"""
+import pytest
+
+from queuectl.config import set_config
+from queuectl.db import get_read_db, use_db_path
+from queuectl.retry import DEFAULT_MAX_DELAY, parse_policy, plan_retry, resolve_policy, simulate_retry_load
+
+
+def test_retry_policies():
+    exponential = parse_policy({"type": "exponential", "base": 2, "max_delay": 10})
+    assert [exponential.delay(attempt) for attempt in (1, 3, 5, 2000)] == [2, 8, 10, 10]
+    assert parse_policy("linear").delay(3) == 15
+    assert parse_policy('{"type": "fixed", "delay": 4}').delay(9) == 4
+
+    jittered = parse_policy({"type": "fixed", "delay": 10, "jitter": 0.5})
+    assert all(5 <= jittered.delay(1) <= 10 for _ in range(100))
+    decorrelated = parse_policy({"type": "decorrelated_jitter", "base": 1, "max_delay": 20})
+    assert all(1 <= decorrelated.delay(2, 4) <= 12 for _ in range(100))
+    assert all(decorrelated.delay(2, 100) <= 20 for _ in range(100))
+    assert parse_policy(exponential.to_dict()).to_dict() == exponential.to_dict()
+
+    # Growing delays are capped even when the policy sets no max_delay
+    assert parse_policy("exponential").delay(2000) == DEFAULT_MAX_DELAY
+    assert parse_policy("linear").delay(10 ** 9) == DEFAULT_MAX_DELAY
+    assert parse_policy({"type": "decorrelated_jitter", "max_delay": None}).delay(5, 1e308) <= DEFAULT_MAX_DELAY
+    assert parse_policy({"type": "fixed", "delay": 7200}).delay(1) == 7200
+
+    for spec in ("nope", {"type": "fixed", "speed": 1}, {"type": "fixed", "jitter": 2}, "{bad",
+                 {"type": "fixed", "delay": 1, "max_delay": "x"}, {"type": "fixed", "jitter": "half"},
+                 {"type": "exponential", "max_delay": -1}, {"type": "linear", "step": "inf"},
+                 {"type": "fixed", "dead_exit_codes": ["two"]}):
+        try:
+            parse_policy(spec)
+        except ValueError:
+            continue
+        raise AssertionError(f"invalid policy accepted: {spec}")
+
+    rules = parse_policy({"type": "fixed", "delay": 1, "dead_exit_codes": [2], "free_exit_codes": [75]})
+    assert plan_retry(rules, 0, 3, None, 1) == (1, 1)
+    assert plan_retry(rules, 1, 3, None, 75) == (1, 1)
+    assert plan_retry(rules, 1, 3, None, 2) == (None, 2)
+    assert plan_retry(rules, 2, 3, None, 1) == (None, 3)
+
+    histogram = simulate_retry_load(parse_policy({"type": "fixed", "delay": 2}), jobs=10, attempts=3)
+    assert histogram == {2.0: 10, 4.0: 10, 6.0: 10}, histogram
+
+
+def test_retry_policy_resolution(backend):
+    # Job policy, then the queue's, then the global one, then capped exponential backoff
+    with use_db_path(backend.path):
+        set_config("retry_max_delay", "60")
+        set_config("retry_policy.mail", '{"type": "linear", "step": 3}')
+        with get_read_db() as conn:
+            cursor = conn.cursor()
+            assert resolve_policy(cursor, '{"type": "fixed", "delay": 1}', "mail", 2).name == 'fixed'
+            queue_policy = resolve_policy(cursor, None, "mail", 2)
+            assert (queue_policy.name, queue_policy.delay(10 ** 6)) == ('linear', 60)
+            capped = resolve_policy(cursor, '{"type": "exponential", "max_delay": 600}', "mail", 2)
+            assert capped.max_delay == 600
+            default = resolve_policy(cursor, None, "other", 3)
+            assert (default.name, default.base, default.max_delay) == ('exponential', 3, 60)
+        set_config("retry_policy", "fixed")
+        with get_read_db() as conn:
+            assert resolve_policy(conn.cursor(), None, "other", 3).name == 'fixed'
+
+
+def test_invalid_job_policy_rejected_at_enqueue(backend):
+    # Caught when the job is enqueued, not when its first failure is recorded
+    with pytest.raises(ValueError, match="max_delay"):
+        backend.enqueue({"id": "a", "command": "false",
+                         "retry_policy": {"type": "fixed", "delay": 1, "max_delay": "x"}})
+    assert backend.get_job("a") is None
@@ -0,0 +1,54 @@
+"""
+Recurring schedules: once-only firing, catch-up and reloads
+"""
+import contextvars
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from queuectl.db import use_db_path
+from queuectl.scheduler import add_schedule, fire_due_schedules, remove_schedule, run_scheduler
+
+
+def iso_in(seconds):
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat()
+
+
+def test_schedules_fire_once_and_catch_up(backend):
+    now = time.time()
+    with use_db_path(backend.path):
+        for schedule_id, catchup in (("all", "all"), ("latest", "latest")):
+            add_schedule({"id": schedule_id, "command": "true", "interval": 10,
+                          "catchup": catchup, "start_at": iso_in(-55)})
+        # Two schedulers seeing the same due entries fire each occurrence once
+        first = fire_due_schedules(["all", "latest"], now)
+        assert fire_due_schedules(["all", "latest"], now) == first
+    assert [round(next_run - now) for next_run, _ in first] == [5, 5], first
+
+    fired = sorted(job.id.split("@")[0] for job in backend.list_jobs())
+    assert fired == ["all"] * 6 + ["latest"], fired
+    [latest] = [job for job in backend.list_jobs() if job.id.startswith("latest@")]
+    assert now - 6 < latest.run_after <= now
+
+
+def test_scheduler_sees_new_schedules_at_once(backend):
+    stop = threading.Event()
+    with use_db_path(backend.path):
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(run_scheduler, stop))
+        thread.start()
+        try:
+            time.sleep(0.2)
+            add_schedule({"id": "new", "command": "true", "interval": 60, "start_at": iso_in(0.2)})
+            deadline = time.monotonic() + 2
+            while not backend.list_jobs() and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert [job.id.split("@")[0] for job in backend.list_jobs()] == ["new"]
+
+            add_schedule({"id": "gone", "command": "true", "interval": 60, "start_at": iso_in(0.5)})
+            time.sleep(0.2)
+            assert remove_schedule("gone")
+            time.sleep(0.6)
+            assert len(backend.list_jobs()) == 1, backend.list_jobs()
+        finally:
+            stop.set()
+            thread.join()
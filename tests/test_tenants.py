@@ -0,0 +1,32 @@
+"""
+Fair tenant claims: weighted round-robin over active tenants
+"""
+import time
+
+import pytest
+
+from queuectl.config import set_config
+from queuectl.db import get_read_db, use_db_path
+from queuectl.tenants import get_tenants, set_tenant_weight
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "remote"], indirect=True)
+def test_fair_claims_rotate_tenants(backend):
+    with use_db_path(backend.path):
+        set_config("claim_strategy", "fair")
+        set_tenant_weight("c", 2)
+    for tenant, count in (("a", 4), ("b", 2), ("c", 4)):
+        for index in range(1, count + 1):
+            backend.enqueue({"id": f"{tenant}{index}", "command": "true", "tenant": tenant})
+            time.sleep(0.002)
+
+    claimed = [backend.claim("w1").id for _ in range(10)]
+    assert claimed == ["a1", "b1", "c1", "c2", "a2", "b2", "c3", "c4", "a3", "a4"], claimed
+    assert backend.claim("w1") is None
+
+    # A retried job makes its tenant active again
+    backend.fail(backend.get_job("b1"), "boom", exit_code=1)
+    with use_db_path(backend.path), get_read_db() as conn:
+        tenants = {row["tenant"]: row for row in get_tenants(conn.cursor())}
+    assert tenants["b"]["active"] and tenants["b"]["pending"] == 1, tenants
+    assert "a" not in tenants and tenants["c"]["weight"] == 2, tenants
@@ -0,0 +1,35 @@
+"""
+Throttles: claim-time rate limits and concurrency caps
+"""
+import time
+
+import pytest
+
+from queuectl.db import use_db_path
+from queuectl.throttles import set_throttle
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "remote"], indirect=True)
+def test_throttles_skip_to_other_work(backend):
+    with use_db_path(backend.path):
+        set_throttle("queue", "api", max_in_flight=1)
+        set_throttle("key", "slow", rate=20, burst=1)
+    for job_id, extra in (("api1", {"queue": "api"}), ("api2", {"queue": "api"}),
+                          ("slow1", {"throttle_key": "slow"}), ("slow2", {"throttle_key": "slow"}),
+                          ("other", {})):
+        backend.enqueue({"id": job_id, "command": "true", **extra})
+        time.sleep(0.002)
+
+    api1 = backend.claim("w1")
+    assert api1.id == "api1"
+    assert [backend.claim("w1").id for _ in range(2)] == ["slow1", "other"]
+    assert backend.claim("w1") is None
+
+    # The empty bucket refills within 1/rate seconds, and workers are told when
+    next_run = backend.next_run_after()
+    assert next_run is not None and next_run - time.time() <= 0.05 + 0.01, next_run
+    time.sleep(0.06)
+    assert backend.claim("w1").id == "slow2"
+
+    backend.complete(api1)
+    assert backend.claim("w1").id == "api2"
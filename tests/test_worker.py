@@ -0,0 +1,34 @@
+"""
+Worker loop: timer-driven idle sleep
+"""
+import threading
+import time
+from datetime import datetime, timezone
+
+from queuectl.worker import wait_for_work
+
+
+def test_idle_worker_sleeps_until_next_job(backend):
+    due = time.time() + 0.25
+    backend.enqueue({"id": "later", "command": "true",
+                     "run_at": datetime.fromtimestamp(due, timezone.utc).isoformat()})
+    assert abs(backend.get_job("later").run_after - due) < 0.002
+
+    def idle_until_claimed():
+        start = time.monotonic()
+        job = backend.claim("w1")
+        while job is None and time.monotonic() - start < 5:
+            wait_for_work(backend, 5.0)
+            job = backend.claim("w1")
+        return job, time.monotonic() - start
+
+    # Timer-driven: the sleep ends when the delayed job is due, not at max_wait
+    job, elapsed = idle_until_claimed()
+    assert job.id == "later" and 0.15 < elapsed < 1, elapsed
+
+    # A commit by another connection ends the sleep early
+    timer = threading.Timer(0.2, backend.enqueue, ({"id": "new", "command": "true"},))
+    timer.start()
+    job, elapsed = idle_until_claimed()
+    timer.join()
+    assert job.id == "new" and 0.15 < elapsed < 1, elapsed
@@ -0,0 +1,27 @@
+"""
+Workers registry: heartbeats and stop requests
+"""
+import pytest
+
+from queuectl.workers import WorkerRegistration
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "sharded", "remote"], indirect=True)
+def test_worker_registry(backend):
+    registration = WorkerRegistration("w1", backend.name)
+    backend.register_worker(registration.to_dict())
+    registration.current_job = "a"
+    registration.jobs_done = 3
+    assert backend.worker_heartbeat(registration.to_dict()) is False
+
+    [worker] = backend.list_workers()
+    assert (worker["status"], worker["current_job"], worker["jobs_done"]) == ("running", "a", 3), worker
+
+    assert [worker["id"] for worker in backend.stop_workers()] == ["w1"]
+    assert backend.list_workers()[0]["status"] == "stopping"
+    assert backend.worker_heartbeat(registration.to_dict()) is True
+
+    backend.worker_heartbeat(registration.to_dict(), stopped=True)
+    assert backend.list_workers()[0]["status"] == "stopped"
+    assert backend.stop_workers() == []
+    assert backend.stats()["worker_pids"] == []